@@ -0,0 +1,79 @@
+from collections import OrderedDict
+
+from django.http import StreamingHttpResponse
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from videos.pagination import InvalidCursor, KeysetPaginator
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginates videos by cursor using the same keyset paginator as the video
+    list pages, so deep pages cost the same to fetch as the first
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        paginator = KeysetPaginator(queryset, self.get_page_size(request))
+        try:
+            self.page = paginator.page(
+                    request.query_params.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise NotFound('Invalid cursor')
+        return self.page.object_list
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(),
+                                   self.cursor_query_param,
+                                   cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_link(self.page.next_cursor)),
+            ('previous', self.get_link(self.page.previous_cursor)),
+            ('results', data)
+        ]))
+
+    def get_streaming_response(self, items):
+        """
+        Streams the same bytes the JSONRenderer makes of the response from
+        get_paginated_response, rendering each item as it is produced rather
+        than the whole page at once
+        """
+        renderer = JSONRenderer()
+
+        def render(value):
+            # The renderer gives an empty body rather than null for None
+            return b'null' if value is None else renderer.render(value)
+
+        def stream():
+            yield b''.join([
+                b'{"next":', render(self.get_link(self.page.next_cursor)),
+                b',"previous":', render(self.get_link(
+                    self.page.previous_cursor)),
+                b',"results":['])
+            for index, item in enumerate(items):
+                if index:
+                    yield b','
+                yield renderer.render(item)
+            yield b']}'
+        return StreamingHttpResponse(stream(),
+                                     content_type='application/json')
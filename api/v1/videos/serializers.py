@@ -1,6 +1,29 @@
+from collections import OrderedDict, defaultdict
+
+from django.db.models import Prefetch
+
 from rest_framework import serializers
 
-from videos.models import Tag, Video
+from videos.instrumentation import timed
+from videos.models import Comment, Tag, Video
+
+
+class TimedListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        with timed('serializer'):
+            return super(TimedListSerializer, self).data
+
+
+class TimedSerializerMixin(object):
+    """
+    Serializer mixin adding the time spent serializing to the instrumented
+    request, many=True serializers included
+    """
+    @property
+    def data(self):
+        with timed('serializer'):
+            return super(TimedSerializerMixin, self).data
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -9,7 +32,7 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ('title',)
 
 
-class VideoSerializer(serializers.ModelSerializer):
+class VideoSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     # tags = TagSerializer(read_only=True, many=True)
     tags = serializers.SlugRelatedField(many=True,
                                         read_only=True,
@@ -19,3 +42,124 @@ class VideoSerializer(serializers.ModelSerializer):
         model = Video
         fields = ('title', 'uploader', 'description', 'video_id', 'category',
                   'tags', 'created', 'updated')
+        list_serializer_class = TimedListSerializer
+
+
+# Columns serialize_videos needs from Video.objects.values()
+VIDEO_COLUMNS = ('id', 'title', 'uploader', 'description', 'video_id',
+                 'category', 'created', 'updated')
+
+
+def prefetch_tags(queryset, lookup='tags'):
+    """
+    Prefetch the tags of videos for VideoSerializer in the same order
+    serialize_videos lists them, lookup is the path to the tags when the
+    queryset is not of videos
+    """
+    return queryset.prefetch_related(Prefetch(lookup,
+                                              queryset=Tag.objects.order_by(
+                                                  'id')))
+
+
+def serialize_videos(rows, chunk_size=500):
+    """
+    Read optimised equivalent of VideoSerializer(videos, many=True).data for
+    rows from Video.objects.values(*VIDEO_COLUMNS). Rows are turned straight
+    into the serialized data without building model instances or going
+    through each serializer field, and the tags of every chunk_size videos
+    are looked up with one query. It is a generator so a large result set
+    can be written out as it is read
+    """
+    # Only the datetimes need converting, everything else is serialized as
+    # the value read from the database
+    fields = VideoSerializer().fields
+    converters = [(name, fields[name].to_representation)
+                  for name
+                  in VideoSerializer.Meta.fields
+                  if isinstance(fields[name], serializers.DateTimeField)]
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield from serialize_video_chunk(chunk, converters)
+            chunk = []
+    if chunk:
+        yield from serialize_video_chunk(chunk, converters)
+
+
+def serialize_video_chunk(rows, converters):
+    through = Video.tags.through
+    tags = defaultdict(list)
+    for video_id, title in (through.objects
+                            .filter(video_id__in=[row['id'] for row in rows])
+                            .order_by('tag_id')
+                            .values_list('video_id', 'tag__title')):
+        tags[video_id].append(title)
+    for row in rows:
+        data = OrderedDict((name, row.get(name))
+                           for name
+                           in VideoSerializer.Meta.fields)
+        data['tags'] = tags[row['id']]
+        for name, to_representation in converters:
+            data[name] = to_representation(row[name])
+        yield data
+
+
+class CommentSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    commenter = serializers.SlugRelatedField(read_only=True,
+                                             slug_field='username')
+    more_replies = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = Comment
+        fields = ('id', 'text', 'commenter', 'score', 'parent', 'video',
+                  'created', 'more_replies')
+        list_serializer_class = TimedListSerializer
+
+
+class CommentTreeSerializer(TimedSerializerMixin, serializers.BaseSerializer):
+    """
+    Serializes the nodes of a tree made by build_comment_tree, nesting the
+    replies loaded for each comment beneath it
+    """
+    class Meta:
+        list_serializer_class = TimedListSerializer
+
+    def to_representation(self, node):
+        if isinstance(node, list):
+            comment, replies = node
+        else:
+            comment, replies = node, []
+        data = CommentSerializer(comment, context=self.context).data
+        data['replies'] = [self.to_representation(reply)
+                           for reply
+                           in replies]
+        return data
+
+
+class ActionSerializer(serializers.Serializer):
+    """
+    A single vote or favorite queued up by a client. Votes are cast on
+    either a video or a comment, a value of 0 removing the vote
+    """
+    action = serializers.ChoiceField(choices=['vote', 'favorite'])
+    video = serializers.IntegerField(required=False)
+    comment = serializers.IntegerField(required=False)
+    value = serializers.ChoiceField(choices=[-1, 0, 1], required=False)
+    favorite = serializers.BooleanField(required=False)
+
+    def validate(self, data):
+        if data['action'] == 'vote':
+            if ('video' in data) == ('comment' in data):
+                raise serializers.ValidationError(
+                        'A vote is cast on either a video or a comment')
+            if 'value' not in data:
+                raise serializers.ValidationError('A vote needs a value')
+        else:
+            if 'video' not in data or 'comment' in data:
+                raise serializers.ValidationError(
+                        'Only videos can be favorited')
+            if 'favorite' not in data:
+                raise serializers.ValidationError(
+                        'A favorite needs a favorite value')
+        return data
@@ -2,11 +2,21 @@ from django.conf.urls import url, include
 
 from rest_framework import routers
 
-from api.v1.videos import viewsets
+from api.v1.videos import views, viewsets
 
 router = routers.DefaultRouter()
 router.register(r'videos', viewsets.VideoViewSet)
+router.register(r'comments', viewsets.CommentViewSet)
 
 urlpatterns = [
+         url(r'^actions/$',
+             views.BulkActionView.as_view(),
+             name='videos_actions'),
+         url(r'^cache-stats/$',
+             views.CacheStatsView.as_view(),
+             name='videos_cache_stats'),
+         url(r'^export/(?P<table>\w+)\.(?P<output>ndjson|csv)$',
+             views.ExportView.as_view(),
+             name='videos_export'),
          url(r'^', include(router.urls))
          ]
@@ -0,0 +1,166 @@
+from collections import OrderedDict
+
+from django.db import transaction
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+import dateutil.parser
+
+from profiles.models import User
+from videos.exports import (EXPORTS, csv_lines, export_rows, get_watermark,
+                            ndjson_lines)
+from videos.models import Comment, CommentVote, Video, VideoVote
+from videos.page_cache import video_list_cache
+from .serializers import ActionSerializer
+
+CONTENT_TYPES = dict(ndjson='application/x-ndjson',
+                     csv='text/csv; charset=utf-8')
+
+
+class URLFormatNegotiation(BaseContentNegotiation):
+    """
+    Ignores the Accept header for views whose output format is chosen by
+    the url, errors are rendered with the first renderer
+    """
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class ExportView(APIView):
+    """
+    Streams a whole table as newline delimited json or csv for analytics
+    jobs, only to staff as the tables include who voted on what. Passing
+    since only exports rows changed at or after that time, the
+    X-Export-Watermark header of a response is the since to pass next time.
+    Incremental exports may repeat rows and never include deleted ones, so
+    they are upserted by id and deletions are found from full exports.
+    The output format is chosen by the url, not negotiated
+    """
+    permission_classes = (IsAdminUser,)
+    renderer_classes = (JSONRenderer,)
+    content_negotiation_class = URLFormatNegotiation
+
+    LINE_FORMATS = dict(ndjson=ndjson_lines, csv=csv_lines)
+
+    def get_since(self, request):
+        """
+        Returns the since parameter as an aware datetime, raising ValueError
+        when it is not a valid date and time
+        """
+        since = request.query_params.get('since')
+        if not since:
+            return None
+        try:
+            since = dateutil.parser.parse(since)
+        except OverflowError:
+            raise ValueError(since)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since, timezone.utc)
+        return since
+
+    def get(self, request, table, output):
+        if table not in EXPORTS or output not in self.LINE_FORMATS:
+            raise Http404
+        export = EXPORTS[table]
+        try:
+            since = self.get_since(request)
+        except ValueError:
+            raise ValidationError({'since': 'Not a valid date and time'})
+        # Read before the rows are streamed, so rows changed while streaming
+        # are exported again next time rather than skipped
+        watermark = get_watermark(export, since)
+        lines = self.LINE_FORMATS[output](export.fields,
+                                          export_rows(export, since))
+        response = StreamingHttpResponse(lines,
+                                         content_type=CONTENT_TYPES[output])
+        if watermark is not None:
+            response['X-Export-Watermark'] = watermark.isoformat()
+        response['Content-Disposition'] = (
+                'attachment; filename="{}.{}"'.format(table, output))
+        return response
+
+
+class BulkActionView(APIView):
+    """
+    Applies a batch of votes and favorites queued up by a client for the
+    user making the request. Actions are applied in order so a later action
+    on the same video or comment wins, and the result of each is returned in
+    the same order. Each kind of action is written with a single statement
+    """
+    permission_classes = (IsAuthenticated,)
+
+    # Most actions accepted in one request
+    MAX_ACTIONS = 500
+
+    # Model the ids of each target are checked against and the manager
+    # method the actions on it are applied with
+    TARGETS = OrderedDict([
+        (('vote', 'video'), (Video, VideoVote.objects.set_votes)),
+        (('vote', 'comment'), (Comment, CommentVote.objects.set_votes)),
+        (('favorite', 'video'), (Video, Video.objects.set_favorites)),
+    ])
+
+    def post(self, request):
+        if not isinstance(request.data, list):
+            raise ValidationError('Expected a list of actions')
+        if len(request.data) > self.MAX_ACTIONS:
+            raise ValidationError('At most {} actions can be sent at '
+                                  'once'.format(self.MAX_ACTIONS))
+        results = []
+        targets = {target: OrderedDict() for target in self.TARGETS}
+        for item in request.data:
+            serializer = ActionSerializer(data=item)
+            if not serializer.is_valid():
+                results.append(dict(status='error',
+                                    errors=serializer.errors))
+                continue
+            action = serializer.validated_data
+            target = 'video' if 'video' in action else 'comment'
+            if action['action'] == 'vote':
+                value = action['value'] or None
+            else:
+                value = action['favorite']
+            results.append(dict(status='ok'))
+            actions = targets[action['action'], target]
+            indices = actions.get(action[target], (None, []))[1]
+            actions[action[target]] = (value, indices + [len(results) - 1])
+        with transaction.atomic():
+            # Serializes the batches of a user so no two of them count the
+            # same vote
+            User.objects.select_for_update().get(pk=request.user.pk)
+            for target, actions in targets.items():
+                model, apply_actions = self.TARGETS[target]
+                extant = set(model.objects.filter(
+                        pk__in=list(actions)).values_list('pk', flat=True))
+                for object_id in set(actions) - extant:
+                    for index in actions.pop(object_id)[1]:
+                        results[index] = dict(
+                                status='error',
+                                errors={target[1]: ['Does not exist']})
+                if actions:
+                    apply_actions(request.user.pk,
+                                  {object_id: value
+                                   for object_id, (value, indices)
+                                   in actions.items()})
+        return Response({'results': results})
+
+
+class CacheStatsView(APIView):
+    """
+    How the video list pages requested from this process were served, by
+    tier, since it started
+    """
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(video_list_cache.get_stats())
@@ -1,17 +1,206 @@
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
 from rest_framework import viewsets
-from rest_framework.decorators import list_route
+from rest_framework.decorators import detail_route, list_route
+from rest_framework.exceptions import NotAuthenticated, ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
-from videos.models import Video
-from .serializers import VideoSerializer
+from videos.leaderboard import DEFAULT_COUNT, Leaderboard
+from videos.models import (Comment, FeedItem, Recommendation, SearchTerm,
+                           Video, get_search_terms)
+from videos.related import get_related_videos
+from videos.views import CommentListView, VideoListView
+from .pagination import KeysetPagination
+from .serializers import (VIDEO_COLUMNS, CommentSerializer,
+                          CommentTreeSerializer, VideoSerializer,
+                          prefetch_tags, serialize_videos)
 
 
 class VideoViewSet(viewsets.ModelViewSet):
     serializer_class = VideoSerializer
-    queryset = Video.objects.all().prefetch_related('tags')
+    queryset = prefetch_tags(Video.objects.all())
+    pagination_class = KeysetPagination
+
+    # Number of videos listed by the trending endpoint
+    TRENDING_COUNT = 20
+
+    def get_queryset(self):
+        """
+        Override queryset to list videos in the order given by the ordering
+        parameter, taking the same values as the video list pages
+        """
+        queryset = super(VideoViewSet, self).get_queryset()
+        if self.action != 'list':
+            return queryset
+        list_by = self.request.query_params.get('ordering', 'likes')
+        return prefetch_tags(VideoListView.get_ordered_queryset(list_by))
+
+    def list(self, request):
+        """
+        Override list to build json responses straight from the rows of the
+        page, streaming them out rather than going through VideoSerializer.
+        Other formats such as the browsable api are still serialized as usual
+        """
+        if request.accepted_renderer.format != 'json':
+            return super(VideoViewSet, self).list(request)
+        queryset = self.get_queryset()
+        columns = list(VIDEO_COLUMNS)
+        columns.extend(name.lstrip('-')
+                       for name
+                       in queryset.query.order_by
+                       if name.lstrip('-') not in columns)
+        rows = self.paginate_queryset(
+                queryset.prefetch_related(None).values(*columns))
+        return self.paginator.get_streaming_response(serialize_videos(rows))
+
+    def render_leaderboard(self, videos):
+        serializer = self.get_serializer(prefetch_tags(videos), many=True)
+        return JSONRenderer().render(serializer.data)
 
     @list_route()
     def liked(self, request):
-        most_liked_videos = Video.objects.order_by_votes()[20]
-        serializer = self.get_serializer(most_liked_videos, many=True)
+        """
+        The most liked videos submitted within the window parameter, served
+        from the cached leaderboard. Clients polling with If-None-Match or
+        If-Modified-Since get a 304 until a vote changes the leaderboard
+        """
+        try:
+            leaderboard = Leaderboard(
+                    request.query_params.get('window', 'all'),
+                    int(request.query_params.get('count', DEFAULT_COUNT)))
+        except ValueError as error:
+            raise ValidationError({'detail': str(error)})
+        cached = leaderboard.get(self.render_leaderboard)
+        response = HttpResponse(cached['content'],
+                                content_type='application/json')
+        response['ETag'] = quote_etag(cached['etag'])
+        response['Last-Modified'] = http_date(cached['last_modified'])
+        return get_conditional_response(request,
+                                        etag=cached['etag'],
+                                        last_modified=cached['last_modified'],
+                                        response=response)
+
+    @list_route()
+    def feed(self, request):
+        """
+        Page through the feed of the user making the request, videos from
+        the users, categories and tags they follow
+        """
+        if not request.user.is_authenticated():
+            raise NotAuthenticated()
+        items = self.paginate_queryset(prefetch_tags(
+                FeedItem.objects.get_feed(request.user.id), 'video__tags'))
+        serializer = self.get_serializer([item.video for item in items],
+                                         many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @list_route()
+    def recommended(self, request):
+        """
+        Page through the videos recommended to the user making the request
+        from the ones they liked and favorited, as last computed by
+        compute_recommendations
+        """
+        if not request.user.is_authenticated():
+            raise NotAuthenticated()
+        recommendations = self.paginate_queryset(prefetch_tags(
+                Recommendation.objects.filter(user_id=request.user.id)
+                .order_by('-score', '-id').select_related('video'),
+                'video__tags'))
+        serializer = self.get_serializer([recommendation.video
+                                          for recommendation
+                                          in recommendations],
+                                         many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @list_route()
+    def search(self, request):
+        """
+        Page through the videos matching every word of the q parameter, best
+        matches first. The last word also matches the start of longer words
+        """
+        query = request.query_params.get('q', '')
+        if not get_search_terms(query):
+            raise ValidationError({'q': 'A search query is required'})
+        rows = self.paginate_queryset(SearchTerm.objects.search(query))
+        videos = prefetch_tags(Video.objects.all()).in_bulk(
+                [row['video_id'] for row in rows])
+        serializer = self.get_serializer([videos[row['video_id']]
+                                          for row
+                                          in rows],
+                                         many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @detail_route()
+    def related(self, request, pk=None):
+        """
+        The videos most related to this one by their shared tags and
+        category, as last computed by compute_related_videos
+        """
+        related_videos = prefetch_tags(
+                get_related_videos(self.get_object().id), 'related__tags')
+        serializer = self.get_serializer([related.related
+                                          for related
+                                          in related_videos],
+                                         many=True)
         return Response(serializer.data)
+
+    @list_route()
+    def trending(self, request):
+        trending_videos = prefetch_tags(
+                Video.objects.order_by_trending())[:self.TRENDING_COUNT]
+        serializer = self.get_serializer(trending_videos, many=True)
+        return Response(serializer.data)
+
+
+class CommentViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Comment threads loaded a page at a time. Listing takes the video
+    parameter and pages through its top level comments, replies pages
+    through the replies to a comment. Each comment comes with a bounded
+    number of its replies nested beneath it and more_replies set when the
+    rest can be loaded through its own replies endpoint
+    """
+    serializer_class = CommentSerializer
+    queryset = Comment.objects.select_related('commenter')
+    pagination_class = KeysetPagination
+
+    # Same bounds on the replies loaded as the comments page
+    REPLY_DEPTH = CommentListView.REPLY_DEPTH
+    REPLY_BREADTH = CommentListView.REPLY_BREADTH
+
+    def get_thread_response(self, **filters):
+        """
+        Page through the comments matching filters by score, nesting their
+        replies beneath them
+        """
+        comments = self.paginate_queryset(Comment.objects.order_by_votes()
+                                          .filter(**filters)
+                                          .select_related('commenter'))
+        thread = Comment.objects.get_replies(comments,
+                                             self.REPLY_DEPTH,
+                                             self.REPLY_BREADTH)
+        serializer = CommentTreeSerializer(
+                thread, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
+    def list(self, request):
+        video_id = request.query_params.get('video')
+        if not video_id or not video_id.isdigit():
+            raise ValidationError({'video': 'A video id is required'})
+        return self.get_thread_response(video_id=video_id, parent_id=None)
+
+    def retrieve(self, request, pk=None):
+        thread = Comment.objects.get_replies([self.get_object()],
+                                             self.REPLY_DEPTH,
+                                             self.REPLY_BREADTH)
+        serializer = CommentTreeSerializer(
+                thread[0], context=self.get_serializer_context())
+        return Response(serializer.data)
+
+    @detail_route()
+    def replies(self, request, pk=None):
+        return self.get_thread_response(parent_id=self.get_object().id)
@@ -1,221 +1,376 @@
 from datetime import timedelta
+import io
 import itertools
+import os
 import random
+from multiprocessing import Pool
 
 import faker
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.utils import timezone
 
 from profiles.models import User, Profile
 from videos.models import (Category, Comment, CommentVote, Tag, Video,
                            VideoVote, ViewCount)
-from videos.mixins import VideoAPIMixin
-
-fake = faker.Factory.create()
-
-
-def exclude_user(user_ids, id_to_exclude):
-    """
-    Helper function to simplify excluding a user_id from a list
-    """
-    id_index = user_ids.index(id_to_exclude)
-    return user_ids[:id_index] + user_ids[id_index+1:]
-
-
-def populate_category_table():
-    """
-    Populate youtube categories from the category list api call for the US
-    """
-    # By inspection I found that categories are the same across supported
-    # youtube regions
-    parameters = dict(part='snippet', regionCode='US')
-    JSON = VideoAPIMixin._get_info_from_api('videoCategories',
-                                            params=parameters)
-    categories = [Category(pk=data['id'], title=data['snippet']['title'])
-                  for data
-                  in JSON['items']]
-    Category.objects.bulk_create(categories)
-
-
-def populate_user_table():
-    """
-    Create 100 random users to associate with video submissions, comments, etc
-    done using bulk create with the same password hash as the first user
-    created normally
-    """
-    # Create the first fake user from which a hashed password will be gathered
-    # for future entries
-    first_user = User.objects.create_user(fake.user_name(),
-                                          fake.email(),
-                                          fake.password())
-    first_user.save()
-    first_user.profile.blurb = fake.text
-    first_user.profile.website = fake.url
-    first_user.profile.save()
-    hashed_password = first_user.password
-    fake_users = [User(username=fake.user_name(),
-                       first_name=fake.first_name(),
-                       last_name=fake.last_name(),
-                       email=fake.email(),
-                       password=hashed_password)
-                  for index
-                  in range(99)]
-    User.objects.bulk_create(fake_users)
-    user_ids = list(User.objects.values_list('id', flat=True))
-    # Exclude first_user id as a profile has already been created for it
-    user_ids.remove(first_user.id)
-    # Create profiles for all bulk created users
-    profiles = [Profile(user_id=id, blurb=fake.text, website=fake.url)
-                for id
-                in user_ids]
-    Profile.objects.bulk_create(profiles)
-
-
-def populate_video_table():
-    """
-    Populate video table by querying 50 videos from each category from
-    youtube
-    """
-    user_ids = User.objects.values_list('id', flat=True)
-    parameters = dict(part='id',
-                      fields='items/id/videoId',
-                      maxResults=50,
-                      # Don't need to be embarassed while testing
-                      safeSearch='strict',
-                      type='video',
-                      # Only want to allow embeddable videos for dev database
-                      videoEmbeddable='true')
-    responses = [VideoAPIMixin._get_info_from_api('search', params={
-                     **parameters, **{'videoCategoryId': category_id}})
-                 for category_id
-                 in Category.objects.values_list('id', flat=True)]
-    video_ids = list(itertools.chain(*[[data['id']['videoId']
-                                        for data
-                                        in JSON['items']]
-                                       for JSON
-                                       in responses]))
-    user_index = 0
-    for index in range(0, len(video_ids), 50):
-        Video.objects.create_videos(user_ids[user_index],
-                                    *video_ids[index:index+50])
-        user_index += 1
-
-
-def populate_user_relationships():
-    """
-    Creates random relationships for users with other users, categories, tags
-    and videos
-    """
-    id_objects = [Category, User, Tag, Video]
-    id_map = map(lambda x: x.objects.values_list('id', flat=True), id_objects)
-    category_ids, user_ids, tag_ids, video_ids = [list(query)
-                                                  for query
-                                                  in list(id_map)]
-    for user in User.objects.iterator():
-        user.favorite_videos.add(*random.sample(video_ids, 10))
-        user.followed_categories.add(*random.sample(category_ids, 10))
-        user.followed_tags.add(*random.sample(tag_ids, 50))
-        user.following.add(*random.sample(exclude_user(user_ids, user.id), 5))
-
-
-def populate_comment_table():
-    """
-    Generate comment data by having each user generate comments for each
-    video and then randomly generate 1000 comments on randomly selected
-    existing comments
-    """
-    user_ids = list(User.objects.values_list('id', flat=True))
-    video_ids = list(Video.objects.values_list('id', flat=True))
-    # Generate comments from all users for all videos
-    video_comments = [Comment(text=fake.text(),
-                              commenter_id=user_id,
-                              video_id=video_id)
-                      for user_id in user_ids
-                      for video_id in video_ids]
-    Comment.objects.bulk_create(video_comments)
-    # Generate random comments to comments from all users
-    for number_of_generations in range(1000):
-        comments = [Comment(text=fake.text(),
-                            commenter_id=random.choice(user_ids),
-                            parent_id=comment.id,
-                            video_id=comment.video_id)
-                    for comment
-                    in Comment.objects.all().order_by('?')[:100]]
-        Comment.objects.bulk_create(comments)
-
-
-def populate_user_votes_comments():
-    """
-    Populate user voting data by having each user randomly vote for
-    10,000 comments.
-    """
-    comment_ids = list(Comment.objects.values_list('id', flat=True))
-    user_ids = list(User.objects.values_list('id', flat=True))
-    for user_id in user_ids:
-        comments = random.sample(comment_ids, 10000)  # 10,000 is 5% of 200,000
-        positive_votes = [CommentVote(value=1,
-                                      comment_id=comment_id,
-                                      voter_id=user_id)
-                          for comment_id
-                          in comments[:5000]]
-        negative_votes = [CommentVote(value=-1,
-                                      comment_id=comment_id,
-                                      voter_id=user_id)
-                          for comment_id
-                          in comments[5000:]]
-        votes = itertools.chain(positive_votes, negative_votes)
-        CommentVote.objects.bulk_create(votes)
-
-
-def populate_user_votes_videos():
-    """
-    Populate user voting data by having each user randomly vote for
-    50 videos
-    """
-    video_ids = set(Video.objects.values_list('id', flat=True))
-    users = list(User.objects.all())
-    for user in users:
-        # User has already voted for videos they uploaded
-        user_videos = set(user.uploaded_videos.values_list('id', flat=True))
-        not_user_videos = video_ids - user_videos
-        videos = random.sample(not_user_videos, 50)  # 50 is 5% of 1,000
-        votes = [VideoVote(value=1,
-                           video_id=video_id,
-                           voter_id=user.id)
-                 for video_id
-                 in videos]
-        VideoVote.objects.bulk_create(votes)
-
-
-def populate_video_viewcounts():
-    """
-    Simulate video comment viewcounts by subtracting a random amount of views
-    from a videos intial viewcount and associating the difference with a day
-    before the day the viewcount was gathered from. Continuing until the count
-    goes to zero
-    """
-    past_views = []
-    for viewcount in ViewCount.objects.iterator():
-        end_time = viewcount.count_datetime
-        video_id = viewcount.video_id
-        count = viewcount.views
-        viewcounts = []
-        while count > 0:
-            count -= random.randint(0, count)
-            viewcounts.append(count)
-        past_views.append([ViewCount(video_id=video_id,
-                                     count_datetime=(
-                                         end_time - timedelta(days=day+1)),
-                                     views=count)
-                           for day, count
-                           in enumerate(viewcounts)])
-    ViewCount.objects.bulk_create(itertools.chain(*past_views))
-
-
-def populate_tables():
-    populate_category_table()
-    populate_user_table()
-    populate_video_table()
-    populate_user_relationships()
-    populate_comment_table()
-    populate_user_votes_comments()
-    populate_user_votes_videos()
-    populate_video_viewcounts()
+
+# Rows generated by each task handed to a worker process
+GENERATE_BATCH_SIZE = 5000
+# Rows loaded by a single COPY
+COPY_BATCH_SIZE = 10000
+# Rows seed_tables generates for each of its scale factors: users, videos,
+# comments on each video and votes by each user on both videos and comments
+SCALE = dict(users=100, videos=1000, comments=20, votes=50)
+# Categories created by seed_tables in place of the youtube ones
+CATEGORY_TITLES = ('Film & Animation', 'Autos & Vehicles', 'Music',
+                   'Pets & Animals', 'Sports', 'Travel & Events', 'Gaming',
+                   'People & Blogs', 'Comedy', 'Entertainment',
+                   'News & Politics', 'Howto & Style', 'Education',
+                   'Science & Technology')
+# Shape of the seeded data
+TAGS_PER_VIDEO = 5
+VIEWCOUNT_DAYS = 7
+REPLY_GENERATIONS = 3
+FAVORITES, FOLLOWED_CATEGORIES, FOLLOWED_TAGS, FOLLOWING = 10, 3, 10, 5
+# Distinct texts each worker makes up and picks from, faker is too slow to
+# write every comment from scratch
+TEXTS = 1000
+
+# Id arrays shared with the worker processes by init_worker
+_shared = {}
+
+
+def copy_value(value):
+    """
+    Helper function to format a value for the text format of COPY
+    """
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\')
+                      .replace('\t', '\\t')
+                      .replace('\n', '\\n')
+                      .replace('\r', '\\r'))
+
+
+def load_rows(model, columns, rows):
+    """
+    Load rows of values for the given columns into the table of a model,
+    through COPY on postgres and multi-row inserts elsewhere. Rows can be any
+    iterable and are loaded a batch at a time without model instances
+    """
+    fields = [model._meta.get_field(column) for column in columns]
+    table = connection.ops.quote_name(model._meta.db_table)
+    names = ', '.join(connection.ops.quote_name(field.column)
+                      for field
+                      in fields)
+    if connection.vendor == 'postgresql':
+        batch_size = COPY_BATCH_SIZE
+    else:
+        batch_size = connection.ops.bulk_batch_size(fields, [None] * 10000)
+    rows = iter(rows)
+    with connection.cursor() as cursor:
+        while True:
+            batch = [[field.get_db_prep_save(value, connection)
+                      for field, value
+                      in zip(fields, row)]
+                     for row
+                     in itertools.islice(rows, batch_size)]
+            if not batch:
+                return
+            if connection.vendor == 'postgresql':
+                data = io.StringIO(''.join(
+                        '\t'.join(map(copy_value, row)) + '\n'
+                        for row
+                        in batch))
+                cursor.copy_expert('COPY {} ({}) FROM STDIN'.format(table,
+                                                                    names),
+                                   data)
+            else:
+                placeholders = '({})'.format(', '.join(['%s'] * len(fields)))
+                cursor.execute('INSERT INTO {} ({}) VALUES {}'.format(
+                                   table,
+                                   names,
+                                   ', '.join([placeholders] * len(batch))),
+                               list(itertools.chain(*batch)))
+
+
+def init_worker(shared):
+    _shared.clear()
+    _shared.update(shared)
+
+
+def run_task(task):
+    """
+    Generate the rows of one task in a worker process, each task seeding its
+    own random generators so the data does not depend on the processes used
+    """
+    function, start, size, seed = task
+    rng = random.Random(seed)
+    worker_fake = faker.Factory.create()
+    worker_fake.seed(seed)
+    texts = [worker_fake.text() for index in range(min(TEXTS, size))]
+    return function(rng, worker_fake, texts, start, size)
+
+
+def generate_rows(function, count, shared=None, processes=1, seed=0):
+    """
+    Generator yielding the rows function makes for count items, split into
+    tasks of GENERATE_BATCH_SIZE items spread over processes worker
+    processes, every core when processes is None. Function is called with a
+    random generator, a faker, a list of made up texts, the index of the
+    first item and the number of items and reads any ids it picks from out of
+    shared
+    """
+    tasks = [(function, start, min(GENERATE_BATCH_SIZE, count - start),
+              seed * 1000003 + start)
+             for start
+             in range(0, count, GENERATE_BATCH_SIZE)]
+    processes = min(processes or os.cpu_count() or 1, len(tasks) or 1)
+    if processes == 1:
+        init_worker(shared or {})
+        try:
+            for task in tasks:
+                yield from run_task(task)
+        finally:
+            _shared.clear()
+        return
+    with Pool(processes, init_worker, (shared or {},)) as pool:
+        for rows in pool.imap(run_task, tasks):
+            yield from rows
+
+
+# Usernames and youtube ids are made unique by the index of the row, offset
+# by the last id already in the table so seeding can be repeated
+def user_rows(rng, fake, texts, start, size):
+    return [(_shared['password'], False,
+             '{}{}'.format(fake.user_name()[:18],
+                           _shared['offset'] + start + index),
+             fake.first_name()[:30], fake.last_name()[:30], fake.email(),
+             False, True, _shared['now'], False)
+            for index
+            in range(size)]
+
+
+def profile_rows(rng, fake, texts, start, size):
+    return [(user_id, rng.choice(texts), fake.url())
+            for user_id
+            in _shared['user_ids'][start:start + size]]
+
+
+def tag_rows(rng, fake, texts, start, size):
+    return [('{}{}'.format(fake.word(), _shared['offset'] + start + index),)
+            for index
+            in range(size)]
+
+
+def video_rows(rng, fake, texts, start, size):
+    now = _shared['now']
+    rows = []
+    for index in range(size):
+        # Submitted over the last two months so feeds, which only hold
+        # recent submissions, have videos in them
+        created = now - timedelta(seconds=rng.randint(0, 60 * 86400))
+        published = created - timedelta(seconds=rng.randint(0,
+                                                            2 * 365 * 86400))
+        # Views follow a long tail like real videos
+        views = int(100 * rng.paretovariate(1.2))
+        rows.append((rng.choice(texts)[:100], rng.choice(texts), published,
+                     created, now, 'seed{:07d}'.format(
+                         _shared['offset'] + start + index), 0, 0,
+                     0, views, now, rng.choice(_shared['category_ids']),
+                     rng.choice(_shared['user_ids'])))
+    return rows
+
+
+def viewcount_rows(rng, fake, texts, start, size):
+    """
+    Daily view counts leading up to the latest views of each video
+    """
+    now = _shared['now']
+    return [(video_id, int(views * (1 - day / VIEWCOUNT_DAYS)),
+             now - timedelta(days=day))
+            for video_id, views in _shared['videos'][start:start + size]
+            for day in range(VIEWCOUNT_DAYS)]
+
+
+def video_tag_rows(rng, fake, texts, start, size):
+    tag_ids = _shared['tag_ids']
+    return [(video_id, tag_id)
+            for video_id in _shared['video_ids'][start:start + size]
+            for tag_id in rng.sample(tag_ids, min(TAGS_PER_VIDEO,
+                                                  len(tag_ids)))]
+
+
+def comment_rows(rng, fake, texts, start, size):
+    """
+    Comments on random videos, or replies to random comments once there are
+    comments to reply to
+    """
+    now = _shared['now']
+    user_ids = _shared['user_ids']
+    parents = _shared.get('comments')
+    rows = []
+    for index in range(size):
+        if parents:
+            parent_id, video_id = rng.choice(parents)
+        else:
+            parent_id, video_id = None, rng.choice(_shared['video_ids'])
+        rows.append((rng.choice(texts),
+                     now - timedelta(seconds=rng.randint(0, 30 * 86400)),
+                     0, 0, 0, rng.choice(user_ids), parent_id, video_id))
+    return rows
+
+
+def vote_rows(rng, fake, texts, start, size):
+    """
+    Votes by each user on distinct random targets, mostly upvotes
+    """
+    target_ids = _shared['target_ids']
+    votes = min(_shared['votes'], len(target_ids))
+    return [(1 if rng.random() < 0.8 else -1, _shared['now'], target_id,
+             user_id)
+            for user_id in _shared['user_ids'][start:start + size]
+            for target_id in rng.sample(target_ids, votes)]
+
+
+def comment_vote_rows(*args):
+    # Comment votes have no updated column
+    return [row[:1] + row[2:] for row in vote_rows(*args)]
+
+
+def relation_rows(rng, fake, texts, start, size):
+    """
+    Each user related to distinct random targets, other than themselves when
+    the targets are users
+    """
+    target_ids = _shared['target_ids']
+    count = _shared['relations']
+    rows = []
+    for user_id in _shared['user_ids'][start:start + size]:
+        # One target more is drawn in case the user is among them
+        targets = rng.sample(target_ids, min(count + 1, len(target_ids)))
+        if _shared.get('users'):
+            targets = [target_id
+                       for target_id
+                       in targets
+                       if target_id != user_id]
+        rows.extend((target_id, user_id) for target_id in targets[:count])
+    return rows
+
+
+def new_ids(model, last_id, *fields):
+    """
+    Helper function listing the ids, or the given fields, of the rows loaded
+    into a table after the row with last_id
+    """
+    rows = model.objects.filter(id__gt=last_id or 0).order_by('id')
+    if fields:
+        return list(rows.values_list('id', *fields))
+    return list(rows.values_list('id', flat=True))
+
+
+def last_id(model):
+    row = model.objects.order_by('-id').values_list('id', flat=True)[:1]
+    return row[0] if row else None
+
+
+def seed_tables(processes=1, seed=0, stdout=None, **scale):
+    """
+    Populate every table with synthetic data without calling the youtube api.
+    The scale factors users, videos, comments and votes override SCALE.
+    Rows are generated in batches, spread over processes worker processes or
+    every core when it is None, and loaded through COPY on postgres. Random
+    parents and targets are picked from the ids already loaded, held in
+    memory. Once everything is loaded the vote counters and search index are
+    rebuilt and the tables computed from the rest, hot scores, related
+    videos, recommendations and feeds, are filled in, reporting to stdout
+    when given
+    """
+    scale = dict(SCALE, **scale)
+    now = timezone.now()
+    # Hashing is slow on purpose, every seeded user shares one hash
+    shared = dict(now=now, password=make_password('password'))
+
+    def load(model, columns, function, count, seed_offset, **extra):
+        load_rows(model, columns, generate_rows(function,
+                                                count,
+                                                dict(shared, **extra),
+                                                processes,
+                                                seed + seed_offset))
+
+    with transaction.atomic():
+        category_id = last_id(Category)
+        load_rows(Category, ['title'], ((title,) for title in CATEGORY_TITLES))
+        shared['category_ids'] = new_ids(Category, category_id)
+
+        user_id = last_id(User)
+        load(User, ['password', 'is_superuser', 'username', 'first_name',
+                    'last_name', 'email', 'is_staff', 'is_active',
+                    'date_joined', 'email_verified'],
+             user_rows, scale['users'], 1, offset=user_id or 0)
+        shared['user_ids'] = new_ids(User, user_id)
+        load(Profile, ['user_id', 'blurb', 'website'],
+             profile_rows, len(shared['user_ids']), 2)
+
+        tag_id = last_id(Tag)
+        load(Tag, ['title'], tag_rows, max(1, scale['videos'] // 2), 3,
+             offset=tag_id or 0)
+        shared['tag_ids'] = new_ids(Tag, tag_id)
+
+        video_id = last_id(Video)
+        load(Video, ['title', 'description', 'published', 'created',
+                     'updated', 'video_id', 'score', 'upvotes', 'downvotes',
+                     'views', 'views_counted', 'category_id', 'uploader_id'],
+             video_rows, scale['videos'], 4, offset=video_id or 0)
+        videos = new_ids(Video, video_id, 'views')
+        shared['video_ids'] = [video[0] for video in videos]
+        load(ViewCount, ['video_id', 'views', 'count_datetime'],
+             viewcount_rows, len(videos), 5, videos=videos)
+        load(Video.tags.through, ['video_id', 'tag_id'],
+             video_tag_rows, len(videos), 6)
+
+        # Half the comments are on videos, the rest replies to comments
+        # loaded by the generations before
+        comment_columns = ['text', 'created', 'score', 'upvotes',
+                           'downvotes', 'commenter_id', 'parent_id',
+                           'video_id']
+        total = scale['comments'] * len(videos)
+        comment_id = last_id(Comment)
+        load(Comment, comment_columns, comment_rows, total // 2, 7)
+        comments = new_ids(Comment, comment_id, 'video_id')
+        for generation in range(REPLY_GENERATIONS):
+            last_comment_id = comments[-1][0] if comments else comment_id
+            load(Comment, comment_columns, comment_rows,
+                 (total - total // 2) // REPLY_GENERATIONS, 8 + generation,
+                 comments=comments)
+            comments.extend(new_ids(Comment, last_comment_id, 'video_id'))
+
+        user_count = len(shared['user_ids'])
+        load(VideoVote, ['value', 'updated', 'video_id', 'voter_id'],
+             vote_rows, user_count, 20,
+             target_ids=shared['video_ids'], votes=scale['votes'])
+        load(CommentVote, ['value', 'comment_id', 'voter_id'],
+             comment_vote_rows,
+             user_count, 21,
+             target_ids=[comment[0] for comment in comments],
+             votes=scale['votes'])
+        for seed_offset, (through, columns, target_ids, count) in enumerate((
+                (Video.favorited_by.through, ['video_id', 'user_id'],
+                 shared['video_ids'], FAVORITES),
+                (Category.followed_by.through, ['category_id', 'user_id'],
+                 shared['category_ids'], FOLLOWED_CATEGORIES),
+                (Tag.followed_by.through, ['tag_id', 'user_id'],
+                 shared['tag_ids'], FOLLOWED_TAGS),
+                (User.following.through, ['to_user_id', 'from_user_id'],
+                 shared['user_ids'], FOLLOWING))):
+            load(through, columns, relation_rows, user_count,
+                 30 + seed_offset, target_ids=target_ids, relations=count,
+                 users=through is User.following.through)
+    call_command('rebuild_vote_counters', stdout=stdout)
+    call_command('rebuild_search_index', stdout=stdout)
+    call_command('rank_videos', full=True, stdout=stdout)
+    call_command('compute_related_videos', stdout=stdout)
+    call_command('compute_recommendations', processes=processes,
+                 stdout=stdout)
+    call_command('rebuild_feeds', stdout=stdout)
@@ -47,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE_CLASSES = [
+    'videos.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -92,6 +93,15 @@ DATABASES = {
     }
 }
 
+# The page cache and leaderboards are shared by every process through this
+# cache, pages rendered and invalidated by one process are seen by the rest
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': os.environ.get('MEMCACHED_LOCATION', '127.0.0.1:11211'),
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.9/ref/settings/#auth-password-validators
@@ -133,3 +143,22 @@ STATIC_URL = '/static/'
 
 # Define a custom user model for authentication
 AUTH_USER_MODEL = 'profiles.User'
+
+# Queries and timings of a sample of requests and of every slow request are
+# logged by videos.instrumentation.InstrumentationMiddleware, configured by a
+# REQUEST_INSTRUMENTATION dictionary
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'videos.instrumentation': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
@@ -0,0 +1,20 @@
+"""
+Settings the tests are run with, the project's settings adjusted to run in a
+single process without logging sampled requests:
+
+    python manage.py test --settings=taste_makers.test_settings
+"""
+
+from taste_makers.settings import *  # noqa
+
+# Tests run in a single process, so the shared cache can be held in memory
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+SILENCED_SYSTEM_CHECKS = ['videos.W001']
+
+# Requests are not sampled, so only the tests of the instrumentation itself
+# log them
+REQUEST_INSTRUMENTATION = {'SAMPLE_RATE': 0}
@@ -1,5 +1,23 @@
 from django.apps import AppConfig
+from django.core import checks
+from django.db.models.signals import post_delete, post_save
 
 
 class VideosConfig(AppConfig):
     name = 'videos'
+
+    def ready(self):
+        from videos.leaderboard import invalidate_leaderboards
+        from videos.models import Video, VideoVote, ViewCount
+        from videos.page_cache import (check_shared_cache,
+                                       invalidate_liked_lists,
+                                       invalidate_video_lists,
+                                       invalidate_viewed_lists)
+        from videos.signals import videos_created, views_counted, votes_counted
+        votes_counted.connect(invalidate_leaderboards, sender=VideoVote)
+        votes_counted.connect(invalidate_liked_lists, sender=VideoVote)
+        views_counted.connect(invalidate_viewed_lists, sender=ViewCount)
+        videos_created.connect(invalidate_video_lists, sender=Video)
+        post_save.connect(invalidate_video_lists, sender=Video)
+        post_delete.connect(invalidate_video_lists, sender=Video)
+        checks.register(check_shared_cache)
@@ -0,0 +1,63 @@
+import math
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def percentile(values, fraction):
+    """
+    Nearest rank percentile of a list of values
+    """
+    ordered = sorted(values)
+    rank = max(1, int(math.ceil(fraction * len(ordered))))
+    return ordered[rank - 1]
+
+
+def measure(function, repeat=20, warmup=2):
+    """
+    Time repeated calls of function, returning latency percentiles in
+    milliseconds and the number of queries a single call makes
+    """
+    for attempt in range(warmup):
+        function()
+    timings = []
+    for attempt in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    # A full query log stops growing, which would hide the queries made
+    connection.queries_log.clear()
+    with CaptureQueriesContext(connection) as queries:
+        function()
+    return {'p50': round(percentile(timings, 0.5), 3),
+            'p90': round(percentile(timings, 0.9), 3),
+            'p99': round(percentile(timings, 0.99), 3),
+            'mean': round(sum(timings) / len(timings), 3),
+            'queries': len(queries)}
+
+
+def compare(results, baseline, threshold=0.2):
+    """
+    Compare benchmark results with a baseline of the same shape, a
+    dictionary of benchmark names to measurements. Returns the change of
+    each benchmark in both, flagged as a regression when it makes more
+    queries or its median latency grew by more than threshold
+    """
+    changes = {}
+    for name, measurement in sorted(results.items()):
+        before = baseline.get(name)
+        if before is None:
+            continue
+        ratio = (measurement['p50'] / before['p50']
+                 if before['p50'] else None)
+        changes[name] = {
+            'p50': measurement['p50'],
+            'baseline_p50': before['p50'],
+            'ratio': round(ratio, 3) if ratio is not None else None,
+            'queries': measurement['queries'],
+            'baseline_queries': before['queries'],
+            'regression': (measurement['queries'] > before['queries'] or
+                           (ratio is not None and ratio > 1 + threshold)),
+        }
+    return changes
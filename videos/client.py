@@ -0,0 +1,185 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from videos.profiling import metrics
+from videos.transports import HTTPTransport
+
+
+class APIReturnedError(Exception):
+    """
+    The api response contains an error, occurs when response.ok is False
+    """
+    def __init__(self, error_message=None):
+        self.error_message = error_message
+
+    def __str__(self):
+        if self.error_message:
+            return repr(self.error_message)
+        else:
+            return 'Not specified in api response'
+
+
+class QuotaExceededError(APIReturnedError):
+    """
+    The api refused the request because the quota of the api key is used up,
+    which retrying will not change until the quota is reset
+    """
+
+
+class VideoAPIClient:
+    """
+    Client for the youtube data api that splits requests for many ids into
+    batches the api accepts, makes independent requests concurrently through
+    a bounded pool of threads and retries requests that fail temporarily.
+    Requests go through a transport, over the network unless another is given
+    """
+    # Constants
+    # Largest number of ids the api accepts in the id parameter
+    MAX_IDS = 50
+    # Responses with these status codes are retried
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    # Error reasons given with a 403 response that go away after waiting
+    RETRY_REASONS = ('backendError',
+                     'rateLimitExceeded',
+                     'userRateLimitExceeded')
+    # Error reasons given when the quota is used up, raised as
+    # QuotaExceededError without retrying
+    QUOTA_REASONS = ('dailyLimitExceeded',
+                     'quotaExceeded')
+    # Quota units each request to a uri costs, retries included, every other
+    # uri costs a single unit
+    QUOTA_COSTS = {'search': 100}
+
+    def __init__(self, api_url, api_key, max_workers=8, max_retries=5,
+                 backoff=0.5, max_backoff=30, timeout=30, transport=None):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.transport = transport or HTTPTransport()
+
+    def get(self, uri, params):
+        """
+        Make a single request to the api returning the decoded JSON response,
+        recording its latency, the items it returned out of those requested
+        and the retries and quota it took in metrics
+        """
+        metrics.increment('api.{}.calls'.format(uri))
+        with metrics.timer('api.{}.ms'.format(uri)):
+            JSON = self.request(uri, params)
+        if 'id' in params:
+            requested = len(str(params['id']).split(','))
+        else:
+            requested = int(params.get('maxResults', 0))
+        metrics.increment('api.{}.items_requested'.format(uri), requested)
+        metrics.increment('api.{}.items_returned'.format(uri),
+                          len(JSON.get('items', [])))
+        return JSON
+
+    def request(self, uri, params):
+        """
+        Make a request, retrying it while it fails temporarily. Running out of
+        quota raises QuotaExceededError straight away
+        """
+        url = self.api_url + uri
+        parameters = {**{'key': self.api_key}, **params}
+        attempt = 0
+        while True:
+            metrics.increment('api.quota_units',
+                              self.QUOTA_COSTS.get(uri, 1))
+            if attempt:
+                metrics.increment('api.{}.retries'.format(uri))
+            try:
+                response = self.transport.get(url, parameters, self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    metrics.increment('api.{}.errors'.format(uri))
+                    raise
+            else:
+                metrics.observe('api.{}.bytes'.format(uri),
+                                len(response.content))
+                if response.ok:
+                    return response.json()
+                error = self.get_error(response)
+                if self.get_reasons(error) & set(self.QUOTA_REASONS):
+                    metrics.increment('api.{}.errors'.format(uri))
+                    raise QuotaExceededError(error)
+                if (attempt >= self.max_retries or
+                        not self.should_retry(response, error)):
+                    metrics.increment('api.{}.errors'.format(uri))
+                    raise APIReturnedError(error)
+            self.wait(attempt)
+            attempt += 1
+
+    def get_many(self, calls):
+        """
+        Make many (uri, params) requests concurrently, returning their
+        responses in the same order the requests were given
+        """
+        calls = list(calls)
+        if len(calls) <= 1 or self.max_workers <= 1:
+            return [self.get(uri, params) for uri, params in calls]
+        workers = min(self.max_workers, len(calls))
+
+        def work(call):
+            with metrics.profile_worker():
+                return self.get(*call)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(work, calls))
+
+    def get_by_ids(self, uri, params, ids, id_param='id'):
+        """
+        Request information on any number of ids, splitting them into as few
+        requests as the api allows. The items from each response are joined
+        in the order the ids were given
+        """
+        ids = list(ids)
+        batches = [{**params,
+                    **{id_param: ','.join(ids[index:index+self.MAX_IDS])}}
+                   for index
+                   in range(0, len(ids), self.MAX_IDS)]
+        responses = self.get_many((uri, batch) for batch in batches)
+        return {'items': [item
+                          for response in responses
+                          for item in response.get('items', [])]}
+
+    def get_error(self, response):
+        """
+        Find the error object in a failed response, which will not exist if
+        the failure happened before reaching the api
+        """
+        try:
+            return response.json().get('error', None)
+        except ValueError:
+            return None
+
+    def get_reasons(self, error):
+        """
+        The set of reasons given in the error object of a failed response
+        """
+        if not error:
+            return set()
+        return set(detail.get('reason')
+                   for detail
+                   in error.get('errors', []))
+
+    def should_retry(self, response, error):
+        if response.status_code in self.RETRY_STATUSES:
+            return True
+        if response.status_code == 403:
+            return bool(self.get_reasons(error) & set(self.RETRY_REASONS))
+        return False
+
+    def wait(self, attempt):
+        """
+        Exponential backoff with jitter so concurrent requests that failed
+        together do not all retry at the same moment
+        """
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        time.sleep(delay * random.uniform(0.5, 1))
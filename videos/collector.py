@@ -0,0 +1,149 @@
+import json
+import math
+import os
+import time
+
+from django.db import transaction
+
+from videos.client import VideoAPIClient
+from videos.mixins import VideoAPIMixin
+from videos.models import Video, ViewCount
+from videos.profiling import metrics
+from videos.ratelimit import TokenBucket
+
+
+class ViewCountCollector(VideoAPIMixin):
+    """
+    Walks every video in batches recording a new view count snapshot for
+    each. Requests are rate limited to fit within the daily api quota and the
+    last video counted is checkpointed so a pass interrupted by a crash picks
+    up where it left off
+    """
+    # Constants
+    # Quota units the api allows each day and the cost of a videos request
+    DAILY_QUOTA = 10000
+    REQUEST_COST = 1
+    # Videos counted by each request, the most ids the api accepts
+    BATCH_SIZE = 50
+
+    def __init__(self, checkpoint_file, daily_quota=DAILY_QUOTA, burst=10,
+                 batch_size=BATCH_SIZE, limiter=None, clock=time.monotonic):
+        self.checkpoint_file = checkpoint_file
+        self.batch_size = batch_size
+        self.limiter = limiter or TokenBucket(daily_quota / (24 * 60 * 60),
+                                              burst)
+        self.clock = clock
+        self.started = clock()
+        self.videos_counted = 0
+        self.requests_made = 0
+        self.quota_used = 0
+        self.seconds_waited = 0
+
+    def read_checkpoint(self):
+        """
+        Returns the id of the last video counted by an unfinished pass
+        """
+        try:
+            with open(self.checkpoint_file, 'r') as f:
+                return json.load(f)['last_id']
+        except FileNotFoundError:
+            return 0
+
+    def write_checkpoint(self, last_id):
+        # Write to a temporary file first so a crash can never leave a
+        # partially written checkpoint behind
+        temporary_file = self.checkpoint_file + '.tmp'
+        with open(temporary_file, 'w') as f:
+            json.dump({'last_id': last_id}, f)
+        os.replace(temporary_file, self.checkpoint_file)
+
+    def clear_checkpoint(self):
+        try:
+            os.remove(self.checkpoint_file)
+        except FileNotFoundError:
+            pass
+
+    def batches(self, after_id=0):
+        """
+        Generator yielding videos in batches ordered by id. Each batch is found
+        by seeking past the last id of the one before rather than using an
+        offset so every batch costs the same to fetch
+        """
+        while True:
+            videos = Video.objects.filter(id__gt=after_id).order_by('id')
+            batch = list(videos.only('id', 'video_id')[:self.batch_size])
+            if not batch:
+                return
+            yield batch
+            after_id = batch[-1].id
+
+    @classmethod
+    def get_batch_cost(cls, batch_size):
+        """
+        Quota units a batch of videos costs when none of its requests are
+        retried
+        """
+        return (cls.REQUEST_COST *
+                math.ceil(batch_size / VideoAPIClient.MAX_IDS))
+
+    def take(self, tokens):
+        """
+        Take any number of tokens from the rate limiter, a bucketful at a
+        time
+        """
+        while tokens > 0:
+            taken = min(tokens, self.limiter.capacity)
+            self.seconds_waited += self.limiter.acquire(taken)
+            tokens -= taken
+
+    def count_views(self, videos):
+        """
+        Fetch the statistics of a batch of videos and record their view
+        counts. The quota used is read from the quota units the api client
+        counts for every attempt, so retries are paid for too
+        """
+        cost = self.get_batch_cost(len(videos))
+        self.seconds_waited += self.limiter.acquire(cost)
+        quota_units = metrics.get_counter('api.quota_units')
+        parameters = dict(part='statistics',
+                          fields='items(id, statistics/viewCount)')
+        statistics = {video_id: info['statistics']
+                      for video_id, info
+                      in self._get_items_by_id(
+                          'videos',
+                          parameters,
+                          [video.video_id for video in videos]).items()}
+        used = metrics.get_counter('api.quota_units') - quota_units
+        # Retries used quota the limiter was not asked for, take it now so the
+        # batches that follow wait for it
+        self.take(used - cost)
+        self.requests_made += cost // self.REQUEST_COST
+        self.quota_used += used
+        with transaction.atomic():
+            ViewCount.objects.create_viewcounts(*videos,
+                                                statistics=statistics)
+        self.videos_counted += len(videos)
+
+    def collect(self, progress=None):
+        """
+        Make a pass over every video, resuming an unfinished pass if there is
+        a checkpoint. progress is called with the collector after each batch
+        """
+        for batch in self.batches(self.read_checkpoint()):
+            self.count_views(batch)
+            self.write_checkpoint(batch[-1].id)
+            if progress is not None:
+                progress(self)
+        self.clear_checkpoint()
+
+    @property
+    def metrics(self):
+        elapsed = self.clock() - self.started
+        return {'videos_counted': self.videos_counted,
+                'requests_made': self.requests_made,
+                'quota_used': self.quota_used,
+                'seconds_elapsed': round(elapsed, 3),
+                'seconds_rate_limited': round(self.seconds_waited, 3),
+                'videos_per_second': (round(self.videos_counted / elapsed, 3)
+                                      if elapsed
+                                      else 0)}
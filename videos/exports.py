@@ -0,0 +1,113 @@
+import csv
+import json
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+
+from django.db.models import Max
+
+from videos.models import Comment, Video, VideoVote, ViewCount
+
+# Rows read from the database by each query of an export
+CHUNK_SIZE = 2000
+# How far the watermark of an export is set back from the newest row read,
+# so rows stamped before it by transactions that had not committed yet are
+# exported the next time
+SAFETY_MARGIN = timedelta(minutes=5)
+
+Export = namedtuple('Export', ['model', 'fields', 'since_field'])
+
+# Tables that can be exported, the columns exported from each and the column
+# incremental exports are filtered on. Incremental exports only upsert rows,
+# rows deleted since are not carried by them and are only missing from a
+# full export
+EXPORTS = OrderedDict([
+    ('videos', Export(Video,
+                      ('id', 'video_id', 'title', 'description',
+                       'uploader_id', 'category_id', 'score', 'upvotes',
+                       'downvotes', 'views', 'published', 'created',
+                       'updated'),
+                      'updated')),
+    ('votes', Export(VideoVote,
+                     ('id', 'video_id', 'voter_id', 'value', 'updated'),
+                     'updated')),
+    ('viewcounts', Export(ViewCount,
+                          ('id', 'video_id', 'views', 'count_datetime'),
+                          'count_datetime')),
+    ('comments', Export(Comment,
+                        ('id', 'video_id', 'parent_id', 'commenter_id',
+                         'text', 'score', 'upvotes', 'downvotes', 'created'),
+                        'created')),
+])
+
+
+def export_rows(export, since=None, chunk_size=CHUNK_SIZE):
+    """
+    Generator yielding the exported columns of every row of a table as
+    tuples, only rows changed at or after since when it is given. Rows are
+    read in chunks ordered by primary key, each seeking past the last key
+    of the one before, so memory use does not depend on the size of the
+    table
+    """
+    queryset = export.model.objects.all()
+    if since is not None:
+        queryset = queryset.filter(**{export.since_field + '__gte': since})
+    last_id = None
+    while True:
+        chunk = queryset.order_by('id')
+        if last_id is not None:
+            chunk = chunk.filter(id__gt=last_id)
+        rows = list(chunk.values_list(*export.fields)[:chunk_size])
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1][0]
+
+
+def get_watermark(export, since=None, margin=SAFETY_MARGIN):
+    """
+    The since to pass to the next incremental export, the newest time the
+    rows to export were changed set back by margin. Rows changed within the
+    margin are exported again, so exports have to be upserted by id. since
+    itself is kept when there are no rows to export
+    """
+    queryset = export.model.objects.all()
+    if since is not None:
+        queryset = queryset.filter(**{export.since_field + '__gte': since})
+    newest = queryset.aggregate(newest=Max(export.since_field))['newest']
+    if newest is None:
+        return since
+    return newest - margin
+
+
+def format_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def ndjson_lines(fields, rows):
+    """
+    Generator yielding each row as a line of newline delimited json
+    """
+    for row in rows:
+        yield json.dumps(OrderedDict(zip(fields, map(format_value, row))),
+                         ensure_ascii=False) + '\n'
+
+
+class Echo:
+    """
+    File like object handing back whatever is written to it, lets csv.writer
+    format single rows without buffering them
+    """
+    def write(self, value):
+        return value
+
+
+def csv_lines(fields, rows):
+    """
+    Generator yielding a header line and then each row as a line of csv
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([format_value(value) for value in row])
@@ -0,0 +1,271 @@
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Options of the request instrumentation, any of which can be overridden by a
+# REQUEST_INSTRUMENTATION dictionary in the settings
+DEFAULTS = {
+    'ENABLED': True,
+    # Fraction of requests logged, slow requests are always logged
+    'SAMPLE_RATE': 0.01,
+    # Requests taking longer than this many milliseconds or making more
+    # queries than MAX_QUERIES are logged as slow
+    'SLOW_REQUEST_MS': 500,
+    'MAX_QUERIES': 50,
+    # Statements taking the most time in total listed for each request
+    'SLOWEST_STATEMENTS': 5,
+    # Whether timings are sent to the client in a Server-Timing header,
+    # which tells anyone making requests how the site spends its time
+    'SERVER_TIMING': False,
+}
+
+# Statistics of the request being handled by each thread
+_local = threading.local()
+
+
+def get_options():
+    options = dict(DEFAULTS)
+    options.update(getattr(settings, 'REQUEST_INSTRUMENTATION', {}))
+    return options
+
+
+def normalize_sql(sql):
+    """
+    Helper function reducing a statement to its shape, with placeholders and
+    literals replaced by ? and lists of them collapsed, so statements only
+    differing in their values are counted together
+    """
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'%s|\b\d+(?:\.\d+)?\b', '?', sql)
+    sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(...)', sql)
+    sql = re.sub(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+', '(...)', sql)
+    return ' '.join(sql.split())[:500]
+
+
+class RequestStats(object):
+    """
+    Queries made and time spent in each part of handling a request
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        # Count and total time of each statement, normalized only when
+        # reported to keep the cost of each query down
+        self.statements = defaultdict(lambda: [0, 0.0])
+        self.timings = defaultdict(float)
+        self.active = set()
+
+    def record_query(self, sql, duration):
+        self.queries += 1
+        self.sql_time += duration
+        statement = self.statements[sql]
+        statement[0] += 1
+        statement[1] += duration
+
+    def get_report(self, slowest):
+        """
+        Returns the statistics with times in milliseconds, listing the
+        slowest statements. A statement made many times, such as a query for
+        each row of a page, shows up as one statement with a high count
+        """
+        report = {'total_ms': (time.perf_counter() - self.started) * 1000,
+                  'queries': self.queries,
+                  'sql_ms': self.sql_time * 1000}
+        for name, duration in self.timings.items():
+            report['{}_ms'.format(name)] = duration * 1000
+        report = {name: round(value, 3) for name, value in report.items()}
+        statements = defaultdict(lambda: [0, 0.0])
+        for sql, (count, duration) in self.statements.items():
+            statement = statements[normalize_sql(sql)]
+            statement[0] += count
+            statement[1] += duration
+        report['slowest'] = [{'sql': sql,
+                              'count': count,
+                              'ms': round(duration * 1000, 3)}
+                             for sql, (count, duration)
+                             in sorted(statements.items(),
+                                       key=lambda item: -item[1][1])[:slowest]]
+        return report
+
+
+def get_stats():
+    return getattr(_local, 'stats', None)
+
+
+@contextmanager
+def timed(name):
+    """
+    Add the time spent in the block to the named timing of the current
+    request, if it is instrumented. Blocks nested inside another block of
+    the same name are only counted once
+    """
+    stats = get_stats()
+    if stats is None or name in stats.active:
+        yield
+        return
+    stats.active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.timings[name] += time.perf_counter() - started
+        stats.active.discard(name)
+
+
+class InstrumentedCursor(object):
+    """
+    Wraps a database cursor, recording how long each statement it executes
+    takes in the statistics of the current request
+    """
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return self.cursor.__exit__(*exc_info)
+
+    def record(self, sql, method, *args):
+        stats = get_stats()
+        if stats is None:
+            return method(sql, *args)
+        started = time.perf_counter()
+        try:
+            return method(sql, *args)
+        finally:
+            stats.record_query(sql, time.perf_counter() - started)
+
+    def execute(self, sql, params=None):
+        return self.record(sql, self.cursor.execute, params)
+
+    def executemany(self, sql, param_list):
+        return self.record(sql, self.cursor.executemany, param_list)
+
+
+def instrument(connection):
+    """
+    Helper function making every cursor of a connection an
+    InstrumentedCursor, whether or not queries are being logged
+    """
+    if getattr(connection, 'instrumented', False):
+        return
+    for name in ('make_cursor', 'make_debug_cursor'):
+        make_cursor = getattr(connection, name)
+        setattr(connection,
+                name,
+                lambda cursor, make_cursor=make_cursor: InstrumentedCursor(
+                    make_cursor(cursor)))
+    connection.instrumented = True
+
+
+def get_server_timing(report):
+    metrics = ['db;dur={};desc="{} queries"'.format(report['sql_ms'],
+                                                    report['queries'])]
+    metrics.extend('{};dur={}'.format(name[:-3], value)
+                   for name, value
+                   in sorted(report.items())
+                   if name.endswith('_ms') and
+                   name not in ('sql_ms', 'total_ms'))
+    metrics.append('total;dur={}'.format(report['total_ms']))
+    return ', '.join(metrics)
+
+
+class InstrumentationMiddleware(object):
+    """
+    Records the queries, database time and template and serializer render
+    times of each request. A sample of requests and every slow request are
+    logged as JSON lines, and the timings can be sent back in a
+    Server-Timing header. Should come first so it times everything else
+    """
+    def process_request(self, request):
+        _local.stats = None
+        if not get_options()['ENABLED']:
+            return
+        for connection in connections.all():
+            instrument(connection)
+        _local.stats = RequestStats()
+
+    def process_template_response(self, request, response):
+        stats = get_stats()
+        if stats is not None:
+            # Responses are rendered once every middleware has seen them
+            started = time.perf_counter()
+
+            def rendered(response):
+                stats.timings['render'] += time.perf_counter() - started
+            response.add_post_render_callback(rendered)
+        return response
+
+    def process_response(self, request, response):
+        stats = get_stats()
+        _local.stats = None
+        if stats is None:
+            return response
+        if response.streaming:
+            # Streamed responses are rendered as they are sent, after every
+            # middleware has seen them, so they are reported once consumed
+            response.streaming_content = self.stream(
+                    request, response, stats, response.streaming_content)
+            return response
+        self.report(request, response, stats)
+        return response
+
+    def stream(self, request, response, stats, content):
+        """
+        Yield the content of a streamed response, recording the queries
+        and timings made producing each part in the statistics of its
+        request and reporting them once it has been sent or closed
+        """
+        content = iter(content)
+        try:
+            while True:
+                _local.stats = stats
+                try:
+                    chunk = next(content)
+                except StopIteration:
+                    return
+                finally:
+                    _local.stats = None
+                yield chunk
+        finally:
+            self.report(request, response, stats)
+
+    def report(self, request, response, stats):
+        options = get_options()
+        report = stats.get_report(options['SLOWEST_STATEMENTS'])
+        if options['SERVER_TIMING'] and not response.streaming:
+            # The headers of streamed responses are sent before the timings
+            # are known
+            response['Server-Timing'] = get_server_timing(report)
+        slow = []
+        if report['total_ms'] > options['SLOW_REQUEST_MS']:
+            slow.append('time')
+        if report['queries'] > options['MAX_QUERIES']:
+            slow.append('queries')
+        if slow or random.random() < options['SAMPLE_RATE']:
+            report.update(method=request.method,
+                          path=request.path,
+                          status=response.status_code)
+            if slow:
+                report['slow'] = slow
+                logger.warning(json.dumps(report, sort_keys=True))
+            else:
+                logger.info(json.dumps(report, sort_keys=True))
@@ -0,0 +1,131 @@
+import hashlib
+from collections import OrderedDict
+from datetime import timedelta
+from uuid import uuid4
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from videos.models import Video
+from videos.page_cache import get_options
+
+# How far back the videos on each leaderboard were submitted, None for every
+# video ever submitted
+WINDOWS = OrderedDict([('day', timedelta(days=1)),
+                       ('week', timedelta(days=7)),
+                       ('all', None)])
+DEFAULT_COUNT = 20
+MAX_COUNT = 100
+# Windowed leaderboards also change as videos age out of them so they are
+# only cached for this many seconds, the all time leaderboard is cached
+# until a vote changes
+WINDOW_TIMEOUT = 300
+# The leaderboards of each window are keyed by the current version of the
+# window so changing it invalidates all of them whatever their count
+VERSION_KEY = 'leaderboard:version:{}'
+
+
+def get_cache():
+    """
+    Helper function returning the cache shared by every process that the
+    video list pages are cached in, so every process serves the same
+    leaderboards and etags
+    """
+    return caches[get_options()['BACKEND']]
+
+
+def get_version(window):
+    cache = get_cache()
+    key = VERSION_KEY.format(window)
+    version = cache.get(key)
+    if version is None:
+        # Another process may be setting the version at the same time, add
+        # only sets it if it is still missing so everyone agrees on one
+        cache.add(key, uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def get_changed_windows(video_ids, now=None):
+    """
+    Helper function returning the windows whose leaderboards may list any
+    of the videos, those they were submitted within
+    """
+    now = now or timezone.now()
+    created = Video.objects.filter(id__in=video_ids).values_list('created',
+                                                                 flat=True)
+    newest = max(created, default=None)
+    if newest is None:
+        return []
+    return [window
+            for window, period
+            in WINDOWS.items()
+            if period is None or newest >= now - period]
+
+
+def invalidate_leaderboards(object_ids, **kwargs):
+    """
+    Receiver for votes_counted discarding the cached leaderboards of the
+    windows the voted videos were submitted within. It runs again once the
+    transaction the votes were cast in commits so a leaderboard rebuilt from
+    the old counters in the meantime is not served afterwards
+    """
+    windows = get_changed_windows(object_ids)
+    if not windows:
+        return
+
+    def set_versions():
+        get_cache().set_many({VERSION_KEY.format(window): uuid4().hex
+                              for window
+                              in windows},
+                             None)
+    set_versions()
+    transaction.on_commit(set_versions)
+
+
+class Leaderboard(object):
+    """
+    The count most liked videos submitted within a window, cached as the
+    bytes render makes of them along with an etag and the time they were
+    built so clients can make conditional requests
+    """
+    def __init__(self, window='all', count=DEFAULT_COUNT):
+        if window not in WINDOWS:
+            raise ValueError('Unknown leaderboard window {}'.format(window))
+        if not 1 <= count <= MAX_COUNT:
+            raise ValueError('Leaderboards list 1 to {} videos'.format(
+                    MAX_COUNT))
+        self.window = window
+        self.count = count
+
+    def get_videos(self, now=None):
+        videos = Video.objects.order_by_votes()
+        if WINDOWS[self.window] is not None:
+            now = now or timezone.now()
+            videos = videos.filter(created__gte=now - WINDOWS[self.window])
+        return videos[:self.count]
+
+    def get_cache_key(self):
+        return 'leaderboard:{}:{}:{}'.format(self.window,
+                                             get_version(self.window),
+                                             self.count)
+
+    def get(self, render):
+        """
+        Returns a dictionary of the rendered content, its etag and when it
+        was last modified, only rendering the videos again when the cached
+        copy has been invalidated or has expired
+        """
+        cache = get_cache()
+        key = self.get_cache_key()
+        leaderboard = cache.get(key)
+        if leaderboard is None:
+            now = timezone.now()
+            content = render(self.get_videos(now))
+            leaderboard = {'content': content,
+                           'etag': hashlib.md5(content).hexdigest(),
+                           'last_modified': int(now.timestamp())}
+            timeout = None if WINDOWS[self.window] is None else WINDOW_TIMEOUT
+            cache.set(key, leaderboard, timeout)
+        return leaderboard
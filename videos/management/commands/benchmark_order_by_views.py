@@ -0,0 +1,68 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from profiles.models import User
+from videos.benchmarks import measure
+from videos.models import Category, Video, ViewCount
+
+
+class Command(BaseCommand):
+    help = ('Compares ordering videos by their stored latest view count with '
+            'aggregating their whole view count history. The synthetic data '
+            'is rolled back once measured')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--videos', type=int, default=10000)
+        parser.add_argument('--viewcounts', type=int, default=1000000)
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.populate(options['videos'], options['viewcounts'])
+            page = slice(0, options['page_size'])
+
+            def aggregated():
+                return list(Video.objects.annotate(
+                        max_views=Max('viewcount__views')).order_by(
+                            '-max_views')[page])
+
+            def stored():
+                return list(Video.objects.order_by_views()[page])
+
+            results = dict(videos=options['videos'],
+                           viewcounts=options['viewcounts'],
+                           aggregated=measure(aggregated, options['repeat']),
+                           stored=measure(stored, options['repeat']))
+            transaction.set_rollback(True)
+        self.stdout.write(json.dumps(results, indent=4))
+
+    def populate(self, number_of_videos, number_of_viewcounts):
+        category = Category.objects.create(title='Benchmark')
+        uploader = User.objects.create(username='benchmark_uploader')
+        now = timezone.now()
+        Video.objects.bulk_create((Video(category=category,
+                                         published=now,
+                                         title='Video {}'.format(index),
+                                         uploader=uploader,
+                                         video_id='benchmark{}'.format(index))
+                                   for index
+                                   in range(number_of_videos)),
+                                  batch_size=500)
+        video_ids = list(Video.objects.filter(
+                category=category).values_list('id', flat=True))
+        snapshots = max(1, number_of_viewcounts // len(video_ids))
+        for index in range(0, len(video_ids), 1000):
+            # Views grow by a different amount each day for each video
+            ViewCount.objects.bulk_create(
+                    (ViewCount(video_id=video_id,
+                               count_datetime=now - timedelta(days=day),
+                               views=(snapshots - day) * (video_id % 97))
+                     for video_id in video_ids[index:index+1000]
+                     for day in range(snapshots)),
+                    batch_size=500)
@@ -0,0 +1,66 @@
+import bisect
+import json
+import os
+import random
+import resource
+import time
+
+from django.core.management.base import BaseCommand
+
+from videos.recommendations import build_neighbours, build_recommendations
+
+
+class Command(BaseCommand):
+    help = ('Times building similar videos and recommendations from '
+            'synthetic interactions in memory, where the popularity of '
+            'videos follows a Zipf like distribution. Nothing is read from '
+            'or written to the database')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--videos', type=int, default=50000)
+        parser.add_argument('--interactions', type=int, default=20,
+                            help='Mean interactions of each user')
+        parser.add_argument('--processes', type=int, default=None,
+                            help='Worker processes, every core by default')
+
+    def handle(self, *args, **options):
+        generator = random.Random(0)
+        cumulative = []
+        total = 0
+        for index in range(options['videos']):
+            total += 1 / (index + 1)
+            cumulative.append(total)
+        interactions = {}
+        for user_id in range(options['users']):
+            count = max(1, int(generator.expovariate(
+                    1 / options['interactions'])))
+            # Drawn one at a time as random.choices needs python 3.6
+            videos = [bisect.bisect(cumulative, generator.random() * total)
+                      for draw
+                      in range(count)]
+            interactions[user_id] = {video_id: generator.choice((1.0, 2.0))
+                                     for video_id
+                                     in videos}
+        start = time.perf_counter()
+        neighbours = build_neighbours(interactions, options['processes'])
+        similar_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        recommended = sum(1
+                          for user_id, recommendations
+                          in build_recommendations(interactions,
+                                                   neighbours,
+                                                   processes=options[
+                                                       'processes'])
+                          if recommendations)
+        recommend_seconds = time.perf_counter() - start
+        self.stdout.write(json.dumps(dict(
+                users=options['users'],
+                videos=options['videos'],
+                interactions=sum(map(len, interactions.values())),
+                processes=options['processes'] or os.cpu_count(),
+                similar_seconds=round(similar_seconds, 2),
+                recommend_seconds=round(recommend_seconds, 2),
+                users_recommended_to=recommended,
+                peak_memory_mb=resource.getrusage(
+                    resource.RUSAGE_SELF).ru_maxrss // 1024), indent=4))
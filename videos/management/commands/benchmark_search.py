@@ -0,0 +1,111 @@
+import bisect
+import json
+import random
+import string
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from profiles.models import User
+from videos.benchmarks import measure
+from videos.models import Category, SearchTerm, Tag, Video
+from videos.pagination import KeysetPaginator
+
+
+class Command(BaseCommand):
+    help = ('Measures search latency over a synthetic corpus of videos whose '
+            'words follow a skewed distribution, so some are in most videos '
+            'and others in a handful. The synthetic data is rolled back once '
+            'measured')
+
+    # Searches measured, formatted with the words of the corpus from the
+    # most to the least common. They range from a word in most videos to one
+    # in very few and the start of a common word being typed
+    QUERIES = ('{0}', '{9}', '{999}', '{0} {9}', '{9} {99}', '{0} {9:.3}',
+               '{99:.4}')
+    # Indexed at a time while populating
+    BATCH_SIZE = 1000
+
+    def add_arguments(self, parser):
+        parser.add_argument('--videos', type=int, default=100000)
+        parser.add_argument('--vocabulary', type=int, default=5000,
+                            help='Distinct words in the corpus')
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            words = self.populate(options['videos'], options['vocabulary'])
+            results = dict(videos=options['videos'],
+                           vocabulary=options['vocabulary'],
+                           searches={})
+            for query in self.QUERIES:
+                query = query.format(*words)
+                paginator = KeysetPaginator(SearchTerm.objects.search(query),
+                                            options['page_size'])
+                second = paginator.page().next_cursor
+
+                def first_page():
+                    return list(paginator.page())
+
+                def second_page():
+                    return list(paginator.page(second))
+
+                results['searches'][query] = dict(
+                        matches=SearchTerm.objects.search(query).count(),
+                        first_page=measure(first_page, options['repeat']),
+                        second_page=(measure(second_page, options['repeat'])
+                                     if second
+                                     else None))
+            transaction.set_rollback(True)
+        self.stdout.write(json.dumps(results, indent=4))
+
+    def populate(self, number_of_videos, vocabulary):
+        """
+        Create and index videos whose words are drawn with a Zipf like
+        distribution, each with a title, a description and tags. Returns the
+        words from the most to the least common
+        """
+        generator = random.Random(0)
+        words = set()
+        while len(words) < vocabulary:
+            words.add(''.join(generator.choice(string.ascii_lowercase)
+                              for letter
+                              in range(generator.randint(3, 10))))
+        words = sorted(words)
+        generator.shuffle(words)
+        # Cumulative weights of each word, drawn by bisecting them as
+        # random.choices needs python 3.6
+        cumulative = []
+        total = 0
+        for index in range(vocabulary):
+            total += 1 / (index + 1)
+            cumulative.append(total)
+
+        def text(length):
+            return ' '.join(words[bisect.bisect(cumulative,
+                                                generator.random() * total)]
+                            for word
+                            in range(length))
+
+        category = Category.objects.create(title='Benchmark')
+        uploader = User.objects.create(username='benchmark_uploader')
+        Video.objects.bulk_create((Video(category=category,
+                                         published=timezone.now(),
+                                         title=text(6),
+                                         description=text(60),
+                                         uploader=uploader,
+                                         video_id='benchmark{}'.format(index))
+                                   for index
+                                   in range(number_of_videos)),
+                                  batch_size=500)
+        video_ids = list(Video.objects.filter(category=category).order_by(
+                'id').values_list('id', flat=True))
+        Tag.objects.tag_videos({video_id: text(5).split()
+                                for video_id
+                                in video_ids})
+        for index in range(0, len(video_ids), self.BATCH_SIZE):
+            SearchTerm.objects.index_videos(
+                    video_ids[index:index + self.BATCH_SIZE])
+        return words
@@ -0,0 +1,163 @@
+import io
+import itertools
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.urlresolvers import reverse
+from django.db import transaction
+from django.db.models import Count
+from django.test import Client
+
+from profiles.models import User
+from scripts.populate_table_data import seed_tables
+from videos.benchmarks import compare, measure
+from videos.mixins import VideoAPIClient, VideoAPIMixin
+from videos.models import Comment, Video
+from videos.page_cache import video_list_cache
+from videos.transports import SyntheticTransport
+
+# Users and videos seeded at scale 1, multiplied by each scale measured.
+# Comments on each video and votes by each user stay the same at every scale
+BASE_SCALE = dict(users=20, videos=200, comments=5, votes=20)
+LIST_BY = ('likes', 'views', 'trending', 'submission', 'publication')
+# Videos created by each call measured of create_videos
+INGEST_BATCH_SIZE = 50
+
+
+class Command(BaseCommand):
+    help = ('Seeds a deterministic dataset at each scale and measures the '
+            'latency percentiles and queries of the request hot paths, '
+            'printing JSON results. The seeded data is rolled back once '
+            'measured. Results can be saved as a baseline and later runs '
+            'compared with it')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='1,5',
+                            help='Comma separated multiples of BASE_SCALE')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Processes generating the seeded rows')
+        parser.add_argument('--output',
+                            help='File the results are also written to')
+        parser.add_argument('--baseline',
+                            help='Results of an earlier run to compare with')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Growth of median latency counted as a '
+                                 'regression')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        try:
+            scales = [int(scale) for scale in options['scales'].split(',')]
+        except ValueError:
+            raise CommandError('Scales must be whole numbers')
+        results = dict(seed=options['seed'],
+                       repeat=options['repeat'],
+                       scales={})
+        for scale in scales:
+            results['scales'][str(scale)] = self.run_scale(scale, options)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=4, sort_keys=True)
+        regressions = []
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            results['comparison'] = {}
+            for scale, result in results['scales'].items():
+                before = baseline.get('scales', {}).get(scale)
+                if before is None:
+                    continue
+                changes = compare(result['benchmarks'],
+                                  before['benchmarks'],
+                                  options['threshold'])
+                results['comparison'][scale] = changes
+                regressions.extend('{} at scale {}'.format(name, scale)
+                                   for name, change
+                                   in changes.items()
+                                   if change['regression'])
+        self.stdout.write(json.dumps(results, indent=4, sort_keys=True))
+        if regressions and options['fail_on_regression']:
+            raise CommandError('Regressed: {}'.format(', '.join(regressions)))
+
+    def run_scale(self, scale, options):
+        sizes = dict(BASE_SCALE,
+                     users=BASE_SCALE['users'] * scale,
+                     videos=BASE_SCALE['videos'] * scale)
+        api_client = VideoAPIMixin._api_client
+        # Ingestion is measured against made up api responses
+        VideoAPIMixin._api_client = VideoAPIClient(
+                VideoAPIMixin.API_URL, '',
+                transport=SyntheticTransport(options['seed']))
+        try:
+            with transaction.atomic():
+                # Seeding also ranks the videos the trending list shows
+                seed_tables(options['processes'], options['seed'],
+                            stdout=io.StringIO(), **sizes)
+                benchmarks = self.measure_hot_paths(options['repeat'])
+                transaction.set_rollback(True)
+        finally:
+            VideoAPIMixin._api_client = api_client
+            video_list_cache.clear_local()
+        return dict(sizes=sizes, benchmarks=benchmarks)
+
+    def measure_hot_paths(self, repeat):
+        # Requests are made to a host the settings allow
+        hosts = [host.lstrip('.')
+                 for host
+                 in settings.ALLOWED_HOSTS
+                 if '*' not in host]
+        client = Client(HTTP_HOST=hosts[0] if hosts else 'localhost')
+        benchmarks = {}
+
+        def get(url, **params):
+            def request():
+                response = client.get(url, params)
+                if response.status_code != 200:
+                    raise CommandError('{} responded {}'.format(
+                        url, response.status_code))
+                if response.streaming:
+                    # Streamed responses are rendered as they are consumed
+                    b''.join(response.streaming_content)
+                return response
+            return request
+
+        for list_by in LIST_BY:
+            page = get(reverse('videos_video_list', args=[list_by]))
+
+            def uncached(page=page):
+                # Rendering the page is measured rather than the cache
+                video_list_cache.invalidate()
+                video_list_cache.clear_local()
+                return page()
+            benchmarks['video_list.{}'.format(list_by)] = measure(uncached,
+                                                                  repeat)
+        busiest = Video.objects.annotate(
+                comments=Count('comment')).order_by('-comments', 'id')[0]
+        benchmarks['comment_list'] = measure(
+                get(reverse('videos_video_comments', args=[busiest.id])),
+                repeat)
+        benchmarks['api.video_list'] = measure(get(reverse('video-list'),
+                                                   format='json'),
+                                               repeat)
+        benchmarks['api.video_liked'] = measure(get(reverse('video-liked'),
+                                                    format='json'),
+                                                repeat)
+        parent = Comment.objects.filter(parent=None).annotate(
+                replies=Count('children')).order_by('-replies', 'id')[0]
+        benchmarks['get_children'] = measure(
+                lambda: parent.children.get_children(), repeat)
+        uploader_id = User.objects.order_by('id').values_list(
+                'id', flat=True)[0]
+        counter = itertools.count()
+
+        def ingest():
+            Video.objects.create_videos(
+                    uploader_id,
+                    *['ingest-{}'.format(next(counter))
+                      for index
+                      in range(INGEST_BATCH_SIZE)])
+        benchmarks['create_videos'] = measure(ingest, repeat)
+        return benchmarks
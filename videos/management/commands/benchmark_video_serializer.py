@@ -0,0 +1,68 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from rest_framework.renderers import JSONRenderer
+
+from api.v1.videos.serializers import (VIDEO_COLUMNS, VideoSerializer,
+                                       prefetch_tags, serialize_videos)
+from profiles.models import User
+from videos.benchmarks import measure
+from videos.models import Category, Tag, Video
+
+
+class Command(BaseCommand):
+    help = ('Compares rendering videos to json through VideoSerializer with '
+            'the values() fast path used by the video list api. The '
+            'synthetic data is rolled back once measured')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--videos', type=int, default=1000)
+        parser.add_argument('--tags', type=int, default=8,
+                            help='Tags on each video')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            videos = self.populate(options['videos'], options['tags'])
+            renderer = JSONRenderer()
+
+            def serializer():
+                return renderer.render(VideoSerializer(prefetch_tags(videos),
+                                                       many=True).data)
+
+            def fast_path():
+                return b','.join(renderer.render(video)
+                                 for video
+                                 in serialize_videos(
+                                     videos.values(*VIDEO_COLUMNS)))
+
+            results = dict(videos=options['videos'],
+                           tags=options['tags'],
+                           serializer=measure(serializer, options['repeat']),
+                           fast_path=measure(fast_path, options['repeat']))
+            transaction.set_rollback(True)
+        self.stdout.write(json.dumps(results, indent=4))
+
+    def populate(self, number_of_videos, number_of_tags):
+        category = Category.objects.create(title='Benchmark')
+        uploader = User.objects.create(username='benchmark_uploader')
+        Video.objects.bulk_create((Video(category=category,
+                                         published=timezone.now(),
+                                         title='Video {}'.format(index),
+                                         description='Benchmark video',
+                                         uploader=uploader,
+                                         video_id='benchmark{}'.format(index))
+                                   for index
+                                   in range(number_of_videos)),
+                                  batch_size=500)
+        videos = Video.objects.filter(category=category).order_by('id')
+        Tag.objects.tag_videos({video_id: ['benchmark{}'.format(
+                                               (video_id + tag) % 100)
+                                           for tag
+                                           in range(number_of_tags)]
+                                for video_id
+                                in videos.values_list('id', flat=True)})
+        return videos
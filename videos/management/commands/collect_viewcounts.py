@@ -0,0 +1,77 @@
+import json
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from videos.collector import ViewCountCollector
+from videos.ratelimit import TokenBucket
+
+
+class Command(BaseCommand):
+    help = ('Records a new view count snapshot for every video, optionally '
+            'repeating forever as a worker')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkpoint',
+                            default=os.path.join(tempfile.gettempdir(),
+                                                 'viewcount_checkpoint.json'),
+                            help='File the progress of a pass is saved to')
+        parser.add_argument('--daily-quota',
+                            type=int,
+                            default=ViewCountCollector.DAILY_QUOTA,
+                            help='Api quota units that may be used each day')
+        parser.add_argument('--burst',
+                            type=int,
+                            default=10,
+                            help='Requests that may be made back to back')
+        parser.add_argument('--batch-size',
+                            type=int,
+                            default=ViewCountCollector.BATCH_SIZE,
+                            help='Videos counted by each request')
+        parser.add_argument('--loop',
+                            action='store_true',
+                            default=False,
+                            help='Keep making passes instead of exiting')
+        parser.add_argument('--interval',
+                            type=int,
+                            default=60 * 60,
+                            help='Fewest seconds between the start of passes')
+        parser.add_argument('--report-every',
+                            type=int,
+                            default=10,
+                            help='Batches between progress reports')
+
+    def handle(self, *args, **options):
+        if options['burst'] < 1:
+            raise CommandError('--burst must be at least 1')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        # A batch must fit in the rate limiter or it could never be counted
+        cost = ViewCountCollector.get_batch_cost(options['batch_size'])
+        if cost > options['burst']:
+            raise CommandError(
+                    'A batch of {} videos costs {} quota units, more than '
+                    'the burst of {}'.format(options['batch_size'], cost,
+                                             options['burst']))
+        # The rate limit is shared between passes so back to back passes
+        # still stay within the quota
+        limiter = TokenBucket(options['daily_quota'] / (24 * 60 * 60),
+                              options['burst'])
+        while True:
+            collector = ViewCountCollector(options['checkpoint'],
+                                           batch_size=options['batch_size'],
+                                           limiter=limiter)
+
+            def report(collector):
+                if collector.requests_made % options['report_every'] == 0:
+                    self.stdout.write(json.dumps(collector.metrics))
+
+            collector.collect(progress=report)
+            self.stdout.write(json.dumps(collector.metrics))
+            if not options['loop']:
+                break
+            time.sleep(max(0,
+                           options['interval'] -
+                           collector.metrics['seconds_elapsed']))
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+import dateutil.parser
+
+from videos.recommendations import (TOP_N, compute_recommendations,
+                                    get_changed_user_ids,
+                                    refresh_recommendations)
+
+
+class Command(BaseCommand):
+    help = ('Recomputes the videos similar to every video from the users who '
+            'liked and favorited them and the recommendations of every user, '
+            'or with --refresh only the recommendations of the given users '
+            'or of users who voted since recommendations were last written')
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int)
+        parser.add_argument('--refresh',
+                            action='store_true',
+                            default=False,
+                            help=('Only refresh the recommendations of users '
+                                  'whose interactions changed'))
+        parser.add_argument('--since',
+                            help=('With --refresh, the time to look for '
+                                  'changed votes from'))
+        parser.add_argument('--top', type=int, default=TOP_N,
+                            help='Recommendations stored for each user')
+        parser.add_argument('--processes', type=int, default=None,
+                            help='Worker processes, every core by default')
+
+    def handle(self, *args, **options):
+        if not options['refresh']:
+            if options['user_ids'] or options['since']:
+                raise CommandError('Users and --since need --refresh')
+            count = compute_recommendations(options['top'],
+                                            options['processes'])
+            self.stdout.write('Recommendations computed for {} users'.format(
+                    count))
+            return
+        user_ids = options['user_ids']
+        if not user_ids:
+            since = options['since']
+            if since is not None:
+                try:
+                    since = dateutil.parser.parse(since)
+                except (ValueError, OverflowError):
+                    raise CommandError('Invalid --since {}'.format(since))
+                if timezone.is_naive(since):
+                    since = timezone.make_aware(since, timezone.utc)
+            user_ids = get_changed_user_ids(since)
+        count = refresh_recommendations(user_ids, options['top'])
+        self.stdout.write('Recommendations refreshed for {} users'.format(
+                count))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from videos.related import TOP_K, compute_related_videos
+
+
+class Command(BaseCommand):
+    help = ('Recomputes the videos most related to every video by their '
+            'shared tags and category')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=TOP_K,
+                            help='Related videos stored for each video')
+
+    def handle(self, *args, **options):
+        related_count = compute_related_videos(options['top'])
+        self.stdout.write('Related videos computed for {} videos'.format(
+                related_count))
@@ -0,0 +1,83 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from profiles.models import User
+from videos.mixins import VideoAPIClient, VideoAPIMixin
+from videos.models import Video
+from videos.profiling import metrics
+from videos.transports import SyntheticTransport
+
+
+class Command(BaseCommand):
+    help = ('Ingests videos through create_videos in batches and dumps the '
+            'counters and histograms of its api calls and stages as JSON, '
+            'with cProfile reports of any batches profiled including the '
+            'threads making their api requests. Only the ingestion run by '
+            'this command is measured, not that of other processes. The '
+            'videos are rolled back unless --keep is given')
+
+    def add_arguments(self, parser):
+        parser.add_argument('video_ids', nargs='*',
+                            help='Youtube ids of the videos to ingest')
+        parser.add_argument('--videos', type=int, default=0,
+                            help='Made up video ids to ingest, for use with '
+                                 '--synthetic or a replay transport')
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--synthetic', action='store_true',
+                            help='Use synthetic api responses whatever the '
+                                 'settings say')
+        parser.add_argument('--delay', type=float, default=0,
+                            help='Seconds each synthetic response takes')
+        parser.add_argument('--profile', type=int, default=0,
+                            help='Batches to run under cProfile')
+        parser.add_argument('--profile-dir',
+                            help='Directory each profile is also saved to, '
+                                 'for loading into pstats or snakeviz')
+        parser.add_argument('--user', type=int,
+                            help='Id of the user submitting the videos, the '
+                                 'first user by default')
+        parser.add_argument('--keep', action='store_true')
+
+    def handle(self, *args, **options):
+        video_ids = list(options['video_ids'])
+        video_ids.extend('profile-{}'.format(index)
+                         for index
+                         in range(options['videos']))
+        if not video_ids:
+            raise CommandError('Give video ids or --videos')
+        user_id = options['user'] or User.objects.order_by('id').values_list(
+                'id', flat=True).first()
+        if user_id is None:
+            raise CommandError('There are no users to submit the videos')
+        api_client = VideoAPIMixin._api_client
+        if options['synthetic']:
+            VideoAPIMixin._api_client = VideoAPIClient(
+                    VideoAPIMixin.API_URL, '',
+                    transport=SyntheticTransport(delay=options['delay']))
+        metrics.reset()
+        metrics.profile_next(options['profile'])
+        started = time.perf_counter()
+        try:
+            with transaction.atomic():
+                for index in range(0, len(video_ids), options['batch_size']):
+                    Video.objects.create_videos(
+                            user_id,
+                            *video_ids[index:index+options['batch_size']])
+                if not options['keep']:
+                    transaction.set_rollback(True)
+        finally:
+            VideoAPIMixin._api_client = api_client
+        seconds = time.perf_counter() - started
+        results = metrics.snapshot()
+        results['seconds_elapsed'] = round(seconds, 3)
+        results['videos_per_second'] = round(len(video_ids) / seconds, 1)
+        if options['profile_dir']:
+            os.makedirs(options['profile_dir'], exist_ok=True)
+            for index, (name, report, stats) in enumerate(metrics.profiles):
+                stats.dump_stats(os.path.join(options['profile_dir'],
+                                              'batch{}.prof'.format(index)))
+        self.stdout.write(json.dumps(results, indent=4))
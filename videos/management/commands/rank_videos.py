@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from videos.ranking import rank_videos
+
+
+class Command(BaseCommand):
+    help = ('Recomputes the trending hot scores of the videos that have '
+            'changed since the last run')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full',
+                            action='store_true',
+                            default=False,
+                            help='Recompute the scores of every video')
+
+    def handle(self, *args, **options):
+        ranked = rank_videos(full=options['full'])
+        self.stdout.write('{} videos ranked'.format(ranked))
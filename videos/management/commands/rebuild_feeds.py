@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from profiles.models import User
+from videos.models import FeedItem
+
+
+class Command(BaseCommand):
+    help = ('Rebuilds the feeds of every user following anything, or of the '
+            'given users, and removes videos that have aged out of feeds')
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int)
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids'] or list(User.objects.filter(
+                Q(following__isnull=False) |
+                Q(followed_categories__isnull=False) |
+                Q(followed_tags__isnull=False)).distinct().values_list(
+                    'id', flat=True))
+        for user_id in user_ids:
+            FeedItem.objects.rebuild(user_id)
+        pruned = FeedItem.objects.filter(
+                video__created__lt=timezone.now() - FeedItem.objects.WINDOW
+                ).delete()[0]
+        self.stdout.write('{} feeds rebuilt, {} old feed items removed'.format(
+                len(user_ids), pruned))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from videos.models import SearchTerm, Video
+
+
+class Command(BaseCommand):
+    help = ('Indexes the title, description and tags of every video for '
+            'search, or of the given videos')
+
+    # Videos indexed at a time
+    BATCH_SIZE = 500
+
+    def add_arguments(self, parser):
+        parser.add_argument('video_ids', nargs='*', type=int)
+
+    def handle(self, *args, **options):
+        video_ids = options['video_ids'] or list(
+                Video.objects.order_by('id').values_list('id', flat=True))
+        for index in range(0, len(video_ids), self.BATCH_SIZE):
+            SearchTerm.objects.index_videos(
+                    video_ids[index:index + self.BATCH_SIZE])
+        self.stdout.write('{} videos indexed'.format(len(video_ids)))
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Case, IntegerField, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from videos.models import CommentVote, VideoVote
+
+
+class Command(BaseCommand):
+    help = ('Recalculates the vote counters stored on videos and comments '
+            'from their votes and corrects any that have drifted')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check',
+                            action='store_true',
+                            default=False,
+                            help=('Only report counters that are out of '
+                                  'date, failing if any are found'))
+
+    def handle(self, *args, **options):
+        total_stale = 0
+        for vote_model in (VideoVote, CommentVote):
+            counted_model = vote_model._meta.get_field(
+                    vote_model.counted_field).related_model
+            stale = list(self.find_stale_counters(vote_model))
+            total_stale += len(stale)
+            self.stdout.write('{}: {} stale counters'.format(
+                counted_model._meta.verbose_name_plural, len(stale)))
+            if not options['check']:
+                with transaction.atomic():
+                    for object_id, counters in stale:
+                        counted_model.objects.filter(pk=object_id).update(
+                                **counters)
+        if options['check'] and total_stale:
+            raise CommandError('{} vote counters are out of date'.format(
+                total_stale))
+
+    def find_stale_counters(self, vote_model):
+        """
+        Generator yielding the primary key and correct counters of every
+        object whose stored counters do not match its votes
+        """
+        counted_model = vote_model._meta.get_field(
+                vote_model.counted_field).related_model
+        value = '{}__value'.format(vote_model._meta.model_name)
+
+        def count_votes(**lookup):
+            return Coalesce(Sum(Case(When(then=Value(1), **lookup),
+                                     default=Value(0),
+                                     output_field=IntegerField())),
+                            Value(0))
+
+        fields = ('score', 'upvotes', 'downvotes')
+        counters = counted_model.objects.values('pk', *fields).annotate(
+                actual_score=Coalesce(Sum(value), Value(0)),
+                actual_upvotes=count_votes(**{value + '__gt': 0}),
+                actual_downvotes=count_votes(**{value + '__lt': 0}))
+        for row in counters.iterator():
+            actual = dict((field, row['actual_' + field])
+                          for field
+                          in fields)
+            if any(row[field] != actual[field] for field in fields):
+                yield row['pk'], actual
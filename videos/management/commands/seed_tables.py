@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from scripts.populate_table_data import SCALE, seed_tables
+
+
+class Command(BaseCommand):
+    help = ('Fills every table with synthetic users, videos, comments, votes '
+            'and follows without calling the youtube api, then computes the '
+            'hot scores, related videos, recommendations and feeds from them. '
+            'Seeding again adds to what is already there')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=SCALE['users'])
+        parser.add_argument('--videos', type=int, default=SCALE['videos'])
+        parser.add_argument('--comments', type=int,
+                            default=SCALE['comments'],
+                            help='Comments on each video')
+        parser.add_argument('--votes', type=int, default=SCALE['votes'],
+                            help='Votes by each user on videos and comments')
+        parser.add_argument('--processes', type=int, default=None,
+                            help='Worker processes generating the rows, every '
+                                 'core by default')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        sizes = {name: options[name] for name in SCALE}
+        if any(size < 0 for size in sizes.values()):
+            raise CommandError('Sizes cannot be negative')
+        if options['processes'] is not None and options['processes'] < 1:
+            raise CommandError('--processes must be at least 1')
+        seed_tables(options['processes'], options['seed'],
+                    stdout=self.stdout, **sizes)
+        self.stdout.write('Seeded {users} users and {videos} videos'.format(
+                **sizes))
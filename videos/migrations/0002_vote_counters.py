@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.5 on 2026-10-17 19:06
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+# Fill the new counters in from the votes that already exist
+COUNT_VOTES_SQL = """
+UPDATE videos_{model} SET
+    score = COALESCE((SELECT SUM(value) FROM videos_{model}vote
+                      WHERE {model}_id = videos_{model}.id), 0),
+    upvotes = (SELECT COUNT(*) FROM videos_{model}vote
+               WHERE {model}_id = videos_{model}.id AND value > 0),
+    downvotes = (SELECT COUNT(*) FROM videos_{model}vote
+                 WHERE {model}_id = videos_{model}.id AND value < 0)
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='downvotes',
+            field=models.PositiveIntegerField(default=0, verbose_name='Number of downvotes'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='score',
+            field=models.IntegerField(db_index=True, default=0, verbose_name='Vote score'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='upvotes',
+            field=models.PositiveIntegerField(default=0, verbose_name='Number of upvotes'),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='downvotes',
+            field=models.PositiveIntegerField(default=0, verbose_name='Number of downvotes'),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='score',
+            field=models.IntegerField(db_index=True, default=0, verbose_name='Vote score'),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='upvotes',
+            field=models.PositiveIntegerField(default=0, verbose_name='Number of upvotes'),
+        ),
+        migrations.RunSQL(COUNT_VOTES_SQL.format(model='comment'),
+                          migrations.RunSQL.noop),
+        migrations.RunSQL(COUNT_VOTES_SQL.format(model='video'),
+                          migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.5 on 2026-10-17 19:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+# Copy the most recent existing view count of each video onto it
+LATEST_VIEWS_SQL = """
+UPDATE videos_video SET
+    views = COALESCE((SELECT views FROM videos_viewcount
+                      WHERE video_id = videos_video.id
+                      ORDER BY count_datetime DESC LIMIT 1), 0),
+    views_counted = (SELECT MAX(count_datetime) FROM videos_viewcount
+                     WHERE video_id = videos_video.id)
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0002_vote_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='views',
+            field=models.BigIntegerField(db_index=True, default=0, verbose_name='Latest view count'),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='views_counted',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Time latest views were counted'),
+        ),
+        migrations.AlterField(
+            model_name='viewcount',
+            name='count_datetime',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date and time video views were counted'),
+        ),
+        migrations.RunSQL(LATEST_VIEWS_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.5 on 2026-10-17 19:15
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0003_latest_views'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoRank',
+            fields=[
+                ('hot_score', models.FloatField(db_index=True, verbose_name='Hot score')),
+                ('computed', models.DateTimeField(db_index=True, verbose_name='Time the score was computed')),
+                ('video', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rank', serialize=False, to='videos.Video', verbose_name='Video ranked')),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Last updated'),
+        ),
+    ]
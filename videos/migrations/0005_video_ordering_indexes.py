@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.5 on 2026-10-17 19:22
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0004_video_rank'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='video',
+            index_together=set([('published', 'id'), ('created', 'id'), ('score', 'id'), ('views', 'id')]),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0006_comment_thread_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videovote',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, verbose_name='Last updated'),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Comment creation time'),
+        ),
+        migrations.AlterField(
+            model_name='viewcount',
+            name='count_datetime',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Date and time video views were counted'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.5 on 2026-10-17 19:34
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('videos', '0007_export_timestamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weight', models.PositiveIntegerField(default=1, verbose_name='Follows matched')),
+                ('rank', models.FloatField(verbose_name='Rank in feed')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to=settings.AUTH_USER_MODEL, verbose_name='User whose feed it is')),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='videos.Video', verbose_name='Video in feed')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='feeditem',
+            unique_together=set([('user', 'video')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='feeditem',
+            index_together=set([('user', 'rank', 'id')]),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.5 on 2026-10-17 19:37
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0008_feed_item'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedVideo',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Relatedness score')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='videos.Video', verbose_name='Related video')),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_videos', to='videos.Video', verbose_name='Video related to')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='relatedvideo',
+            unique_together=set([('video', 'related')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='relatedvideo',
+            index_together=set([('video', 'score', 'id')]),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.5 on 2026-10-17 20:19
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('videos', '0010_search_term'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Recommendation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Recommendation score')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Creation date')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to=settings.AUTH_USER_MODEL, verbose_name='User recommended to')),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='videos.Video', verbose_name='Video recommended')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SimilarVideo',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Similarity score')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='videos.Video', verbose_name='Similar video')),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_videos', to='videos.Video', verbose_name='Video similar to')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='similarvideo',
+            unique_together=set([('video', 'similar')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='similarvideo',
+            index_together=set([('video', 'score', 'id')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='recommendation',
+            unique_together=set([('user', 'video')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='recommendation',
+            index_together=set([('user', 'score', 'id')]),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db.models import Count
+
+# Name of the constraint added by this migration, removed again when it is
+# reversed. A constraint made along with the table is named differently and
+# is left alone
+CONSTRAINT_NAME = 'videos_favorite_video_id_user_id_uniq'
+
+
+def get_favorites_table(apps):
+    """
+    Helper function returning the through model of the favorites of videos
+    and the columns of its video and user
+    """
+    through = apps.get_model('videos', 'Video').favorited_by.through
+    return (through,
+            [through._meta.get_field('video').column,
+             through._meta.get_field('user').column])
+
+
+def get_unique_constraints(schema_editor, table):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return {name: set(constraint['columns'])
+            for name, constraint
+            in constraints.items()
+            if constraint['unique'] and not constraint['primary_key']}
+
+
+def add_unique_favorites(apps, schema_editor):
+    """
+    The through table declares its pair of video and user ids unique, which
+    favorites are upserted on. Django 1.9 drops that constraint on sqlite
+    while making the tables, add it wherever it is missing. Duplicate
+    favorites have to be removed by hand first
+    """
+    through, columns = get_favorites_table(apps)
+    table = through._meta.db_table
+    if set(columns) in get_unique_constraints(schema_editor,
+                                              table).values():
+        return
+    duplicates = through.objects.values('video', 'user').annotate(
+            count=Count('id')).filter(count__gt=1).count()
+    if duplicates:
+        raise ValueError(
+                '{} videos are favorited more than once by the same user in '
+                '{}, remove the duplicates before migrating'.format(
+                    duplicates, table))
+    quote = schema_editor.quote_name
+    schema_editor.execute(schema_editor.sql_create_unique % {
+        'table': quote(table),
+        'name': quote(CONSTRAINT_NAME),
+        'columns': ', '.join(quote(column) for column in columns),
+    })
+
+
+def remove_unique_favorites(apps, schema_editor):
+    """
+    Remove the constraint if this migration added it
+    """
+    through, columns = get_favorites_table(apps)
+    table = through._meta.db_table
+    if CONSTRAINT_NAME not in get_unique_constraints(schema_editor, table):
+        return
+    quote = schema_editor.quote_name
+    schema_editor.execute(schema_editor.sql_delete_unique % {
+        'table': quote(table),
+        'name': quote(CONSTRAINT_NAME),
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0011_recommendations'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_unique_favorites, remove_unique_favorites),
+    ]
@@ -1,40 +1,85 @@
 import os
+from collections import OrderedDict
 
-import requests
-
-
-class APIReturnedError(Exception):
-    """
-    The api response contains an error, occurs when response.ok is False
-    """
-    def __init__(self, error_message=None):
-        if error_message:
-            self.error_message = error_message
-
-    def __str__(self):
-        if self.error_message:
-            return repr(self.error_message)
-        else:
-            return 'Not specified in api response'
+from videos.client import APIReturnedError, VideoAPIClient  # noqa
+from videos.transports import get_transport
 
 
 class VideoAPIMixin:
     # Constants
     API_URL = 'https://www.googleapis.com/youtube/v3/'
     API_key_file = os.path.join(os.path.dirname(__file__), 'api_key.txt')
-    SESSION = requests.Session()
-    with open(API_key_file, 'r') as f:
-        API_KEY = f.read()
+    # Read from the YOUTUBE_API_KEY environment variable or API_key_file the
+    # first time a request needs it
+    API_KEY = None
+    # Most requests made to the api at the same time
+    API_MAX_WORKERS = 8
+    # Most times a temporarily failing request is retried
+    API_MAX_RETRIES = 5
+    _api_client = None
+
+    @classmethod
+    def get_api_key(cls):
+        if VideoAPIMixin.API_KEY is None:
+            API_KEY = os.environ.get('YOUTUBE_API_KEY')
+            if API_KEY is None:
+                with open(cls.API_key_file, 'r') as f:
+                    API_KEY = f.read().strip()
+            VideoAPIMixin.API_KEY = API_KEY
+        return VideoAPIMixin.API_KEY
+
+    @classmethod
+    def get_api_client(cls):
+        """
+        Client shared by every class using the mixin, created on first use
+        with the transport chosen in the settings. Transports that never
+        reach the api do not need the key
+        """
+        if VideoAPIMixin._api_client is None:
+            transport = get_transport()
+            VideoAPIMixin._api_client = VideoAPIClient(
+                    cls.API_URL,
+                    cls.get_api_key() if transport.requires_key else '',
+                    max_workers=cls.API_MAX_WORKERS,
+                    max_retries=cls.API_MAX_RETRIES,
+                    transport=transport)
+        return VideoAPIMixin._api_client
 
     @classmethod
     def get_info_from_api(cls, uri, params):
-        url = cls.API_URL + uri
-        parameters = {**{'key': cls.API_KEY}, **params}
-        response = cls.SESSION.get(url, params=parameters)
-        if response.ok:
-            return response.json()
-        else:
-            raise APIReturnedError(response.json().get('error', None))
+        return cls.get_api_client().get(uri, params)
+
+    @classmethod
+    def get_many_from_api(cls, uri, params_list):
+        """
+        Make a request to the same uri for each set of parameters at the same
+        time, returning the responses in the order the parameters were given
+        """
+        return cls.get_api_client().get_many((uri, params)
+                                             for params
+                                             in params_list)
+
+    @classmethod
+    def get_info_for_ids(cls, uri, params, ids):
+        """
+        Request information for any number of ids, made in batches of the
+        largest size the api accepts
+        """
+        return cls.get_api_client().get_by_ids(uri, params, ids)
+
+    @classmethod
+    def get_items_by_id(cls, uri, params, ids):
+        """
+        Request information for any number of ids, returning each item keyed
+        by the id the api gave it. Ids the api returns nothing for, such as
+        deleted or private videos, are left out rather than shifting the data
+        of the ids after them
+        """
+        JSON = cls.get_info_for_ids(uri, params, ids)
+        return OrderedDict((item['id'], item) for item in JSON['items'])
 
     # Protected Methods
     _get_info_from_api = get_info_from_api
+    _get_many_from_api = get_many_from_api
+    _get_info_for_ids = get_info_for_ids
+    _get_items_by_id = get_items_by_id
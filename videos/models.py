@@ -1,12 +1,21 @@
-from django.db import models
-from django.db.models import Max, Sum
-from django.utils.functional import cached_property
+import math
+import re
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import connections, models, transaction
+from django.db.models import Case, F, IntegerField, Max, Q, Sum, Value, When
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
 import dateutil.parser
 
 from profiles.models import User
 from videos.mixins import VideoAPIMixin
+from videos.profiling import metrics
+from videos.signals import videos_created, views_counted, votes_counted
 
 
 def remove_existing(manager, items, attribute):
@@ -16,10 +25,195 @@ def remove_existing(manager, items, attribute):
     """
     unique_items = list(set(items))
     kwargs = {attribute + '__in': unique_items}
-    extant_items = manager.filter(**kwargs).values_list(attribute, flat=True)
+    extant_items = set(manager.filter(**kwargs).values_list(attribute,
+                                                            flat=True))
     return [item for item in unique_items if item not in extant_items]
 
 
+def build_comment_tree(comments, parents, depth=None):
+    """
+    Helper function to nest already fetched comments beneath their parents.
+    A comment with replies is represented as [comment, [replies]] and one
+    without as the comment itself. The ordering of the fetched comments is
+    kept at every level of the tree
+    """
+    replies = defaultdict(list)
+    for comment in comments:
+        replies[comment.parent_id].append(comment)
+    tree = []
+    # Walk the tree with an explicit stack as reply chains can be deeper than
+    # the recursion limit
+    stack = [(parent, depth, tree) for parent in reversed(parents)]
+    while stack:
+        comment, remaining_depth, siblings = stack.pop()
+        children = replies.get(comment.id)
+        if remaining_depth == 0 or not children:
+            siblings.append(comment)
+            continue
+        nested = []
+        siblings.append([comment, nested])
+        child_depth = None if remaining_depth is None else remaining_depth - 1
+        stack.extend((child, child_depth, nested)
+                     for child
+                     in reversed(children))
+    return tree
+
+
+def walk_comment_tree(tree):
+    """
+    Helper function to walk a tree made by build_comment_tree in the order it
+    is displayed, yielding (comment, depth) pairs with every comment followed
+    by its replies
+    """
+    stack = [(node, 0) for node in reversed(tree)]
+    while stack:
+        node, depth = stack.pop()
+        if isinstance(node, list):
+            comment, replies = node
+            stack.extend((reply, depth + 1) for reply in reversed(replies))
+        else:
+            comment = node
+        yield comment, depth
+
+
+def auto_now_values(model):
+    """
+    Helper function giving the current time for every auto_now field of a
+    model. Updates made through a queryset skip auto_now so this lets them
+    mark the rows they change as updated too
+    """
+    now = timezone.now()
+    return {field.name: now
+            for field
+            in model._meta.concrete_fields
+            if getattr(field, 'auto_now', False)}
+
+
+def upsert_rows(model, columns, rows, conflict_columns, update_columns=(),
+                batch_size=250, using='default'):
+    """
+    Helper function to insert rows of values for columns into the table of a
+    model with a single statement per batch. Rows conflicting with an
+    existing row on conflict_columns update its update_columns instead, or
+    are skipped when there are none
+    """
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    fields = [model._meta.get_field(column) for column in columns]
+    if update_columns:
+        on_conflict = 'DO UPDATE SET ' + ', '.join(
+                '{0} = EXCLUDED.{0}'.format(quote(column))
+                for column
+                in update_columns)
+    else:
+        on_conflict = 'DO NOTHING'
+    placeholder = '({})'.format(', '.join(['%s'] * len(columns)))
+    with connection.cursor() as cursor:
+        for index in range(0, len(rows), batch_size):
+            batch = rows[index:index+batch_size]
+            cursor.execute(
+                'INSERT INTO {table} ({columns}) VALUES {values} '
+                'ON CONFLICT ({conflict_columns}) {on_conflict}'.format(
+                    table=quote(model._meta.db_table),
+                    columns=', '.join(quote(field.column)
+                                      for field
+                                      in fields),
+                    values=', '.join([placeholder] * len(batch)),
+                    conflict_columns=', '.join(quote(column)
+                                               for column
+                                               in conflict_columns),
+                    on_conflict=on_conflict),
+                [field.get_db_prep_save(value, connection)
+                 for row in batch
+                 for field, value in zip(fields, row)])
+
+
+def unique_ordering(field, descending=True):
+    """
+    Helper function to order by a field with the primary key breaking ties,
+    giving every row a unique position that pages can be keyed on
+    """
+    direction = '-' if descending else ''
+    return [direction + field, direction + 'id']
+
+
+def supports_window_functions(connection):
+    """
+    Helper function checking whether a database can run ROW_NUMBER() OVER
+    """
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        import sqlite3
+        return sqlite3.sqlite_version_info >= (3, 25)
+    return False
+
+
+def get_search_terms(text):
+    """
+    Helper function splitting text into the distinct lower cased words it
+    is searched by, in the order they first appear. Single characters are
+    too common to be worth indexing
+    """
+    terms = []
+    for word in re.findall(r'\w+', text.lower()):
+        term = word[:SearchTerm.MAX_LENGTH]
+        if len(term) > 1 and term not in terms:
+            terms.append(term)
+    return terms
+
+
+def vote_counter_deltas(old_value, new_value):
+    """
+    Helper function to find how the score, upvotes and downvotes of an object
+    change when a vote on it goes from old_value to new_value. A value of None
+    means the vote does not exist
+    """
+    score = upvotes = downvotes = 0
+    for value, sign in ((old_value, -1), (new_value, 1)):
+        if value is None:
+            continue
+        score += sign * value
+        if value > 0:
+            upvotes += sign
+        elif value < 0:
+            downvotes += sign
+    return score, upvotes, downvotes
+
+
+def update_vote_counters(vote_model, changes):
+    """
+    Helper function to apply vote changes to the denormalized counters of the
+    objects voted on. changes is an iterable of (object_id, old_value,
+    new_value) and objects with identical deltas are updated together so the
+    counters are incremented in place with as few statements as possible.
+    votes_counted is sent with the ids of the objects whose counters changed
+    """
+    counted_model = vote_model._meta.get_field(
+            vote_model.counted_field).related_model
+    deltas = defaultdict(lambda: [0, 0, 0])
+    for object_id, old_value, new_value in changes:
+        totals = deltas[object_id]
+        for index, delta in enumerate(vote_counter_deltas(old_value,
+                                                          new_value)):
+            totals[index] += delta
+    grouped = defaultdict(list)
+    for object_id, totals in deltas.items():
+        if any(totals):
+            grouped[tuple(totals)].append(object_id)
+    for (score, upvotes, downvotes), object_ids in grouped.items():
+        counted_model.objects.filter(pk__in=object_ids).update(
+                score=F('score') + score,
+                upvotes=F('upvotes') + upvotes,
+                downvotes=F('downvotes') + downvotes,
+                **auto_now_values(counted_model))
+    if grouped:
+        votes_counted.send(sender=vote_model,
+                           object_ids=[object_id
+                                       for object_ids in grouped.values()
+                                       for object_id in object_ids])
+
+
 class Category(models.Model):
     """
     Every youtube video must have a category assigned to it so we keep track
@@ -41,15 +235,55 @@ class Category(models.Model):
 
 
 class TagManager(models.Manager):
+    # Most tags inserted by a single statement, keeps the number of query
+    # parameters within the limits of every supported database
+    INSERT_BATCH_SIZE = 500
+
     def create_tags(self, *tag_titles):
-        new_tags = remove_existing(self, tag_titles, 'title')
-        tags = [self.model(title=tag)
-                for tag
-                in new_tags]
-        # Create any new tags
-        if tags:
-            self.bulk_create(tags)
-        return self.filter(title__in=tag_titles).values_list('id', flat=True)
+        return list(self.get_tag_ids(tag_titles).values())
+
+    def get_tag_ids(self, tag_titles):
+        """
+        Returns a dictionary of tag title to id for the given titles, creating
+        any tags that do not exist yet. Tags are inserted in bulk ignoring any
+        that already exist, including ones created concurrently, and their
+        ids are then found with a single query
+        """
+        titles = list(set(tag_titles))
+        if not titles:
+            return {}
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        column = connection.ops.quote_name(
+                self.model._meta.get_field('title').column)
+        with connection.cursor() as cursor:
+            for index in range(0, len(titles), self.INSERT_BATCH_SIZE):
+                batch = titles[index:index+self.INSERT_BATCH_SIZE]
+                cursor.execute(
+                    'INSERT INTO {table} ({column}) VALUES {values} '
+                    'ON CONFLICT ({column}) DO NOTHING'.format(
+                        table=table,
+                        column=column,
+                        values=', '.join(['(%s)'] * len(batch))),
+                    batch)
+        return dict(self.filter(title__in=titles).values_list('title', 'id'))
+
+    def tag_videos(self, video_tags):
+        """
+        Associate newly created videos with their tags. video_tags maps the
+        primary key of each video to its tag titles and all of the videos are
+        tagged with a constant number of queries
+        """
+        tag_ids = self.get_tag_ids(title
+                                   for titles in video_tags.values()
+                                   for title in titles)
+        through = self.model.video_set.through
+        through.objects.bulk_create([through(video_id=video_id,
+                                             tag_id=tag_ids[title])
+                                     for video_id, titles
+                                     in video_tags.items()
+                                     for title
+                                     in set(titles)])
 
 
 class Tag(models.Model):
@@ -82,64 +316,118 @@ class VideoManager(models.Manager, VideoAPIMixin):
     def create_videos(self, user_id, *video_ids):
         """
         function allows for the singular or bulk creation of video objects
-        given their video_id(s)
+        given their video_id(s). The time taken by each stage is recorded in
+        the ingestion metrics, and the batch is profiled when armed
         """
+        with metrics.profile_batch('create_videos({})'.format(
+                len(video_ids))):
+            return self._create_videos(user_id, video_ids)
+
+    def _create_videos(self, user_id, video_ids):
+        metrics.increment('ingest.batches')
+        metrics.increment('ingest.videos_requested', len(video_ids))
         new_videos = remove_existing(self, video_ids, 'video_id')
-        JSON = self.get_video_info(new_videos)
-        tags = {new_videos[i]:
-                (video_info['snippet']['tags']
-                 if 'tags' in video_info['snippet']
-                 else [])
-                for i, video_info
-                in enumerate(JSON['items'])}
-        videos = [self.model(category_id=video_info['snippet']['categoryId'],
-                             description=video_info['snippet']['description'],
+        # Snippets and statistics are requested together so everything needed
+        # for the videos, their tags and view counts takes a single request
+        with metrics.stage('fetch'):
+            video_info = self.get_video_info(new_videos)
+        tags = {video_id: info['snippet'].get('tags', [])
+                for video_id, info
+                in video_info.items()}
+        videos = [self.model(category_id=info['snippet']['categoryId'],
+                             description=info['snippet']['description'],
                              published=dateutil.parser.parse(
-                                 video_info['snippet']['publishedAt']),
-                             title=video_info['snippet']['title'],
+                                 info['snippet']['publishedAt']),
+                             title=info['snippet']['title'],
                              uploader_id=user_id,
-                             video_id=new_videos[i])
-                  for i, video_info
-                  in enumerate(JSON['items'])]
+                             video_id=video_id)
+                  for video_id, info
+                  in video_info.items()]
         if videos:
-            self.bulk_create(videos)
-            # Get primary keys generated after bulk create, and videos objects
-            videos = self.filter(video_id__in=new_videos).all()
-            video_ids = videos.values_list('id', flat=True)
-            video_list = list(videos)
+            with metrics.stage('insert_videos'):
+                self.bulk_create(videos)
+                # Get primary keys generated after bulk create, and videos
+                # objects
+                videos = self.filter(video_id__in=video_info.keys()).all()
+                video_list = list(videos)
+            metrics.increment('ingest.videos_created', len(video_list))
+            video_ids = [video.id for video in video_list]
             # Users automatically vote for any video they submit
-            VideoVote.objects.create_votes(user_id, *video_ids)
-            # Find the view count for all the recently created videos
-            ViewCount.objects.create_viewcounts(*video_list)
-            for video in video_list:
-                # Create and/or associate each videos tags with that video
-                if tags[video.video_id]:
-                    video_tags = Tag.objects.create_tags(*tags[video.video_id])
-                    video.tags.add(*video_tags)
+            with metrics.stage('votes'):
+                VideoVote.objects.create_votes(user_id, *video_ids)
+            # Record the view count for all the recently created videos
+            statistics = {video_id: info['statistics']
+                          for video_id, info
+                          in video_info.items()}
+            with metrics.stage('viewcounts'):
+                ViewCount.objects.create_viewcounts(*video_list,
+                                                    statistics=statistics)
+            # Create and/or associate each videos tags with that video
+            with metrics.stage('tags'):
+                Tag.objects.tag_videos({video.id: tags[video.video_id]
+                                        for video
+                                        in video_list})
+            # Add the videos to the feeds of everyone following them
+            with metrics.stage('feeds'):
+                FeedItem.objects.fan_out(video_list)
+            with metrics.stage('search_index'):
+                SearchTerm.objects.index_videos(video_ids)
+            videos_created.send(sender=self.model, videos=video_list)
         return videos
 
     def get_video_info(self, video_ids):
+        """
+        Returns the snippet and statistics of each video keyed by video_id
+        """
         # API Request Parameters
-        fields = ('items/snippet('
-                  'publishedAt, categoryId, tags, title, description)')
-        parameters = dict(part='snippet',
-                          id=', '.join(video_ids),
-                          fields=fields)
-        return(self._get_info_from_api('videos', parameters))
+        fields = ('items(id, snippet('
+                  'publishedAt, categoryId, tags, title, description), '
+                  'statistics/viewCount)')
+        parameters = dict(part='snippet,statistics', fields=fields)
+        return self._get_items_by_id('videos', parameters, video_ids)
 
     def order_by_votes(self, descending=True):
         # Replace this with a more complex algorithm later
-        query = self.annotate(vote_score=Sum('videovote__value'))
-        # query = query.prefetch_related('videovote')
-        ordering = '{}vote_score'.format('-' if descending else '')
-        return query.order_by(ordering)
+        return self.order_by(*unique_ordering('score', descending))
 
     def order_by_views(self, descending=True):
         # Replace this with a more complex algorithm later
-        query = self.annotate(max_views=Max('viewcount__views'))
-        # query = query.prefetch_related('viewcount')
-        ordering = '{}max_views'.format('-' if descending else '')
-        return query.order_by(ordering)
+        return self.order_by(*unique_ordering('views', descending))
+
+    def order_by_trending(self, descending=True):
+        """
+        Order videos by their precomputed hot score, only videos that have
+        been ranked are included
+        """
+        query = self.filter(rank__isnull=False).annotate(
+                hot_score=F('rank__hot_score'))
+        return query.order_by(*unique_ordering('hot_score', descending))
+
+    def set_favorites(self, user_id, favorites):
+        """
+        Favorite and unfavorite many videos for a user at once. favorites
+        maps video ids to whether the user should have them favorited
+        """
+        through = self.model.favorited_by.through
+        added = [video_id
+                 for video_id, favorite
+                 in favorites.items()
+                 if favorite]
+        removed = [video_id
+                   for video_id, favorite
+                   in favorites.items()
+                   if not favorite]
+        with transaction.atomic(using=self.db):
+            # Favorites the user already has are skipped by the unique
+            # constraint on the favorites table
+            upsert_rows(through,
+                        ['video_id', 'user_id'],
+                        [[video_id, user_id] for video_id in added],
+                        ['video_id', 'user_id'],
+                        using=self.db)
+            if removed:
+                through.objects.filter(user_id=user_id,
+                                       video_id__in=removed).delete()
 
 
 class Video(models.Model):
@@ -150,10 +438,25 @@ class Video(models.Model):
                                    blank=True)
     published = models.DateTimeField(_('Video publication date'))
     title = models.CharField(_('Video title'), max_length=100)
-    updated = models.DateTimeField(_('Last updated'), auto_now=True)
+    # Also changes when the vote or view counters of the video change
+    updated = models.DateTimeField(_('Last updated'),
+                                   auto_now=True,
+                                   db_index=True)
     video_id = models.CharField(_('Youtube ID for video'),
                                 unique=True,
                                 max_length=100)
+    # Vote counters maintained as VideoVotes are created, changed and deleted
+    score = models.IntegerField(_('Vote score'), default=0, db_index=True)
+    upvotes = models.PositiveIntegerField(_('Number of upvotes'), default=0)
+    downvotes = models.PositiveIntegerField(_('Number of downvotes'),
+                                            default=0)
+    # Most recent ViewCount, kept up to date as view counts are recorded
+    views = models.BigIntegerField(_('Latest view count'),
+                                   default=0,
+                                   db_index=True)
+    views_counted = models.DateTimeField(_('Time latest views were counted'),
+                                         null=True,
+                                         blank=True)
 
     # Relationships
     category = models.ForeignKey(Category,
@@ -178,6 +481,14 @@ class Video(models.Model):
     # Manager
     objects = VideoManager()
 
+    class Meta:
+        # Each of the orderings videos are listed by along with the primary
+        # key used to break ties, so pages can be found by seeking an index
+        index_together = [('score', 'id'),
+                          ('views', 'id'),
+                          ('created', 'id'),
+                          ('published', 'id')]
+
     def __str__(self):
         return self.title
 
@@ -187,27 +498,97 @@ class ViewCountManager(models.Manager, VideoAPIMixin):
     Custom manager needed to couple the gathering of data needed to create
     an object with its api calls and logic
     """
-    def create_viewcounts(self, *videos):
-        # Define the parameters to supply to the API
-        parameters = dict(part='statistics',
-                          id=', '.join(video.video_id for video in videos),
-                          fields='items/statistics/viewCount')
-        # Get JSON from API response
-        JSON = self._get_info_from_api('videos', parameters)
+    # Most videos given their latest views by a single statement
+    UPDATE_BATCH_SIZE = 100
+
+    def create_viewcounts(self, *videos, statistics=None):
+        """
+        Record the current view count of each video. statistics maps
+        video_ids to statistics already fetched from the API, otherwise they
+        are requested
+        """
+        if statistics is None:
+            # Define the parameters to supply to the API
+            parameters = dict(part='statistics',
+                              fields='items(id, statistics/viewCount)')
+            # Get JSON from API response
+            statistics = {video_id: info['statistics']
+                          for video_id, info
+                          in self._get_items_by_id(
+                              'videos',
+                              parameters,
+                              [video.video_id for video in videos]).items()}
         # Extract view counts for each video
-        viewcounts = [self.model(views=video_info['statistics']['viewCount'],
-                                 video=videos[i])
-                      for i, video_info
-                      in enumerate(JSON['items'])]
+        viewcounts = [self.model(
+                          views=statistics[video.video_id]['viewCount'],
+                          video=video)
+                      for video
+                      in videos
+                      if video.video_id in statistics]
         # Now create the object(s) with the gathered information
         self.bulk_create(viewcounts)
 
+    def bulk_create(self, objs, batch_size=None):
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            objs = super(ViewCountManager, self).bulk_create(objs, batch_size)
+            self.update_latest_views(objs)
+        return objs
+
+    def update_latest_views(self, viewcounts):
+        """
+        Copy the newest of the given view counts onto their videos, leaving
+        any video whose views were counted more recently untouched
+        """
+        latest = {}
+        for viewcount in viewcounts:
+            current = latest.get(viewcount.video_id)
+            if (current is None or
+                    current.count_datetime < viewcount.count_datetime):
+                latest[viewcount.video_id] = viewcount
+        latest = list(latest.values())
+        datetime = models.DateTimeField()
+        for index in range(0, len(latest), self.UPDATE_BATCH_SIZE):
+            batch = latest[index:index+self.UPDATE_BATCH_SIZE]
+            newer = [(viewcount,
+                      Q(pk=viewcount.video_id) &
+                      (Q(views_counted=None) |
+                       Q(views_counted__lt=viewcount.count_datetime)))
+                     for viewcount
+                     in batch]
+            # A single statement updates every video in the batch
+            views = Case(*[When(condition, then=Value(int(viewcount.views)))
+                           for viewcount, condition
+                           in newer],
+                         default=F('views'),
+                         output_field=models.BigIntegerField())
+            counted_at = Case(*[When(condition,
+                                     then=Value(viewcount.count_datetime,
+                                                output_field=datetime))
+                                for viewcount, condition
+                                in newer],
+                              default=F('views_counted'),
+                              output_field=datetime)
+            Video.objects.filter(
+                    pk__in=[viewcount.video_id for viewcount in batch]).update(
+                views=views,
+                views_counted=counted_at,
+                **auto_now_values(Video))
+        if latest:
+            views_counted.send(sender=self.model,
+                               video_ids=[viewcount.video_id
+                                          for viewcount
+                                          in latest])
+
 
 class ViewCount(models.Model):
     # Attributes
+    # Defaults to now rather than using auto_now_add so past view counts can
+    # be recorded with the time they were counted
     count_datetime = models.DateTimeField(
         _('Date and time video views were counted'),
-        auto_now_add=True)
+        default=timezone.now,
+        db_index=True)
     views = models.BigIntegerField(_('Video view count'))
 
     # Relationships
@@ -222,46 +603,517 @@ class ViewCount(models.Model):
         # Avoid creation of multiple viewcounts for same datetime and video
         unique_together = ('video', 'count_datetime')
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super(ViewCount, self).save(*args, **kwargs)
+            ViewCount.objects.update_latest_views([self])
+
     def __str__(self):
         return str(self.count_datetime) + ': ' + str(self.views)
 
 
+class VideoRank(models.Model):
+    """
+    Time decayed hot score of a video, computed offline by the rank_videos
+    command so trending videos can be listed straight from an index
+    """
+    # Attributes
+    hot_score = models.FloatField(_('Hot score'), db_index=True)
+    computed = models.DateTimeField(_('Time the score was computed'),
+                                    db_index=True)
+
+    # Relationships
+    video = models.OneToOneField(Video,
+                                 on_delete=models.CASCADE,
+                                 primary_key=True,
+                                 related_name='rank',
+                                 verbose_name=_('Video ranked'))
+
+    def __str__(self):
+        return '{}: {}'.format(self.video_id, self.hot_score)
+
+
+class RelatedVideo(models.Model):
+    """
+    One of the videos most related to another by their shared tags and
+    category, computed offline by the compute_related_videos command so the
+    related videos of a video can be listed straight from an index
+    """
+    # Attributes
+    score = models.FloatField(_('Relatedness score'))
+
+    # Relations
+    video = models.ForeignKey(Video,
+                              on_delete=models.CASCADE,
+                              related_name='related_videos',
+                              verbose_name=_('Video related to'))
+    related = models.ForeignKey(Video,
+                                on_delete=models.CASCADE,
+                                related_name='+',
+                                verbose_name=_('Related video'))
+
+    class Meta:
+        unique_together = ('video', 'related')
+        index_together = [('video', 'score', 'id')]
+
+    def __str__(self):
+        return '{} -> {}: {}'.format(self.video_id,
+                                     self.related_id,
+                                     self.score)
+
+
+class SimilarVideo(models.Model):
+    """
+    One of the videos most often liked or favorited by the same users as
+    another, computed offline by the compute_recommendations command and
+    used to recommend videos to users from what they liked
+    """
+    # Attributes
+    score = models.FloatField(_('Similarity score'))
+
+    # Relations
+    video = models.ForeignKey(Video,
+                              on_delete=models.CASCADE,
+                              related_name='similar_videos',
+                              verbose_name=_('Video similar to'))
+    similar = models.ForeignKey(Video,
+                                on_delete=models.CASCADE,
+                                related_name='+',
+                                verbose_name=_('Similar video'))
+
+    class Meta:
+        unique_together = ('video', 'similar')
+        index_together = [('video', 'score', 'id')]
+
+    def __str__(self):
+        return '{} -> {}: {}'.format(self.video_id,
+                                     self.similar_id,
+                                     self.score)
+
+
+class Recommendation(models.Model):
+    """
+    A video recommended to a user from the videos similar to the ones they
+    liked and favorited, computed offline so recommendations can be listed
+    straight from an index
+    """
+    # Attributes
+    score = models.FloatField(_('Recommendation score'))
+    created = models.DateTimeField(_('Creation date'), auto_now_add=True)
+
+    # Relations
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='recommendations',
+                             verbose_name=_('User recommended to'))
+    video = models.ForeignKey(Video,
+                              on_delete=models.CASCADE,
+                              verbose_name=_('Video recommended'))
+
+    class Meta:
+        unique_together = ('user', 'video')
+        index_together = [('user', 'score', 'id')]
+
+    def __str__(self):
+        return '{}: {}'.format(self.user_id, self.video_id)
+
+
+class FeedItemManager(models.Manager):
+    # Seconds of newer submission worth the same as matching one more follow
+    DECAY_SECONDS = 6 * 60 * 60
+    # How far back a rebuilt feed reaches
+    WINDOW = timedelta(days=30)
+
+    def get_rank(self, created, weight):
+        return created.timestamp() / self.DECAY_SECONDS + weight
+
+    def fan_out(self, videos, user_ids=None):
+        """
+        Add videos to the feeds of every user following their uploader,
+        category or one of their tags, or only to the feeds of user_ids when
+        given. A video is only added to a feed once however many follows it
+        matches but each match raises its rank. Followers are found with a
+        query per kind of follow and the feed items upserted together, so
+        fanning out a batch of videos costs the same as a single one
+        """
+        if not videos:
+            return
+        videos_by_id = {video.id: video for video in videos}
+        by_uploader = defaultdict(list)
+        by_category = defaultdict(list)
+        by_tag = defaultdict(list)
+        for video in videos:
+            by_uploader[video.uploader_id].append(video)
+            by_category[video.category_id].append(video)
+        for video_id, tag_id in Video.tags.through.objects.filter(
+                video_id__in=list(videos_by_id)).values_list('video_id',
+                                                             'tag_id'):
+            by_tag[tag_id].append(videos_by_id[video_id])
+        # Through table of each kind of follow, its column for the follower
+        # and the followed and the videos each followed object matches
+        follows = [(User.following.through, 'from_user_id', 'to_user_id',
+                    by_uploader),
+                   (Category.followed_by.through, 'user_id', 'category_id',
+                    by_category),
+                   (Tag.followed_by.through, 'user_id', 'tag_id', by_tag)]
+        weights = defaultdict(int)
+        for through, user_column, followed_column, followed in follows:
+            if not followed:
+                continue
+            followers = through.objects.filter(
+                    **{followed_column + '__in': list(followed)})
+            if user_ids is not None:
+                followers = followers.filter(
+                        **{user_column + '__in': list(user_ids)})
+            for user_id, followed_id in followers.values_list(
+                    user_column, followed_column):
+                for video in followed[followed_id]:
+                    weights[user_id, video.id] += 1
+        upsert_rows(self.model,
+                    ['user_id', 'video_id', 'weight', 'rank'],
+                    [(user_id, video_id, weight,
+                      self.get_rank(videos_by_id[video_id].created, weight))
+                     for (user_id, video_id), weight
+                     in weights.items()],
+                    ['user_id', 'video_id'],
+                    ['weight', 'rank'],
+                    using=self.db)
+
+    def rebuild(self, *user_ids):
+        """
+        Rebuild the feeds of users from scratch, for when what they follow
+        changes. Only videos submitted within the feed window are included
+        """
+        since = timezone.now() - self.WINDOW
+        with transaction.atomic(using=self.db):
+            self.filter(user_id__in=user_ids).delete()
+            videos = list(Video.objects.filter(
+                    Q(uploader__followers__in=user_ids) |
+                    Q(category__followed_by__in=user_ids) |
+                    Q(tags__followed_by__in=user_ids),
+                    created__gte=since).distinct())
+            self.fan_out(videos, user_ids)
+
+    def get_feed(self, user_id):
+        """
+        A users feed from their best ranked item down, read from a single
+        index
+        """
+        return self.filter(user_id=user_id).order_by(
+                *unique_ordering('rank')).select_related('video')
+
+
+class FeedItem(models.Model):
+    """
+    A video in the feed of a user, added when it is submitted by a user,
+    to a category or with a tag they follow so a feed can be read without
+    joining every kind of follow
+    """
+    # Attributes
+    # Number of the users follows the video matches
+    weight = models.PositiveIntegerField(_('Follows matched'), default=1)
+    rank = models.FloatField(_('Rank in feed'))
+
+    # Relations
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='feed_items',
+                             verbose_name=_('User whose feed it is'))
+    video = models.ForeignKey(Video,
+                              on_delete=models.CASCADE,
+                              verbose_name=_('Video in feed'))
+
+    # Manager
+    objects = FeedItemManager()
+
+    class Meta:
+        unique_together = ('user', 'video')
+        index_together = [('user', 'rank', 'id')]
+
+    def __str__(self):
+        return '{}: {}'.format(self.user_id, self.video_id)
+
+
+class SearchTermManager(models.Manager):
+    # Words of a query searched for, the rest are ignored
+    MAX_QUERY_TERMS = 8
+    # Shortest last word of a query matched as a prefix, shorter prefixes
+    # match too many terms to rank quickly
+    MIN_PREFIX_LENGTH = 3
+    # Weight of a term appearing once in each field of a video, so matching
+    # its title ranks it above matching its tags above its description.
+    # Weights are integers so ranks sum exactly and can be paged by
+    FIELD_WEIGHTS = (('title', 100), ('tags', 40), ('description', 10))
+
+    def get_weights(self, fields):
+        """
+        Weight of each term in a dictionary of field names to text, rising
+        with the log of how many times it appears in each field
+        """
+        weights = defaultdict(float)
+        for field, field_weight in self.FIELD_WEIGHTS:
+            words = re.findall(r'\w+', fields[field].lower())
+            counts = Counter(word[:self.model.MAX_LENGTH] for word in words)
+            for term, count in counts.items():
+                if len(term) > 1:
+                    weights[term] += field_weight * (1 + math.log(count))
+        return {term: int(round(weight))
+                for term, weight
+                in weights.items()}
+
+    def index_videos(self, video_ids):
+        """
+        Replace the search terms of videos with the words of their current
+        title, description and tags, in a query per table whatever the number
+        of videos
+        """
+        video_ids = list(video_ids)
+        if not video_ids:
+            return
+        fields = {video_id: {'title': title,
+                             'description': description,
+                             'tags': ''}
+                  for video_id, title, description
+                  in Video.objects.filter(id__in=video_ids).values_list(
+                      'id', 'title', 'description')}
+        for video_id, tag_title in Video.tags.through.objects.filter(
+                video_id__in=video_ids).values_list('video_id', 'tag__title'):
+            fields[video_id]['tags'] += ' ' + tag_title
+        with transaction.atomic(using=self.db):
+            self.filter(video_id__in=video_ids).delete()
+            self.bulk_create([self.model(term=term,
+                                         video_id=video_id,
+                                         weight=weight)
+                              for video_id, video_fields
+                              in fields.items()
+                              for term, weight
+                              in self.get_weights(video_fields).items()],
+                             batch_size=500)
+
+    def get_prefix_condition(self, prefix):
+        """
+        Condition matching the terms starting with prefix. Postgres finds them
+        with the pattern index it is given on the term column but the LIKE
+        of sqlite ignores case so cannot use an index, there the terms are
+        found by the range of terms sorting between the prefix and the next
+        possible prefix instead
+        """
+        condition = Q(term__startswith=prefix)
+        if connections[self.db].vendor == 'sqlite':
+            condition &= Q(term__gte=prefix,
+                           term__lt=prefix[:-1] + chr(ord(prefix[-1]) + 1))
+        return condition
+
+    def search(self, query):
+        """
+        Rows of the video_id and rank of every video matching all the words
+        of a query, best ranked first. The last word also matches any term
+        it is the start of so results can be shown as the query is typed.
+        The ordering ends with the video id so results can be paged by
+        cursor
+        """
+        terms = get_search_terms(query)[:self.MAX_QUERY_TERMS]
+        if not terms:
+            return self.none().values('video_id')
+        conditions = [Q(term=term) for term in terms[:-1]]
+        if len(terms[-1]) < self.MIN_PREFIX_LENGTH:
+            conditions.append(Q(term=terms[-1]))
+        else:
+            conditions.append(self.get_prefix_condition(terms[-1]))
+        matched = Q()
+        for condition in conditions:
+            matched |= condition
+        # A flag for each word set when any term of the video matches it
+        flags = {'matched_{}'.format(index): Max(Case(
+                     When(condition, then=Value(1)),
+                     default=Value(0),
+                     output_field=IntegerField()))
+                 for index, condition
+                 in enumerate(conditions)}
+        return self.filter(matched).values('video_id').annotate(
+                rank=Sum('weight'), **flags).filter(
+                    **{name: 1 for name in flags}).order_by('-rank',
+                                                            '-video_id')
+
+
+class SearchTerm(models.Model):
+    """
+    A word of the title, description or tags of a video along with how much
+    it counts towards ranking the video in searches for it, together an
+    inverted index searched a word at a time
+    """
+    # Longest term indexed, longer words are cut down to it
+    MAX_LENGTH = 40
+
+    # Attributes
+    # db_index also gives postgres an index usable by prefix searches
+    term = models.CharField(_('Search term'),
+                            max_length=MAX_LENGTH,
+                            db_index=True)
+    weight = models.PositiveIntegerField(_('Term weight'))
+
+    # Relations
+    video = models.ForeignKey(Video,
+                              on_delete=models.CASCADE,
+                              related_name='search_terms',
+                              verbose_name=_('Video searched'))
+
+    # Manager
+    objects = SearchTermManager()
+
+    class Meta:
+        unique_together = ('video', 'term')
+        # Lets searches rank videos from the index alone
+        index_together = [('term', 'video', 'weight')]
+
+    def __str__(self):
+        return '{}: {}'.format(self.term, self.video_id)
+
+
 class CommentManager(models.Manager):
     def order_by_votes(self, descending=True):
-        query = self.annotate(vote_score=Sum('commentvote__value'))
-        ordering = '{}vote_score'.format('-' if descending else '')
-        return query.order_by(ordering)
+        return self.order_by(*unique_ordering('score', descending))
 
-    def get_children(self, depth=None):
+    def get_children(self, depth=None, descending=True):
         """
         Function to return the children of a parent process, descends into
         each childs children as well until all children have been exaughsted
-        or the maximum depth has been reached
-        """
-        if depth is None:
-            return [[comment, comment.children.get_children()]
-                    if comment.children.count()
-                    else comment
-                    for comment
-                    in self.all()]
-        elif depth == 0:
-            # Maximum depth reached so just return all children related to this
-            # object and exit the function
-            return self.all()
-        else:
-            # Still traversing down child relations
-            return [comment.children.get_children(depth=depth-1)
-                    if comment.children.count()
-                    else comment
-                    for comment
-                    in self.all()]
+        or the maximum depth has been reached.
+
+        Rather than querying each level separately the replies beneath the
+        comments, down to the maximum depth, are loaded with a single
+        recursive query and nested in memory
+        """
+        parents = list(self.order_by_votes(descending))
+        if not parents or depth == 0:
+            # Maximum depth reached so just return the comments themselves
+            return parents
+        return build_comment_tree(self.get_descendants(depth, descending),
+                                  parents, depth)
+
+    def get_descendants(self, depth=None, descending=True):
+        """
+        Function to return the replies to the comments, the replies to those
+        and so on down to depth levels, found by walking parent_id with a
+        recursive common table expression so only the comments beneath them
+        are read rather than the rest of their videos' threads
+        """
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        inner, params = self.order_by().values('id').query.sql_with_params()
+        limit = ''
+        if depth is not None:
+            limit = 'WHERE "subtree"."depth" < %s'
+            params = params + (depth,)
+        # The replies are aliased so they are not mistaken for the rows of
+        # the comments beneath which they are found
+        subtree = ('WITH RECURSIVE "subtree" ("id", "depth") AS ('
+                   'SELECT "reply"."id", 1 FROM {table} AS "reply" '
+                   'WHERE "reply"."parent_id" IN ({inner}) '
+                   'UNION ALL '
+                   'SELECT "reply"."id", "subtree"."depth" + 1 '
+                   'FROM {table} AS "reply" INNER JOIN "subtree" '
+                   'ON "reply"."parent_id" = "subtree"."id" {limit}) '
+                   'SELECT "id" FROM "subtree"').format(table=table,
+                                                        inner=inner,
+                                                        limit=limit)
+        return self.model.objects.db_manager(self.db).order_by_votes(
+                descending).extra(where=['{}."id" IN ({})'.format(table,
+                                                                  subtree)],
+                                  params=params)
+
+    def get_thread(self, video_id, depth=None, descending=True):
+        """
+        Function to return every comment made on a video nested beneath its
+        parent, fetched along with their commenters in a single query
+        """
+        thread = list(self.order_by_votes(descending).filter(
+                video_id=video_id).select_related('commenter'))
+        parents = [comment for comment in thread if comment.parent_id is None]
+        return build_comment_tree(thread, parents, depth)
+
+    def get_replies(self, parents, depth=None, breadth=None, descending=True):
+        """
+        Function to return already fetched comments with their replies nested
+        beneath them, loading at most depth levels of replies and breadth
+        replies to each comment. Each level is loaded with a single query so
+        the cost of a page of comments does not depend on how deep or wide
+        the threads beneath it are. Every comment returned has more_replies
+        set when some of its replies were left out so they can be loaded
+        later
+        """
+        replies = []
+        level = list(parents)
+        remaining_depth = depth
+        while level and remaining_depth != 0:
+            query = self.order_by_votes(descending).filter(
+                    parent_id__in=[comment.id for comment in level])
+            if breadth is not None:
+                query = self.limit_replies(query, breadth + 1, descending)
+            children = defaultdict(list)
+            for reply in query.select_related('commenter'):
+                children[reply.parent_id].append(reply)
+            next_level = []
+            for comment in level:
+                loaded = children.get(comment.id, [])[:breadth]
+                comment.more_replies = (len(loaded) <
+                                        len(children.get(comment.id, [])))
+                next_level.extend(loaded)
+            replies.extend(next_level)
+            level = next_level
+            if remaining_depth is not None:
+                remaining_depth -= 1
+        if level:
+            # Maximum depth reached so only check whether the deepest comments
+            # have any replies
+            replied_to = set(self.filter(
+                    parent_id__in=[comment.id for comment in level]
+                    ).values_list('parent_id', flat=True))
+            for comment in level:
+                comment.more_replies = comment.id in replied_to
+        return build_comment_tree(replies, parents, depth)
+
+    def limit_replies(self, query, limit, descending=True):
+        """
+        Limit the replies loaded to each parent to limit in the database,
+        numbering the replies of each parent in order with ROW_NUMBER(), so
+        a wide thread does not load every reply. Databases without window
+        functions load every reply and get_replies drops the rest
+        """
+        connection = connections[self.db]
+        if not supports_window_functions(connection):
+            return query
+        direction = 'DESC' if descending else 'ASC'
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        inner, params = query.order_by().values('id').query.sql_with_params()
+        # The replies are aliased so they are not mistaken for the rows of
+        # the query being limited
+        ranked = ('SELECT "id" FROM (SELECT "reply"."id", ROW_NUMBER() OVER '
+                  '(PARTITION BY "reply"."parent_id" ORDER BY "reply"."score" '
+                  '{direction}, "reply"."id" {direction}) AS "position" '
+                  'FROM {table} AS "reply" WHERE "reply"."id" IN ({inner})) '
+                  'AS "ranked" WHERE "position" <= %s').format(
+                      table=table,
+                      direction=direction,
+                      inner=inner)
+        # Added as a where clause rather than a RawSQL expression which would
+        # be parenthesized again, making it a scalar subquery
+        return query.extra(where=['{}."id" IN ({})'.format(table, ranked)],
+                           params=params + (limit,))
 
 
 class Comment(models.Model):
     # Attributes
     text = models.CharField(_('Comment text'), max_length=10000)
     created = models.DateTimeField(_('Comment creation time'),
-                                   auto_now_add=True)
+                                   auto_now_add=True,
+                                   db_index=True)
+    # Vote counters maintained as CommentVotes are created, changed and
+    # deleted
+    score = models.IntegerField(_('Vote score'), default=0, db_index=True)
+    upvotes = models.PositiveIntegerField(_('Number of upvotes'), default=0)
+    downvotes = models.PositiveIntegerField(_('Number of downvotes'),
+                                            default=0)
 
     # Relations
     parent = models.ForeignKey('self',
@@ -282,14 +1134,15 @@ class Comment(models.Model):
                                    through='CommentVote',
                                    related_name=_('comments_voted_on'))
 
-    @cached_property
-    def score(self):
-        return self.commentvote_set.aggregate(
-                Sum('value')).get('value__sum', 0)
-
     # Manager
     objects = CommentManager()
 
+    class Meta:
+        # Top level comments are listed per video and replies per parent,
+        # both by score with the primary key breaking ties
+        index_together = [('video', 'parent', 'score', 'id'),
+                          ('parent', 'score', 'id')]
+
     # Methods
     def save(self, *args, **kwargs):
         """
@@ -298,14 +1151,107 @@ class Comment(models.Model):
         if self.pk is None:
             # Has not been saved before so it is being created
             super(Comment, self).save(*args, **kwargs)
-            CommentVote.create(value=1,
-                               voter=self.commenter,
-                               comment=self)
+            CommentVote.objects.create(value=1,
+                                       voter=self.commenter,
+                                       comment=self)
         else:
             super(Comment, self).save(*args, **kwargs)
 
 
-class CommentVote(models.Model):
+class VoteManager(models.Manager):
+    """
+    Custom manager needed so votes inserted in bulk are also counted by the
+    object voted on
+    """
+    def bulk_create(self, objs, batch_size=None):
+        objs = list(objs)
+        field = self.model._meta.get_field(self.model.counted_field)
+        with transaction.atomic(using=self.db):
+            objs = super(VoteManager, self).bulk_create(objs, batch_size)
+            update_vote_counters(self.model,
+                                 [(getattr(vote, field.attname),
+                                   None,
+                                   vote.value)
+                                  for vote
+                                  in objs])
+        return objs
+
+    def set_votes(self, voter_id, values):
+        """
+        Cast, change and remove the votes of a voter on many objects at once.
+        values maps the ids of the objects voted on to the value of the vote,
+        None removing it. The votes are upserted with a single statement per
+        batch, relying on each voter only having one vote per object, and
+        the counters of the objects voted on are updated to match
+        """
+        field = self.model._meta.get_field(self.model.counted_field)
+        with transaction.atomic(using=self.db):
+            previous = dict(self.select_for_update().filter(
+                    voter_id=voter_id,
+                    **{field.attname + '__in': list(values)}
+                    ).values_list(field.attname, 'value'))
+            changes = [(object_id, previous.get(object_id), value)
+                       for object_id, value
+                       in values.items()
+                       if previous.get(object_id) != value]
+            removed = [object_id
+                       for object_id, old_value, new_value
+                       in changes
+                       if new_value is None]
+            auto_now = auto_now_values(self.model)
+            columns = [field.attname, 'voter_id', 'value'] + list(auto_now)
+            upsert_rows(self.model,
+                        columns,
+                        [[object_id, voter_id, new_value] +
+                         list(auto_now.values())
+                         for object_id, old_value, new_value
+                         in changes
+                         if new_value is not None],
+                        [field.attname, 'voter_id'],
+                        columns[2:],
+                        using=self.db)
+            if removed:
+                # Deleted without signals as the counters are updated below
+                connection = connections[self.db]
+                quote = connection.ops.quote_name
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'DELETE FROM {table} WHERE {voter} = %s AND '
+                        '{counted} IN ({values})'.format(
+                            table=quote(self.model._meta.db_table),
+                            voter=quote('voter_id'),
+                            counted=quote(field.column),
+                            values=', '.join(['%s'] * len(removed))),
+                        [voter_id] + removed)
+            update_vote_counters(self.model, changes)
+
+
+class CountedVoteMixin:
+    """
+    Keeps the vote counters of the object voted on up to date whenever a vote
+    is saved. Deleted votes are handled by the post_delete receiver below as
+    it also runs for queryset and cascading deletes
+    """
+    # Name of the foreign key to the object whose counters track the vote
+    counted_field = None
+
+    def save(self, *args, **kwargs):
+        field = self._meta.get_field(self.counted_field)
+        with transaction.atomic():
+            previous = None
+            if self.pk is not None:
+                previous = (type(self).objects.select_for_update()
+                            .filter(pk=self.pk)
+                            .values_list(field.attname, 'value')
+                            .first())
+            super(CountedVoteMixin, self).save(*args, **kwargs)
+            changes = [(getattr(self, field.attname), None, self.value)]
+            if previous is not None:
+                changes.append((previous[0], previous[1], None))
+            update_vote_counters(type(self), changes)
+
+
+class CommentVote(CountedVoteMixin, models.Model):
     # Attributes
     value = models.SmallIntegerField(_('Vote value assigned by User, 1 or -1'))
 
@@ -317,11 +1263,17 @@ class CommentVote(models.Model):
                               on_delete=models.CASCADE,
                               verbose_name=_('User who voted on comment'))
 
+    # Manager
+    objects = VoteManager()
+
+    # Counters
+    counted_field = 'comment'
+
     class Meta:
         unique_together = ('comment', 'voter')
 
 
-class VideoVoteManager(models.Manager):
+class VideoVoteManager(VoteManager):
     def create_votes(self, user_id, *video_ids):
         # Want this to fail loudly if logic tries to vote on video already
         # voted on so no stripping of existing values done
@@ -334,9 +1286,13 @@ class VideoVoteManager(models.Manager):
         self.bulk_create(votes)
 
 
-class VideoVote(models.Model):
+class VideoVote(CountedVoteMixin, models.Model):
     # Attributes
     value = models.IntegerField(_('Vote value'))
+    # Lets votes cast or changed since an earlier export be exported
+    updated = models.DateTimeField(_('Last updated'),
+                                   auto_now=True,
+                                   db_index=True)
 
     # Relations
     video = models.ForeignKey(Video,
@@ -349,5 +1305,88 @@ class VideoVote(models.Model):
     # Manager
     objects = VideoVoteManager()
 
+    # Counters
+    counted_field = 'video'
+
     class Meta:
         unique_together = ('video', 'voter')
+
+
+@receiver(post_delete, sender=CommentVote)
+@receiver(post_delete, sender=VideoVote)
+def uncount_deleted_vote(sender, instance, **kwargs):
+    """
+    Remove a deleted vote from the counters of the object it was cast on
+    """
+    field = sender._meta.get_field(sender.counted_field)
+    update_vote_counters(sender,
+                         [(getattr(instance, field.attname),
+                           instance.value,
+                           None)])
+
+
+@receiver(m2m_changed, sender=User.following.through)
+@receiver(m2m_changed, sender=Category.followed_by.through)
+@receiver(m2m_changed, sender=Tag.followed_by.through)
+def rebuild_follower_feeds(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    """
+    Rebuild the feeds of users whose follows change so they hold the videos
+    of what they follow now
+    """
+    # Whether the user following changed what they follow rather than the
+    # followers of the instance changing
+    by_follower = isinstance(instance, User) and not (
+            sender is User.following.through and reverse)
+    if action == 'pre_clear' and not by_follower:
+        # The followers of a cleared instance are no longer known by
+        # post_clear
+        followers = (instance.followers
+                     if isinstance(instance, User)
+                     else instance.followed_by)
+        instance._cleared_follower_ids = list(
+                followers.values_list('id', flat=True))
+    if action == 'post_clear':
+        user_ids = ([instance.pk]
+                    if by_follower
+                    else instance.__dict__.pop('_cleared_follower_ids', []))
+    elif action in ('post_add', 'post_remove') and pk_set:
+        user_ids = [instance.pk] if by_follower else list(pk_set)
+    else:
+        return
+    if user_ids:
+        FeedItem.objects.rebuild(*user_ids)
+
+
+@receiver(post_save, sender=Video)
+def index_saved_video(sender, instance, update_fields, **kwargs):
+    """
+    Index the words of a video again when it is created or edited, saves only
+    updating fields that are not searched leave it as it is
+    """
+    if update_fields is not None and not {'title', 'description'} & set(
+            update_fields):
+        return
+    SearchTerm.objects.index_videos([instance.pk])
+
+
+@receiver(m2m_changed, sender=Video.tags.through)
+def index_retagged_videos(sender, instance, action, reverse, pk_set,
+                          **kwargs):
+    """
+    Index videos again when their tags change
+    """
+    if action == 'pre_clear' and reverse:
+        # The videos of a cleared tag are no longer known by post_clear
+        instance._cleared_video_ids = list(
+                instance.video_set.values_list('id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        video_ids = [instance.pk]
+    elif action == 'post_clear':
+        video_ids = instance.__dict__.pop('_cleared_video_ids', [])
+    else:
+        # Videos were added to or removed from a tag
+        video_ids = pk_set or []
+    SearchTerm.objects.index_videos(video_ids)
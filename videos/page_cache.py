@@ -0,0 +1,281 @@
+import hashlib
+import threading
+import time
+from collections import Counter, OrderedDict
+from uuid import uuid4
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.db import transaction
+
+# Options of the video list page cache, any of which can be overridden by a
+# VIDEO_LIST_CACHE dictionary in the settings
+DEFAULTS = {
+    # Alias of the cache shared by every process, which must be one every
+    # process can reach such as memcached
+    'BACKEND': 'default',
+    # Seconds a page is served before it is rendered again
+    'TIMEOUT': 60,
+    # Seconds an expired page is still served while one request renders it
+    # again, so the rest do not all render it at once
+    'STALE_TIMEOUT': 30,
+    # Pages kept in the memory of each process and for how many seconds,
+    # which also bounds how long a process misses invalidations made by
+    # other processes
+    'LOCAL_SIZE': 128,
+    'LOCAL_TIMEOUT': 5,
+    # Seconds the request rendering a page holds its lock, requests with no
+    # page to serve wait up to this long for it before rendering it too
+    'LOCK_TIMEOUT': 10,
+    'POLL_INTERVAL': 0.05,
+}
+
+
+# Cache backends holding entries in the memory of each process, so they are
+# not shared with any other process
+LOCAL_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',
+                  'django.core.cache.backends.dummy.DummyCache')
+
+
+def get_options():
+    options = dict(DEFAULTS)
+    options.update(getattr(settings, 'VIDEO_LIST_CACHE', {}))
+    return options
+
+
+def check_shared_cache(app_configs, **kwargs):
+    """
+    System check warning when the cache meant to be shared by every process
+    is held in the memory of each process, where renders are not single
+    flight and invalidations are not seen across processes
+    """
+    alias = get_options()['BACKEND']
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    if backend not in LOCAL_BACKENDS:
+        return []
+    return [checks.Warning(
+            'The shared cache {!r} is not shared between processes'.format(
+                alias),
+            hint='Configure a cache every process can reach, such as '
+                 'memcached, in CACHES',
+            obj=backend,
+            id='videos.W001')]
+
+
+class LocalCache(object):
+    """
+    Least recently used cache of a bounded number of entries held in the
+    memory of a process, each expiring after its own timeout
+    """
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self.lock:
+            self.entries[key] = (value, time.time() + timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class TieredCache(object):
+    """
+    Cache of rendered content checked first in the memory of the process and
+    then in a shared cache backend before rendering it. Keys include a version
+    so bumping it invalidates every entry of a namespace at once. Only one
+    request renders an expired or missing entry at a time, the others are
+    served the stale entry or wait for the new one. Counts of how each
+    request was served are kept in stats
+    """
+    def __init__(self, prefix, namespaces, **overrides):
+        self.prefix = prefix
+        self.namespaces = namespaces
+        self.overrides = overrides
+        self.local = LocalCache(self.options['LOCAL_SIZE'])
+        self.versions = LocalCache(len(namespaces))
+        self.stats = Counter()
+        self.stats_lock = threading.Lock()
+
+    @property
+    def options(self):
+        options = get_options()
+        options.update(self.overrides)
+        return options
+
+    @property
+    def shared(self):
+        return caches[self.options['BACKEND']]
+
+    def count(self, outcome):
+        with self.stats_lock:
+            self.stats[outcome] += 1
+
+    def get_stats(self):
+        with self.stats_lock:
+            stats = dict(self.stats)
+        requests = sum(stats.values())
+        hits = requests - stats.get('miss', 0)
+        stats['requests'] = requests
+        stats['hit_ratio'] = round(hits / requests, 3) if requests else None
+        return stats
+
+    def get_version_key(self, namespace):
+        return '{}:version:{}'.format(self.prefix, namespace)
+
+    def get_version(self, namespace):
+        version = self.versions.get(namespace)
+        if version is None:
+            key = self.get_version_key(namespace)
+            version = self.shared.get(key)
+            if version is None:
+                # Another process may be setting the version at the same
+                # time, add only sets it if it is still missing
+                self.shared.add(key, uuid4().hex, None)
+                version = self.shared.get(key)
+            self.versions.set(namespace, version,
+                              self.options['LOCAL_TIMEOUT'])
+        return version
+
+    def invalidate(self, *namespaces):
+        """
+        Discard every cached entry of the namespaces, all of them when none
+        are given. It happens again once the current transaction commits so
+        an entry rendered from the old data in the meantime is not served
+        afterwards
+        """
+        namespaces = namespaces or self.namespaces
+
+        def set_versions():
+            self.shared.set_many({self.get_version_key(namespace):
+                                  uuid4().hex
+                                  for namespace
+                                  in namespaces},
+                                 None)
+            # Entries of older versions are never read again and are left
+            # to be evicted
+            self.versions.clear()
+        set_versions()
+        transaction.on_commit(set_versions)
+
+    def clear_local(self):
+        """
+        Forget what this process holds in memory, so everything is read from
+        the shared cache again
+        """
+        self.local.clear()
+        self.versions.clear()
+
+    def get_key(self, namespace, *parts):
+        digest = hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+        return '{}:{}:{}:{}'.format(self.prefix,
+                                    namespace,
+                                    self.get_version(namespace),
+                                    digest)
+
+    def get(self, namespace, parts, render):
+        """
+        Returns the cached value for the parts of a key within a namespace,
+        calling render to make it when there is none, along with how it was
+        served: from the local or shared tier, stale while another request
+        renders it, after waiting for another request to render it or
+        rendered as a miss
+        """
+        key = self.get_key(namespace, *parts)
+        entry = self.local.get(key)
+        if entry is not None and entry['expires'] > time.time():
+            self.count('local')
+            return entry['value'], 'local'
+        entry = self.shared.get(key)
+        if entry is not None and entry['expires'] > time.time():
+            self.set_local(key, entry)
+            self.count('shared')
+            return entry['value'], 'shared'
+        lock_key = key + ':lock'
+        if self.shared.add(lock_key, 1, self.options['LOCK_TIMEOUT']):
+            try:
+                value = self.render(key, render)
+            finally:
+                self.shared.delete(lock_key)
+            self.count('miss')
+            return value, 'miss'
+        if entry is not None:
+            self.count('stale')
+            return entry['value'], 'stale'
+        deadline = time.time() + self.options['LOCK_TIMEOUT']
+        while time.time() < deadline:
+            time.sleep(self.options['POLL_INTERVAL'])
+            entry = self.shared.get(key)
+            if entry is not None:
+                self.set_local(key, entry)
+                self.count('wait')
+                return entry['value'], 'wait'
+        # The request holding the lock gave up without storing the value
+        value = self.render(key, render)
+        self.count('miss')
+        return value, 'miss'
+
+    def render(self, key, render):
+        value = render()
+        entry = {'value': value,
+                 'expires': time.time() + self.options['TIMEOUT']}
+        self.shared.set(key, entry,
+                        self.options['TIMEOUT'] +
+                        self.options['STALE_TIMEOUT'])
+        self.set_local(key, entry)
+        return value
+
+    def set_local(self, key, entry):
+        timeout = min(entry['expires'] - time.time(),
+                      self.options['LOCAL_TIMEOUT'])
+        if timeout > 0:
+            self.local.set(key, entry, timeout)
+
+
+# Rendered pages of the video lists, a namespace for each way of listing them.
+# The trending list changes as videos are ranked and is left to expire
+video_list_cache = TieredCache('video_list',
+                               ('likes', 'views', 'trending', 'submission',
+                                'publication'))
+
+
+def invalidate_liked_lists(**kwargs):
+    """
+    Receiver for votes_counted, votes only change the order of the most
+    liked list
+    """
+    video_list_cache.invalidate('likes')
+
+
+def invalidate_viewed_lists(**kwargs):
+    """
+    Receiver for views_counted, views only change the order of the most
+    viewed list
+    """
+    video_list_cache.invalidate('views')
+
+
+def invalidate_video_lists(**kwargs):
+    """
+    Receiver for videos being created, edited or deleted, which changes
+    every list
+    """
+    video_list_cache.invalidate()
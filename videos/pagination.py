@@ -0,0 +1,163 @@
+import base64
+import binascii
+import json
+from datetime import date
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetPage(object):
+    """
+    A page of results found by a KeysetPaginator along with the cursors of
+    the pages either side of it
+    """
+    def __init__(self, object_list, start, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.start = start
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def start_index(self):
+        return self.start
+
+
+class KeysetPaginator(object):
+    """
+    Paginates an ordered queryset by seeking past the ordering values of the
+    last row of the page before instead of using an offset, so a deep page
+    costs the same to fetch as the first. The ordering of the queryset must
+    give every row a unique position, usually by ending with the primary key,
+    and the position is passed between pages as an opaque cursor
+    """
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = [(name.lstrip('-'), name.startswith('-'))
+                         for name
+                         in queryset.query.order_by]
+        if not self.ordering:
+            raise ValueError('Keyset pagination needs an ordered queryset')
+
+    def encode_cursor(self, item, reverse, start):
+        values = []
+        for name, descending in self.ordering:
+            # Pages of values() rows are dictionaries
+            if isinstance(item, dict):
+                value = item[name]
+            else:
+                value = getattr(item, name)
+            if isinstance(value, date):
+                value = value.isoformat()
+            values.append(value)
+        position = json.dumps({'values': values,
+                               'reverse': reverse,
+                               'start': start})
+        return base64.urlsafe_b64encode(position.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        """
+        Returns the ordering values, direction and starting index a cursor
+        points at, raising InvalidCursor for anything this paginator could
+        not have created
+        """
+        try:
+            position = json.loads(
+                    base64.urlsafe_b64decode(cursor.encode()).decode())
+            values = position['values']
+            reverse = bool(position['reverse'])
+            start = max(int(position['start']), 1)
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise InvalidCursor(cursor)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise InvalidCursor(cursor)
+        return [self.to_python(name, value, cursor)
+                for (name, descending), value
+                in zip(self.ordering, values)], reverse, start
+
+    def to_python(self, name, value, cursor):
+        try:
+            field = self.queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Annotations such as the trending hot score are numeric
+            if isinstance(value, (int, float)):
+                return value
+            raise InvalidCursor(cursor)
+        try:
+            value = field.to_python(value)
+        except ValidationError:
+            raise InvalidCursor(cursor)
+        if value is None:
+            raise InvalidCursor(cursor)
+        return value
+
+    def seek(self, queryset, values, reverse):
+        """
+        Filter a queryset down to the rows after the given ordering values,
+        or before them when reverse is True
+        """
+        after = Q()
+        for index in reversed(range(len(self.ordering))):
+            name, descending = self.ordering[index]
+            lookup = 'lt' if descending != reverse else 'gt'
+            condition = Q(**{'{}__{}'.format(name, lookup): values[index]})
+            if index < len(self.ordering) - 1:
+                condition |= Q(**{name: values[index]}) & after
+            after = condition
+        # Bounding the leading column on its own lets the database seek
+        # straight to the position in an index on the ordering
+        name, descending = self.ordering[0]
+        lookup = 'lte' if descending != reverse else 'gte'
+        bound = {'{}__{}'.format(name, lookup): values[0]}
+        return queryset.filter(**bound).filter(after)
+
+    def page(self, cursor=None):
+        if cursor:
+            values, reverse, start = self.decode_cursor(cursor)
+        else:
+            values, reverse, start = None, False, 1
+        queryset = self.queryset
+        if values is not None:
+            queryset = self.seek(queryset, values, reverse)
+        if reverse:
+            queryset = queryset.reverse()
+        # Fetch an extra row to find out whether there is a page beyond
+        items = list(queryset[:self.per_page + 1])
+        more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if reverse:
+            items.reverse()
+            has_next, has_previous = True, more
+            if not more:
+                # Paging back reached the first row
+                start = 1
+        else:
+            has_next, has_previous = more, values is not None
+        next_cursor = previous_cursor = None
+        if items and has_next:
+            next_cursor = self.encode_cursor(items[-1],
+                                             False,
+                                             start + len(items))
+        if items and has_previous:
+            previous_cursor = self.encode_cursor(
+                    items[0], True, max(start - self.per_page, 1))
+        return KeysetPage(items, start, next_cursor, previous_cursor)
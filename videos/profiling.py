@@ -0,0 +1,208 @@
+import bisect
+import cProfile
+import io
+import pstats
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Upper bounds of the buckets of every histogram, the last bucket holds
+# everything larger. Spaced evenly on a log scale so they suit milliseconds
+# and payload sizes alike
+BUCKETS = tuple(base * 10 ** power
+                for power in range(7)
+                for base in (1, 2, 5))
+# Functions listed from each profile captured, by cumulative time
+PROFILE_LINES = 25
+
+
+class Histogram(object):
+    """
+    Distribution of observed values in fixed buckets, so any number of
+    observations take the same memory and percentiles are estimated to
+    within a bucket
+    """
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, fraction):
+        """
+        Upper bound of the bucket holding the given fraction of the values,
+        the largest value seen for the last bucket
+        """
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                if index < len(BUCKETS):
+                    return min(BUCKETS[index], self.max)
+                return self.max
+        return None
+
+    def to_dict(self):
+        def rounded(value):
+            return round(value, 3) if value is not None else None
+        return {'count': self.count,
+                'sum': rounded(self.sum),
+                'mean': rounded(self.sum / self.count if self.count else None),
+                'min': rounded(self.min),
+                'max': rounded(self.max),
+                'p50': rounded(self.percentile(0.5)),
+                'p90': rounded(self.percentile(0.9)),
+                'p99': rounded(self.percentile(0.99)),
+                'buckets': {('<={}'.format(BUCKETS[index])
+                             if index < len(BUCKETS)
+                             else '>{}'.format(BUCKETS[-1])): count
+                            for index, count
+                            in enumerate(self.counts)
+                            if count}}
+
+
+class Metrics(object):
+    """
+    Counters and histograms of the api calls and ingestion stages made by
+    this process, safe to update from the threads making api requests at
+    the same time. Batches of ingestion can be armed to be run under
+    cProfile, keeping the report of each along with the threads making its
+    api requests.
+
+    Everything is kept in the memory of the process and is not shared with
+    other processes, so each web or worker process only reports on itself.
+    Runs of profile_ingestion report on their own process
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = Counter()
+            self.histograms = {}
+            self.profiles = []
+            self.profile_batches = 0
+            # Profiles of the threads working for the batch being profiled,
+            # None when no batch is
+            self.worker_profiles = None
+
+    def increment(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def get_counter(self, name):
+        with self.lock:
+            return self.counters[name]
+
+    def observe(self, name, value):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    def snapshot(self):
+        with self.lock:
+            return {'counters': dict(sorted(self.counters.items())),
+                    'histograms': {name: histogram.to_dict()
+                                   for name, histogram
+                                   in sorted(self.histograms.items())},
+                    'profiles': [{'name': name, 'report': report}
+                                 for name, report, stats
+                                 in self.profiles]}
+
+    @contextmanager
+    def timer(self, name):
+        """
+        Observe how many milliseconds the block takes in the name histogram
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - started) * 1000)
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Time a stage of ingestion, counting the calls made to it
+        """
+        self.increment('stage.{}.calls'.format(name))
+        with self.timer('stage.{}.ms'.format(name)):
+            yield
+
+    def profile_next(self, batches):
+        """
+        Run the next batches of ingestion under cProfile
+        """
+        with self.lock:
+            self.profile_batches += batches
+
+    @contextmanager
+    def profile_batch(self, name):
+        """
+        Run the block under cProfile if batches were armed by profile_next,
+        keeping the functions taking the most cumulative time. cProfile only
+        sees the thread it was enabled on, so the profiles of blocks run by
+        other threads under profile_worker meanwhile are added to it
+        """
+        with self.lock:
+            enabled = self.profile_batches > 0
+            if enabled:
+                self.profile_batches -= 1
+                self.worker_profiles = []
+        if not enabled:
+            yield
+            return
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self.lock:
+                worker_profiles, self.worker_profiles = (self.worker_profiles,
+                                                         None)
+            output = io.StringIO()
+            stats = pstats.Stats(profile, stream=output)
+            if worker_profiles:
+                stats.add(*worker_profiles)
+            stats.sort_stats('cumulative').print_stats(PROFILE_LINES)
+            with self.lock:
+                self.profiles.append((name, output.getvalue(), stats))
+
+    @contextmanager
+    def profile_worker(self):
+        """
+        Run a block of work on another thread under a cProfile of its own
+        while a batch is being profiled, added to the profile of the batch
+        once it finishes
+        """
+        with self.lock:
+            worker_profiles = self.worker_profiles
+        if worker_profiles is None:
+            yield
+            return
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self.lock:
+                worker_profiles.append(profile)
+
+
+# Metrics of the youtube api client and video ingestion of this process only
+metrics = Metrics()
@@ -0,0 +1,138 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from videos.models import Comment, Video, VideoRank, ViewCount
+
+# Scores are measured from this point in time, youtube's launch
+EPOCH = datetime(2005, 4, 23, tzinfo=timezone.utc)
+# Seconds of newer submission worth the same as a tenfold increase in
+# activity
+DECAY_SECONDS = 45000
+# How much a tenfold increase in hourly views and each recent comment count
+# for compared to a single vote
+VIEW_WEIGHT = 2
+COMMENT_WEIGHT = 0.5
+# How much a tenfold increase in the days between publication and submission
+# counts against a video
+PUBLISHED_WEIGHT = 0.5
+# Only comments and view counts this recent count towards activity
+COMMENT_WINDOW = timedelta(days=1)
+VIEW_WINDOW = timedelta(days=7)
+# Videos scored at a time
+BATCH_SIZE = 500
+# How far before the last run changes are looked for, so changes stamped
+# before it by transactions that had not committed yet are not missed
+SAFETY_MARGIN = timedelta(minutes=5)
+
+
+def hot_score(score, views_per_hour, recent_comments, created, published):
+    """
+    Combine the activity on a video with how recently it was submitted so
+    newer videos need less activity to rank as highly as older ones. The
+    decay comes from the submission time rather than the current time, so
+    scores only change as the activity on a video does, including recent
+    comments and view counts falling out of their windows
+    """
+    activity = (score +
+                VIEW_WEIGHT * math.log10(1 + max(0, views_per_hour)) +
+                COMMENT_WEIGHT * recent_comments)
+    order = math.log10(max(abs(activity), 1))
+    sign = (activity > 0) - (activity < 0)
+    days_unsubmitted = max(0, (created - published).days)
+    return (sign * order -
+            PUBLISHED_WEIGHT * math.log10(1 + days_unsubmitted) +
+            (created - EPOCH).total_seconds() / DECAY_SECONDS)
+
+
+def views_per_hour(viewcounts):
+    """
+    Rate views grew at between the two most recent of a videos view counts,
+    given as (count_datetime, views) pairs newest first
+    """
+    if len(viewcounts) < 2:
+        return 0
+    (latest, latest_views), (previous, previous_views) = viewcounts[:2]
+    hours = (latest - previous).total_seconds() / 3600
+    return (latest_views - previous_views) / hours if hours else 0
+
+
+def changed_video_ids(since, now):
+    """
+    Ids of the videos whose score may have changed between the given times,
+    every video when since is None
+    """
+    if since is None:
+        return set(Video.objects.values_list('id', flat=True))
+    # Votes and view counts update the video itself
+    video_ids = set(Video.objects.filter(
+            updated__gte=since).values_list('id', flat=True))
+    video_ids.update(Comment.objects.filter(
+            created__gte=since).values_list('video_id', flat=True))
+    # Comments and view counts that have fallen out of their windows since
+    # the last run no longer count towards the activity of their videos
+    video_ids.update(Comment.objects.filter(
+            created__gte=since - COMMENT_WINDOW,
+            created__lt=now - COMMENT_WINDOW).values_list('video_id',
+                                                          flat=True))
+    video_ids.update(ViewCount.objects.filter(
+            count_datetime__gte=since - VIEW_WINDOW,
+            count_datetime__lt=now - VIEW_WINDOW).values_list('video_id',
+                                                              flat=True))
+    video_ids.update(Video.objects.filter(
+            rank=None).values_list('id', flat=True))
+    return video_ids
+
+
+def rank_videos(full=False):
+    """
+    Recompute the hot scores of every video that changed since the last run,
+    or of every video when full is True. Videos that changed within the
+    safety margin before the last run are ranked again. Returns the number
+    of videos ranked
+    """
+    started = timezone.now()
+    since = None
+    if not full:
+        since = VideoRank.objects.aggregate(Max('computed'))['computed__max']
+        if since is not None:
+            since -= SAFETY_MARGIN
+    video_ids = sorted(changed_video_ids(since, started))
+    for index in range(0, len(video_ids), BATCH_SIZE):
+        rank_batch(video_ids[index:index+BATCH_SIZE], started)
+    return len(video_ids)
+
+
+def rank_batch(video_ids, now):
+    comments = dict(Comment.objects.filter(video_id__in=video_ids,
+                                           created__gte=now - COMMENT_WINDOW)
+                                   .values_list('video_id')
+                                   .annotate(Count('id')))
+    viewcounts = defaultdict(list)
+    for video_id, count_datetime, views in (
+            ViewCount.objects.filter(video_id__in=video_ids,
+                                     count_datetime__gte=now - VIEW_WINDOW)
+                             .order_by('video_id', '-count_datetime')
+                             .values_list('video_id',
+                                          'count_datetime',
+                                          'views')):
+        viewcounts[video_id].append((count_datetime, views))
+    videos = Video.objects.filter(id__in=video_ids).values_list(
+            'id', 'score', 'created', 'published')
+    ranks = [VideoRank(video_id=video_id,
+                       computed=now,
+                       hot_score=hot_score(score,
+                                           views_per_hour(
+                                               viewcounts[video_id]),
+                                           comments.get(video_id, 0),
+                                           created,
+                                           published))
+             for video_id, score, created, published
+             in videos]
+    with transaction.atomic():
+        VideoRank.objects.filter(video_id__in=video_ids).delete()
+        VideoRank.objects.bulk_create(ranks)
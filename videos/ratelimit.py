@@ -0,0 +1,43 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Rate limiter allowing bursts of up to capacity tokens while keeping the
+    average rate at or below rate tokens a second
+    """
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = capacity
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, tokens=1):
+        """
+        Take tokens from the bucket, blocking until enough are available.
+        Returns the number of seconds spent waiting. More tokens than the
+        bucket holds could never be available so raise ValueError
+        """
+        if tokens > self.capacity:
+            raise ValueError('Cannot acquire {} tokens from a bucket holding '
+                             '{}'.format(tokens, self.capacity))
+        waited = 0
+        with self.lock:
+            self.refill()
+            while self.tokens < tokens:
+                delay = (tokens - self.tokens) / self.rate
+                self.sleep(delay)
+                waited += delay
+                self.refill()
+            self.tokens -= tokens
+        return waited
@@ -0,0 +1,271 @@
+import heapq
+import math
+import os
+from collections import defaultdict
+from multiprocessing import Pool
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from videos.models import Recommendation, SimilarVideo, Video, VideoVote
+
+# How much liking and favoriting a video count as interest in it
+VOTE_WEIGHT = 1.0
+FAVORITE_WEIGHT = 2.0
+# Similar videos kept for each video and recommendations for each user
+NEIGHBOURS = 50
+TOP_N = 20
+# Most interactions of a single user counted towards similarities, the cost
+# of comparing videos grows with the square of the interactions of each user
+# and heavy users say the least about any pair of videos
+MAX_USER_ITEMS = 200
+# Videos or users handed to a worker process at a time
+CHUNK_SIZE = 500
+# Users whose recommendations are written at a time
+BATCH_SIZE = 1000
+
+# Interactions shared with the worker processes by init_worker
+_state = {}
+
+
+def init_worker(state):
+    _state.clear()
+    _state.update(state)
+
+
+def map_chunks(function, items, state, processes=None):
+    """
+    Generator yielding the results of calling function on chunks of items,
+    spread over processes worker processes, every core by default. The state
+    the function needs is handed to each worker once rather than with every
+    chunk. A single process runs everything in this one
+    """
+    chunks = [items[index:index + CHUNK_SIZE]
+              for index
+              in range(0, len(items), CHUNK_SIZE)]
+    processes = min(processes or os.cpu_count() or 1, len(chunks) or 1)
+    if processes == 1:
+        init_worker(state)
+        try:
+            for chunk in chunks:
+                yield from function(chunk)
+        finally:
+            _state.clear()
+        return
+    with Pool(processes, init_worker, (state,)) as pool:
+        for results in pool.imap_unordered(function, chunks):
+            yield from results
+
+
+def load_interactions(user_ids=None):
+    """
+    Returns a dictionary of user id to a dictionary of the weight of each
+    video they liked or favorited, only of user_ids when given
+    """
+    votes = VideoVote.objects.filter(value__gt=0)
+    favorites = Video.favorited_by.through.objects.all()
+    if user_ids is not None:
+        votes = votes.filter(voter_id__in=user_ids)
+        favorites = favorites.filter(user_id__in=user_ids)
+    interactions = defaultdict(dict)
+    for rows, weight in ((votes.values_list('voter_id', 'video_id'),
+                          VOTE_WEIGHT),
+                         (favorites.values_list('user_id', 'video_id'),
+                          FAVORITE_WEIGHT)):
+        for user_id, video_id in rows.iterator():
+            videos = interactions[user_id]
+            videos[video_id] = videos.get(video_id, 0) + weight
+    return dict(interactions)
+
+
+def similar_chunk(video_ids):
+    """
+    The NEIGHBOURS videos most similar to each video, as the cosine
+    similarity of the weights of the users who interacted with them
+    """
+    user_items = _state['user_items']
+    item_users = _state['item_users']
+    norms = _state['norms']
+    results = []
+    for video_id in video_ids:
+        shared = defaultdict(float)
+        for user_id, weight in item_users[video_id]:
+            for other_id, other_weight in user_items[user_id]:
+                shared[other_id] += weight * other_weight
+        del shared[video_id]
+        results.append((video_id, heapq.nlargest(
+                NEIGHBOURS,
+                ((value / (norms[video_id] * norms[other_id]), other_id)
+                 for other_id, value
+                 in shared.items()))))
+    return results
+
+
+def build_neighbours(interactions, processes=None):
+    """
+    Returns a dictionary of each video to its most similar videos as (score,
+    video id) pairs, best first. Videos are only compared with the videos
+    sharing a user with them, found through an inverted index of video to
+    users, and each user only counts their MAX_USER_ITEMS heaviest
+    interactions
+    """
+    user_items = {}
+    item_users = defaultdict(list)
+    norms = defaultdict(float)
+    for user_id, videos in interactions.items():
+        items = sorted(videos.items(), key=lambda item: -item[1])
+        user_items[user_id] = items = items[:MAX_USER_ITEMS]
+        for video_id, weight in items:
+            item_users[video_id].append((user_id, weight))
+            norms[video_id] += weight ** 2
+    state = dict(user_items=user_items,
+                 item_users=dict(item_users),
+                 norms={video_id: math.sqrt(norm)
+                        for video_id, norm
+                        in norms.items()})
+    return dict(map_chunks(similar_chunk, list(item_users), state, processes))
+
+
+def recommend_chunk(user_ids):
+    """
+    The top_n videos each user has not interacted with scoring highest by
+    their similarity to the videos the user has, weighted by how strongly
+    """
+    interactions = _state['interactions']
+    neighbours = _state['neighbours']
+    results = []
+    for user_id in user_ids:
+        seen = interactions[user_id]
+        scores = defaultdict(float)
+        for video_id, weight in seen.items():
+            for score, other_id in neighbours.get(video_id, ()):
+                if other_id not in seen:
+                    scores[other_id] += weight * score
+        results.append((user_id, heapq.nlargest(
+                _state['top_n'],
+                ((score, video_id)
+                 for video_id, score
+                 in scores.items()))))
+    return results
+
+
+def build_recommendations(interactions, neighbours, top_n=TOP_N,
+                          processes=None):
+    """
+    Generator yielding each user id with their recommendations as (score,
+    video id) pairs, best first
+    """
+    state = dict(interactions=interactions,
+                 neighbours=neighbours,
+                 top_n=top_n)
+    yield from map_chunks(recommend_chunk, list(interactions), state,
+                          processes)
+
+
+def write_similar_videos(neighbours):
+    """
+    Replace every stored similar video, in a single transaction so
+    incremental refreshes never see them half written
+    """
+    with transaction.atomic():
+        SimilarVideo.objects.all().delete()
+        SimilarVideo.objects.bulk_create((SimilarVideo(video_id=video_id,
+                                                       similar_id=similar_id,
+                                                       score=score)
+                                          for video_id, similar
+                                          in neighbours.items()
+                                          for score, similar_id
+                                          in similar),
+                                         batch_size=500)
+
+
+def write_recommendations(recommendations):
+    """
+    Replace the stored recommendations of the users given, BATCH_SIZE users
+    at a time
+    """
+    batch = {}
+
+    def write_batch():
+        with transaction.atomic():
+            Recommendation.objects.filter(user_id__in=list(batch)).delete()
+            Recommendation.objects.bulk_create(
+                    [Recommendation(user_id=user_id,
+                                    video_id=video_id,
+                                    score=score)
+                     for user_id, recommended
+                     in batch.items()
+                     for score, video_id
+                     in recommended],
+                    batch_size=500)
+        batch.clear()
+    for user_id, recommended in recommendations:
+        batch[user_id] = recommended
+        if len(batch) == BATCH_SIZE:
+            write_batch()
+    if batch:
+        write_batch()
+
+
+def compute_recommendations(top_n=TOP_N, processes=None):
+    """
+    Recompute the similar videos of every video and the recommendations of
+    every user from all of their interactions, returning the number of users
+    recommended to
+    """
+    started = timezone.now()
+    interactions = load_interactions()
+    neighbours = build_neighbours(interactions, processes)
+    write_similar_videos(neighbours)
+    write_recommendations(build_recommendations(interactions,
+                                                neighbours,
+                                                top_n,
+                                                processes))
+    # Every user with interactions left was just written, the rest of the
+    # recommendations are of users who have none
+    Recommendation.objects.filter(created__lt=started).delete()
+    return len(interactions)
+
+
+def get_changed_user_ids(since=None):
+    """
+    Ids of the users who voted since the given time, by default since
+    recommendations were last written
+    """
+    if since is None:
+        since = Recommendation.objects.aggregate(
+                last_run=Max('created'))['last_run']
+    votes = VideoVote.objects.all()
+    if since is not None:
+        votes = votes.filter(updated__gte=since)
+    return list(votes.values_list('voter_id', flat=True).distinct())
+
+
+def refresh_recommendations(user_ids, top_n=TOP_N):
+    """
+    Recompute the recommendations of only the given users from their current
+    interactions and the similar videos stored by the last full run,
+    returning the number of users recommended to
+    """
+    user_ids = list(user_ids)
+    interactions = load_interactions(user_ids)
+    video_ids = {video_id
+                 for videos
+                 in interactions.values()
+                 for video_id
+                 in videos}
+    neighbours = defaultdict(list)
+    for video_id, similar_id, score in SimilarVideo.objects.filter(
+            video_id__in=list(video_ids)).order_by(
+                '-score').values_list('video_id', 'similar_id', 'score'):
+        neighbours[video_id].append((score, similar_id))
+    recommendations = dict(build_recommendations(interactions,
+                                                 dict(neighbours),
+                                                 top_n,
+                                                 processes=1))
+    # Users with no interactions left lose their recommendations
+    write_recommendations((user_id, recommendations.get(user_id, []))
+                          for user_id
+                          in user_ids)
+    return len(interactions)
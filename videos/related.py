@@ -0,0 +1,109 @@
+import heapq
+import math
+from collections import defaultdict
+
+from django.db import transaction
+
+from videos.models import RelatedVideo, Video
+
+# Related videos stored for each video
+TOP_K = 10
+# Added to the score of related videos in the same category
+CATEGORY_WEIGHT = 0.25
+# Tags on more than this fraction of videos say little about how related
+# two videos are and would make almost every video a candidate, so they are
+# left out of finding candidates
+MAX_TAG_FRACTION = 0.1
+# Videos whose related videos are written at a time
+BATCH_SIZE = 500
+
+
+def related_videos(video_tags, video_categories, top_k=TOP_K):
+    """
+    Generator yielding each video id with a list of the top_k (score,
+    related video id) pairs most related to it, best first. Videos are
+    compared by the cosine similarity of their tags weighted by inverse
+    document frequency, so sharing a rare tag counts for more than sharing
+    a common one. Candidates are found through an inverted index of tag to
+    videos so only videos sharing a tag are ever compared.
+
+    video_tags maps video ids to sets of tag ids and video_categories maps
+    the id of every video to its category id
+    """
+    tag_videos = defaultdict(list)
+    for video_id, tags in video_tags.items():
+        for tag_id in tags:
+            tag_videos[tag_id].append(video_id)
+    number_of_videos = len(video_categories)
+    idf = {tag_id: math.log(number_of_videos / len(videos))
+           for tag_id, videos
+           in tag_videos.items()}
+    norms = {video_id: math.sqrt(sum(idf[tag_id] ** 2 for tag_id in tags))
+             for video_id, tags
+             in video_tags.items()}
+    max_videos = max(2, MAX_TAG_FRACTION * number_of_videos)
+    for video_id, tags in video_tags.items():
+        overlap = defaultdict(float)
+        for tag_id in tags:
+            if len(tag_videos[tag_id]) > max_videos:
+                continue
+            weight = idf[tag_id] ** 2
+            for other_id in tag_videos[tag_id]:
+                if other_id != video_id:
+                    overlap[other_id] += weight
+        scores = ((shared / (norms[video_id] * norms[other_id]) +
+                   CATEGORY_WEIGHT * (video_categories[video_id] ==
+                                      video_categories[other_id]),
+                   other_id)
+                  for other_id, shared
+                  in overlap.items()
+                  if shared)
+        yield video_id, heapq.nlargest(top_k, scores)
+
+
+def get_related_videos(video_id, count=TOP_K):
+    """
+    The stored related videos of a video, best first, read from the index on
+    them with the related video of each joined in
+    """
+    return RelatedVideo.objects.filter(video_id=video_id).order_by(
+            '-score', '-id').select_related('related')[:count]
+
+
+def compute_related_videos(top_k=TOP_K):
+    """
+    Recompute the related videos of every video, returning the number of
+    videos with any related videos
+    """
+    video_categories = dict(Video.objects.values_list('id', 'category_id'))
+    video_tags = defaultdict(set)
+    for video_id, tag_id in Video.tags.through.objects.values_list(
+            'video_id', 'tag_id'):
+        video_tags[video_id].add(tag_id)
+    batch = {}
+    related_count = 0
+    for video_id, related in related_videos(video_tags,
+                                            video_categories,
+                                            top_k):
+        batch[video_id] = related
+        related_count += bool(related)
+        if len(batch) == BATCH_SIZE:
+            write_batch(batch)
+            batch = {}
+    write_batch(batch)
+    # Videos that lost all their tags have no related videos left
+    RelatedVideo.objects.exclude(video_id__in=list(video_tags)).delete()
+    return related_count
+
+
+def write_batch(batch):
+    with transaction.atomic():
+        RelatedVideo.objects.filter(video_id__in=list(batch)).delete()
+        RelatedVideo.objects.bulk_create([RelatedVideo(video_id=video_id,
+                                                       related_id=related_id,
+                                                       score=score)
+                                          for video_id, related
+                                          in batch.items()
+                                          for score, related_id
+                                          in related],
+                                         batch_size=500)
@@ -0,0 +1,12 @@
+from django.dispatch import Signal
+
+# Sent with the vote model as the sender whenever votes change the counters
+# of the objects they were cast on
+votes_counted = Signal(providing_args=['object_ids'])
+
+# Sent with ViewCount as the sender whenever the latest views of videos change
+views_counted = Signal(providing_args=['video_ids'])
+
+# Sent with Video as the sender when videos are created in bulk, which sends
+# no post_save
+videos_created = Signal(providing_args=['videos'])
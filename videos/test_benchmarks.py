@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase
+
+from videos.benchmarks import compare
+from videos.management.commands import benchmark_suite, rank_videos
+from videos.models import Video
+
+
+class CompareTestCase(SimpleTestCase):
+    def test_regressions_flagged(self):
+        baseline = {'fast': {'p50': 10, 'queries': 2},
+                    'slow': {'p50': 10, 'queries': 2},
+                    'chatty': {'p50': 10, 'queries': 2},
+                    'removed': {'p50': 10, 'queries': 2}}
+        changes = compare({'fast': {'p50': 11, 'queries': 2},
+                           'slow': {'p50': 13, 'queries': 2},
+                           'chatty': {'p50': 9, 'queries': 3},
+                           'added': {'p50': 10, 'queries': 2}},
+                          baseline)
+        self.assertEqual({name: change['regression']
+                          for name, change
+                          in changes.items()},
+                         {'fast': False, 'slow': True, 'chatty': True})
+        self.assertEqual(changes['slow']['ratio'], 1.3)
+
+
+@mock.patch.dict(benchmark_suite.BASE_SCALE,
+                 users=3, videos=6, comments=2, votes=2)
+class BenchmarkSuiteTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.baseline = os.path.join(self.directory.name, 'baseline.json')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_suite(self, *args):
+        stdout = StringIO()
+        call_command('benchmark_suite', '--scales', '1', '--repeat', '1',
+                     *args, stdout=stdout)
+        return json.loads(stdout.getvalue())
+
+    def test_results(self):
+        with mock.patch.object(rank_videos, 'rank_videos',
+                               wraps=rank_videos.rank_videos) as rank:
+            results = self.run_suite('--output', self.baseline)
+        # Trending is measured with every seeded video ranked
+        rank.assert_called_once_with(full=True)
+        benchmarks = results['scales']['1']['benchmarks']
+        self.assertIn('video_list.trending', benchmarks)
+        # The queries made streaming the page of videos are measured too
+        self.assertEqual(benchmarks['api.video_list']['queries'], 2)
+        self.assertIn('create_videos', benchmarks)
+        self.assertEqual(set(benchmarks['comment_list']),
+                         {'p50', 'p90', 'p99', 'mean', 'queries'})
+        # Seeded data is rolled back
+        self.assertFalse(Video.objects.exists())
+        with open(self.baseline) as f:
+            self.assertEqual(json.load(f)['scales'], results['scales'])
+
+    def test_baseline_compared(self):
+        with open(self.baseline, 'w') as f:
+            json.dump({'scales': {'1': {'benchmarks': {
+                'get_children': {'p50': 1000, 'queries': 100},
+                'api.video_list': {'p50': 1000, 'queries': 0}}}}}, f)
+        results = self.run_suite('--baseline', self.baseline)
+        comparison = results['comparison']['1']
+        self.assertFalse(comparison['get_children']['regression'])
+        self.assertTrue(comparison['api.video_list']['regression'])
+        with self.assertRaises(CommandError):
+            self.run_suite('--baseline', self.baseline,
+                           '--fail-on-regression')
@@ -0,0 +1,225 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from profiles.models import User
+from videos.client import (APIReturnedError, QuotaExceededError,
+                           VideoAPIClient)
+from videos.mixins import VideoAPIMixin
+from videos.models import Category, Video, ViewCount
+from videos.testing import FakeAPIServer, fake_video_info
+from videos.transports import (MissingCassetteError, RecordTransport,
+                               ReplayTransport, SyntheticTransport,
+                               get_transport)
+
+
+class VideoAPIClientTestCase(SimpleTestCase):
+    def setUp(self):
+        self.server = FakeAPIServer().__enter__()
+        self.client = VideoAPIClient(self.server.url, 'key', backoff=0)
+
+    def tearDown(self):
+        self.server.__exit__()
+
+    def test_ids_batched_in_order(self):
+        video_ids = ['video{}'.format(index) for index in range(120)]
+        JSON = self.client.get_by_ids('videos', dict(part='id'), video_ids)
+        self.assertEqual([item['id'] for item in JSON['items']], video_ids)
+        batches = [params['id'].split(',')
+                   for uri, params
+                   in self.server.requests]
+        self.assertEqual(sorted(len(batch) for batch in batches),
+                         [20, 50, 50])
+        self.assertTrue(all(params['key'] == 'key'
+                            for uri, params
+                            in self.server.requests))
+
+    def test_requests_made_concurrently(self):
+        self.server.delay = 0.05
+        self.client.max_workers = 4
+        responses = self.client.get_many(('search',
+                                          {'videoCategoryId': str(index),
+                                           'maxResults': 1})
+                                         for index
+                                         in range(12))
+        self.assertEqual([JSON['items'][0]['id']['videoId']
+                          for JSON
+                          in responses],
+                         ['{}-0'.format(index) for index in range(12)])
+        self.assertGreater(self.server.max_in_flight, 1)
+        self.assertLessEqual(self.server.max_in_flight, 4)
+
+    def test_temporary_failures_retried(self):
+        self.server.fail(503)
+        self.server.fail(403, 'backendError')
+        self.server.fail(403, 'rateLimitExceeded')
+        JSON = self.client.get('videos', dict(id='video'))
+        self.assertEqual(JSON['items'][0]['id'], 'video')
+        self.assertEqual(len(self.server.requests), 4)
+
+    def test_quota_exceeded_not_retried(self):
+        self.server.fail(403, 'quotaExceeded')
+        with self.assertRaises(QuotaExceededError):
+            self.client.get('videos', dict(id='video'))
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_retries_limited(self):
+        self.client.max_retries = 2
+        self.server.fail(500, times=5)
+        with self.assertRaises(APIReturnedError):
+            self.client.get('videos', dict(id='video'))
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_permanent_failures_not_retried(self):
+        self.server.fail(400, 'badRequest')
+        self.server.fail(403, 'forbidden')
+        for attempt in range(2):
+            with self.assertRaises(APIReturnedError):
+                self.client.get('videos', dict(id='video'))
+        self.assertEqual(len(self.server.requests), 2)
+
+
+class VideoAPIMixinTestCase(TestCase):
+    def setUp(self):
+        self.server = FakeAPIServer().__enter__()
+        VideoAPIMixin._api_client = VideoAPIClient(self.server.url,
+                                                   'key',
+                                                   backoff=0)
+        Category.objects.create(pk=1, title='Music')
+        self.user = User.objects.create_user('test_user',
+                                             'test@tastemakers.com',
+                                             'test_password')
+
+    def tearDown(self):
+        VideoAPIMixin._api_client = None
+        self.server.__exit__()
+
+    def test_create_videos_in_batches(self):
+        video_ids = ['video{}'.format(index) for index in range(75)]
+        Video.objects.create_videos(self.user.id, *video_ids)
+        self.assertEqual(Video.objects.count(), 75)
+        self.assertEqual(ViewCount.objects.count(), 75)
+        # Snippets and statistics come from the same two requests
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertTrue(all(len(params['id'].split(',')) <= 50 and
+                            params['part'] == 'snippet,statistics'
+                            for uri, params
+                            in self.server.requests))
+
+    def test_missing_videos_do_not_shift_data(self):
+        video_ids = ['video{}'.format(index) for index in range(10)]
+        self.server.missing.update(video_ids[2:4])
+        Video.objects.create_videos(self.user.id, *video_ids)
+        self.assertEqual(Video.objects.count(), 8)
+        for video in Video.objects.all():
+            info = fake_video_info(video.video_id)
+            self.assertEqual(video.title, info['snippet']['title'])
+            self.assertEqual(video.viewcount_set.get().views,
+                             int(info['statistics']['viewCount']))
+
+    def test_create_viewcounts_matches_by_id(self):
+        video_ids = ['video{}'.format(index) for index in range(5)]
+        Video.objects.create_videos(self.user.id, *video_ids)
+        ViewCount.objects.all().delete()
+        self.server.missing.add('video0')
+        ViewCount.objects.create_viewcounts(*Video.objects.order_by('id'))
+        self.assertEqual(sorted(ViewCount.objects.values_list(
+                             'video__video_id', 'views')),
+                         [(video_id, int(fake_video_info(
+                             video_id)['statistics']['viewCount']))
+                          for video_id
+                          in video_ids[1:]])
+
+
+class TransportTestCase(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.synthetic = SyntheticTransport()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def get_client(self, transport, key='key'):
+        return VideoAPIClient('https://api.test/youtube/v3/', key,
+                              backoff=0, transport=transport)
+
+    def test_record_and_replay(self):
+        recorder = self.get_client(RecordTransport(self.directory.name,
+                                                   self.synthetic))
+        recorded = recorder.get_by_ids('videos', dict(part='snippet'),
+                                       ['video{}'.format(index)
+                                        for index
+                                        in range(60)])
+        # Replaying needs no key and gives back the recorded responses
+        player = self.get_client(ReplayTransport(self.directory.name), '')
+        self.assertEqual(player.get_by_ids('videos', dict(part='snippet'),
+                                           ['video{}'.format(index)
+                                            for index
+                                            in range(60)]),
+                         recorded)
+        with self.assertRaises(MissingCassetteError):
+            player.get('videos', dict(part='snippet', id='other'))
+        for root, directories, files in os.walk(self.directory.name):
+            for name in files:
+                with open(os.path.join(root, name)) as f:
+                    self.assertNotIn('key', f.read().split('"body"')[1])
+
+    def test_failures_replayed(self):
+        with FakeAPIServer() as server:
+            server.fail(400, 'badRequest')
+            recorder = VideoAPIClient(server.url, 'key',
+                                      transport=RecordTransport(
+                                          self.directory.name))
+            with self.assertRaises(APIReturnedError):
+                recorder.get('videos', dict(id='video'))
+        player = VideoAPIClient(server.url, '',
+                                transport=ReplayTransport(
+                                    self.directory.name))
+        with self.assertRaises(APIReturnedError):
+            player.get('videos', dict(id='video'))
+
+    def test_synthetic_responses(self):
+        client = self.get_client(self.synthetic)
+        self.assertEqual(client.get('videos', dict(id='a,b'))['items'],
+                         [fake_video_info('a'), fake_video_info('b')])
+        other = self.get_client(SyntheticTransport(seed=1))
+        self.assertNotEqual(other.get('videos', dict(id='a'))['items'],
+                            [fake_video_info('a')])
+        first = client.get('search', dict(maxResults=3))
+        second = client.get('search', dict(maxResults=3,
+                                           pageToken=first['nextPageToken']))
+        self.assertEqual([item['id']['videoId']
+                          for item
+                          in first['items'] + second['items']],
+                         ['search-{}'.format(index) for index in range(6)])
+        with self.assertRaises(APIReturnedError):
+            client.get('unknown', {})
+
+    def test_transport_from_settings(self):
+        with self.settings(VIDEO_API={'TRANSPORT': 'synthetic',
+                                      'SEED': 2}):
+            self.assertEqual(get_transport().seed, 2)
+        with self.settings(VIDEO_API={'TRANSPORT': 'unknown'}):
+            with self.assertRaises(ValueError):
+                get_transport()
+
+
+class APIKeyTestCase(SimpleTestCase):
+    def tearDown(self):
+        VideoAPIMixin.API_KEY = None
+        VideoAPIMixin._api_client = None
+
+    def test_key_loaded_lazily(self):
+        self.assertIsNone(VideoAPIMixin.API_KEY)
+        with mock.patch.dict(os.environ, {'YOUTUBE_API_KEY': 'env key'}):
+            self.assertEqual(VideoAPIMixin.get_api_key(), 'env key')
+
+    def test_key_not_needed_offline(self):
+        with self.settings(VIDEO_API={'TRANSPORT': 'synthetic'}):
+            with mock.patch.object(VideoAPIMixin, 'API_key_file',
+                                   'missing.txt'):
+                client = VideoAPIMixin.get_api_client()
+        self.assertEqual(client.api_key, '')
+        self.assertIsNone(VideoAPIMixin.API_KEY)
@@ -0,0 +1,147 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase
+
+from profiles.models import User
+from videos.client import APIReturnedError, VideoAPIClient
+from videos.collector import ViewCountCollector
+from videos.mixins import VideoAPIMixin
+from videos.models import Video, ViewCount
+from videos.ratelimit import TokenBucket
+from videos.testing import FakeAPIServer, create_videos, fake_video_info
+
+
+class FakeClock:
+    """
+    Clock that only moves forward when slept on
+    """
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TokenBucketTestCase(SimpleTestCase):
+    def test_bursts_then_limits_rate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(2, 5, clock=clock, sleep=clock.sleep)
+        for token in range(5):
+            self.assertEqual(bucket.acquire(), 0)
+        self.assertEqual(clock.now, 0)
+        bucket.acquire(4)
+        self.assertEqual(clock.now, 2)
+        clock.now += 10
+        # Tokens never build up past the capacity of the bucket
+        bucket.acquire(5)
+        self.assertEqual(clock.now, 12)
+        bucket.acquire()
+        self.assertEqual(clock.now, 12.5)
+
+    def test_more_than_capacity(self):
+        clock = FakeClock()
+        bucket = TokenBucket(2, 5, clock=clock, sleep=clock.sleep)
+        with self.assertRaises(ValueError):
+            bucket.acquire(6)
+        # Nothing was taken from the bucket
+        self.assertEqual(bucket.acquire(5), 0)
+
+
+class ViewCountCollectorTestCase(TestCase):
+    def setUp(self):
+        self.server = FakeAPIServer().__enter__()
+        VideoAPIMixin._api_client = VideoAPIClient(self.server.url,
+                                                   'key',
+                                                   max_retries=0)
+        user = User.objects.create_user('test_user',
+                                        'test@tastemakers.com',
+                                        'test_password')
+        create_videos(130, user, bulk=True)
+        directory = tempfile.mkdtemp()
+        self.checkpoint = os.path.join(directory, 'checkpoint.json')
+        self.addCleanup(os.rmdir, directory)
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        VideoAPIMixin._api_client = None
+        self.server.__exit__()
+
+    def make_collector(self):
+        return ViewCountCollector(self.checkpoint,
+                                  limiter=TokenBucket(1, 1,
+                                                      clock=self.clock,
+                                                      sleep=self.clock.sleep),
+                                  clock=self.clock)
+
+    def assertEveryVideoCountedOnce(self):
+        self.assertEqual(sorted(ViewCount.objects.values_list(
+                             'video__video_id', 'views')),
+                         sorted((video_id, int(fake_video_info(
+                             video_id)['statistics']['viewCount']))
+                                for video_id
+                                in Video.objects.values_list('video_id',
+                                                             flat=True)))
+
+    def test_collects_every_video_in_batches(self):
+        collector = self.make_collector()
+        collector.collect()
+        self.assertEveryVideoCountedOnce()
+        self.assertEqual([len(params['id'].split(','))
+                          for uri, params
+                          in self.server.requests],
+                         [50, 50, 30])
+        self.assertFalse(os.path.exists(self.checkpoint))
+        # Requests after the first had to wait for the rate limiter
+        self.assertEqual(collector.metrics['quota_used'], 3)
+        self.assertEqual(collector.metrics['seconds_elapsed'], 2)
+        self.assertEqual(collector.metrics['videos_per_second'], 65)
+
+    def test_resumes_after_crash(self):
+        # None of the videos in the first batch are found and the request for
+        # the second fails, stopping the pass part way through
+        self.server.failures.append((200, {'items': []}))
+        self.server.fail(500)
+        with self.assertRaises(APIReturnedError):
+            self.make_collector().collect()
+        self.assertTrue(os.path.exists(self.checkpoint))
+        self.assertEqual(ViewCount.objects.count(), 0)
+        self.make_collector().collect()
+        self.assertEqual(ViewCount.objects.count(), 80)
+        first_batch = list(Video.objects.order_by('id')[:50])
+        ViewCount.objects.create_viewcounts(*first_batch)
+        self.assertEveryVideoCountedOnce()
+
+    def test_command_reports_metrics(self):
+        stdout = StringIO()
+        call_command('collect_viewcounts',
+                     checkpoint=self.checkpoint,
+                     burst=3,
+                     stdout=stdout)
+        self.assertEqual(ViewCount.objects.count(), 130)
+        self.assertIn('"quota_used": 3', stdout.getvalue())
+
+    def test_command_rejects_batches_larger_than_burst(self):
+        with self.assertRaises(CommandError):
+            call_command('collect_viewcounts',
+                         checkpoint=self.checkpoint,
+                         burst=2,
+                         batch_size=101,
+                         stdout=StringIO())
+        self.assertEqual(ViewCount.objects.count(), 0)
+
+    def test_retries_count_towards_quota(self):
+        VideoAPIMixin._api_client.max_retries = 1
+        VideoAPIMixin._api_client.backoff = 0
+        self.server.fail(500)
+        collector = self.make_collector()
+        collector.collect()
+        self.assertEqual(len(self.server.requests), 4)
+        self.assertEqual(collector.metrics['quota_used'], 4)
+        # The retry was paid for by waiting for the rate limiter
+        self.assertEqual(collector.metrics['seconds_rate_limited'], 3)
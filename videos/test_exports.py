@@ -0,0 +1,111 @@
+import csv
+import io
+import json
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+import dateutil.parser
+
+from profiles.models import User
+from videos.exports import EXPORTS, SAFETY_MARGIN, export_rows
+from videos.models import Comment, Video, VideoVote, ViewCount
+from videos.testing import create_users, create_videos
+
+
+class ExportTestCase(TestCase):
+    def setUp(self):
+        self.users = create_users(3)
+        self.videos = create_videos(5, self.users[0],
+                                    title='Video, "{}"'.format)
+        for video in self.videos:
+            VideoVote.objects.create_votes(self.users[1].id, video.id)
+            ViewCount.objects.create(video=video, views=video.id * 10)
+            Comment.objects.create(text='Comment\nwith lines',
+                                   commenter=self.users[2],
+                                   video=video)
+        self.staff = User.objects.create(username='staff', is_staff=True)
+        self.client.force_login(self.staff)
+
+    def get_content(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_rows_read_in_chunks(self):
+        with self.assertNumQueries(4):
+            rows = list(export_rows(EXPORTS['videos'], chunk_size=2))
+        self.assertEqual([row[0] for row in rows],
+                         [video.id for video in self.videos])
+
+    def test_since(self):
+        past = timezone.now() - timedelta(days=1)
+        Video.objects.filter(id=self.videos[0].id).update(updated=past)
+        ViewCount.objects.filter(video=self.videos[0]).update(
+                count_datetime=past)
+        Comment.objects.filter(video=self.videos[0]).update(created=past)
+        VideoVote.objects.filter(video=self.videos[0]).update(updated=past)
+        since = past + timedelta(hours=1)
+        for export in EXPORTS.values():
+            exported = [row[0] for row in export_rows(export, since)]
+            self.assertEqual(len(exported), 4)
+            self.assertEqual(len(list(export_rows(export, past))), 5)
+
+    def test_ndjson(self):
+        response = self.client.get('/api/v1/videos/export/votes.ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = self.get_content(response).splitlines()
+        self.assertEqual([json.loads(line)['video_id'] for line in lines],
+                         [video.id for video in self.videos])
+
+    def test_watermark(self):
+        past = timezone.now() - timedelta(days=1)
+        VideoVote.objects.update(updated=past)
+        response = self.client.get('/api/v1/videos/export/votes.ndjson')
+        watermark = response['X-Export-Watermark']
+        self.assertEqual(dateutil.parser.parse(watermark),
+                         past - SAFETY_MARGIN)
+        # A vote committed after the export but stamped before the newest
+        # vote it read is still exported next time
+        VideoVote.objects.create_votes(self.users[2].id, self.videos[0].id)
+        VideoVote.objects.filter(voter=self.users[2]).update(
+                updated=past - timedelta(seconds=1))
+        response = self.client.get('/api/v1/videos/export/votes.ndjson',
+                                   {'since': watermark})
+        self.assertIn(self.users[2].id,
+                      [json.loads(line)['voter_id']
+                       for line
+                       in self.get_content(response).splitlines()])
+        self.assertEqual(response['X-Export-Watermark'], watermark)
+        # Nothing changed since leaves the watermark where it was
+        since = timezone.now().isoformat()
+        response = self.client.get('/api/v1/videos/export/votes.ndjson',
+                                   {'since': since})
+        self.assertEqual(self.get_content(response), '')
+        self.assertEqual(dateutil.parser.parse(
+                             response['X-Export-Watermark']),
+                         dateutil.parser.parse(since))
+
+    def test_csv(self):
+        response = self.client.get('/api/v1/videos/export/comments.csv')
+        rows = list(csv.reader(io.StringIO(self.get_content(response))))
+        self.assertEqual(tuple(rows[0]), EXPORTS['comments'].fields)
+        self.assertEqual([row[4] for row in rows[1:]],
+                         ['Comment\nwith lines'] * 5)
+        response = self.client.get('/api/v1/videos/export/videos.csv')
+        rows = list(csv.reader(io.StringIO(self.get_content(response))))
+        self.assertEqual(rows[1][2], 'Video, "0"')
+
+    def test_staff_only(self):
+        self.client.logout()
+        response = self.client.get('/api/v1/videos/export/votes.ndjson')
+        self.assertEqual(response.status_code, 403)
+        self.client.force_login(self.users[1])
+        response = self.client.get('/api/v1/videos/export/votes.ndjson')
+        self.assertEqual(response.status_code, 403)
+
+    def test_invalid_requests(self):
+        response = self.client.get('/api/v1/videos/export/users.csv')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get('/api/v1/videos/export/videos.csv',
+                                   {'since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
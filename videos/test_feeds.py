@@ -0,0 +1,103 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from videos.models import Category, FeedItem, Tag, Video
+from videos.testing import create_users, create_videos
+
+
+class FeedTestCase(TestCase):
+    def setUp(self):
+        self.categories = [Category.objects.create(title='Music'),
+                           Category.objects.create(title='Comedy')]
+        self.reader, self.uploader, self.other = create_users(3)
+        self.videos = create_videos(
+                4,
+                lambda index: self.uploader if index < 2 else self.other,
+                lambda index: self.categories[index % 2])
+        Tag.objects.tag_videos({self.videos[3].id: ['cats']})
+        self.tag = Tag.objects.get(title='cats')
+
+    def get_feed(self, user=None):
+        return [item.video
+                for item
+                in FeedItem.objects.get_feed((user or self.reader).id)]
+
+    def test_fan_out(self):
+        self.reader.following.add(self.uploader)
+        self.reader.followed_categories.add(self.categories[0])
+        self.tag.followed_by.add(self.other)
+        FeedItem.objects.all().delete()
+        with self.assertNumQueries(5):
+            FeedItem.objects.fan_out(self.videos)
+        # Video 0 matches both the uploader and the category followed so it
+        # ranks above newer videos matching only one
+        self.assertEqual(self.get_feed(),
+                         [self.videos[0], self.videos[2], self.videos[1]])
+        self.assertEqual(self.get_feed(self.other), [self.videos[3]])
+        # Fanning out again does not duplicate anything
+        FeedItem.objects.fan_out(self.videos)
+        self.assertEqual(FeedItem.objects.count(), 4)
+
+    def test_feed_is_one_query(self):
+        self.reader.following.add(self.uploader)
+        with self.assertNumQueries(1):
+            self.get_feed()
+
+    def test_follows_rebuild_feed(self):
+        self.reader.following.add(self.uploader)
+        self.assertEqual(set(self.get_feed()), set(self.videos[:2]))
+        self.tag.followed_by.add(self.reader)
+        self.assertEqual(set(self.get_feed()),
+                         set(self.videos[:2] + [self.videos[3]]))
+        self.uploader.followers.remove(self.reader)
+        self.assertEqual(self.get_feed(), [self.videos[3]])
+        self.categories[0].followed_by.add(self.reader)
+        self.assertEqual(set(self.get_feed()),
+                         {self.videos[0], self.videos[2], self.videos[3]})
+
+    def test_cleared_follows_rebuild_feed(self):
+        self.reader.following.add(self.uploader)
+        self.reader.followed_categories.add(self.categories[0])
+        self.tag.followed_by.add(self.reader, self.other)
+        self.reader.following.clear()
+        self.assertEqual(set(self.get_feed()),
+                         {self.videos[0], self.videos[2], self.videos[3]})
+        self.tag.followed_by.clear()
+        self.assertEqual(set(self.get_feed()),
+                         {self.videos[0], self.videos[2]})
+        self.assertEqual(self.get_feed(self.other), [])
+        self.reader.followed_categories.clear()
+        self.other.followers.add(self.reader)
+        self.assertEqual(set(self.get_feed()),
+                         {self.videos[2], self.videos[3]})
+        self.other.followers.clear()
+        self.assertEqual(self.get_feed(), [])
+
+    def test_rebuild_feeds_command(self):
+        self.reader.following.add(self.uploader)
+        Video.objects.filter(id=self.videos[0].id).update(
+                created=timezone.now() - timedelta(days=60))
+        FeedItem.objects.all().delete()
+        call_command('rebuild_feeds', stdout=StringIO())
+        self.assertEqual(self.get_feed(), [self.videos[1]])
+
+    def test_feed_pages(self):
+        self.reader.following.add(self.uploader)
+        response = self.client.get('/videos/feed/')
+        self.assertEqual(response.status_code, 302)
+        response = self.client.get('/api/v1/videos/videos/feed/')
+        self.assertEqual(response.status_code, 403)
+        self.client.force_login(self.reader)
+        response = self.client.get('/videos/feed/')
+        self.assertEqual([video for index, video
+                          in response.context['object_list']],
+                         self.get_feed())
+        response = self.client.get('/api/v1/videos/videos/feed/')
+        self.assertEqual([video['video_id']
+                          for video
+                          in response.data['results']],
+                         [video.video_id for video in self.get_feed()])
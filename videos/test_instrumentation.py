@@ -0,0 +1,101 @@
+import json
+
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+
+from profiles.models import User
+from videos.instrumentation import normalize_sql, timed
+from videos.models import Comment
+from videos.page_cache import video_list_cache
+from videos.testing import create_videos
+
+
+class NormalizeSQLTestCase(TestCase):
+    def test_values_replaced(self):
+        self.assertEqual(normalize_sql('SELECT "a" FROM "t1" WHERE "b" = %s '
+                                       'AND "c" IN (%s, %s, %s)'),
+                         'SELECT "a" FROM "t1" WHERE "b" = ? AND "c" IN (...)')
+        self.assertEqual(normalize_sql("SELECT 1 WHERE  x = 'it''s'"),
+                         'SELECT ? WHERE x = ?')
+        self.assertEqual(normalize_sql('INSERT INTO "t" VALUES (%s, %s), '
+                                       '(%s, %s)'),
+                         'INSERT INTO "t" VALUES (...)')
+
+    def test_timed_outside_requests(self):
+        with timed('serializer'):
+            pass
+
+
+@override_settings(REQUEST_INSTRUMENTATION={'SAMPLE_RATE': 0,
+                                            'SERVER_TIMING': True})
+class InstrumentationMiddlewareTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        video_list_cache.clear_local()
+        user = User.objects.create(username='uploader')
+        self.video = create_videos(1, user)[0]
+        Comment.objects.bulk_create([Comment(text='Comment {}'.format(index),
+                                             commenter=user,
+                                             video=self.video)
+                                     for index
+                                     in range(3)])
+        self.url = reverse('videos_video_comments', args=[self.video.id])
+
+    def get_timings(self, response):
+        return dict(metric.split(';')[:2]
+                    for metric
+                    in response['Server-Timing'].split(', '))
+
+    def test_server_timing(self):
+        timings = self.get_timings(self.client.get(self.url))
+        self.assertEqual(set(timings), {'db', 'render', 'total'})
+        timings = self.get_timings(self.client.get(reverse('video-trending'),
+                                                   {'format': 'json'}))
+        self.assertIn('serializer', timings)
+
+    def test_sampled_requests_logged(self):
+        with self.settings(REQUEST_INSTRUMENTATION={'SAMPLE_RATE': 1}):
+            with self.assertLogs('videos.instrumentation', 'INFO') as logs:
+                response = self.client.get(self.url)
+        self.assertFalse(response.has_header('Server-Timing'))
+        report = json.loads(logs.records[0].getMessage())
+        self.assertEqual(logs.records[0].levelname, 'INFO')
+        self.assertEqual((report['path'], report['status']), (self.url, 200))
+        self.assertGreater(report['queries'], 0)
+        self.assertEqual(sum(statement['count']
+                             for statement
+                             in report['slowest']),
+                         report['queries'])
+
+    def test_streamed_requests_logged_once_sent(self):
+        with self.settings(REQUEST_INSTRUMENTATION={'SAMPLE_RATE': 1,
+                                                    'SERVER_TIMING': True}):
+            with self.assertLogs('videos.instrumentation', 'INFO') as logs:
+                response = self.client.get(reverse('video-list'),
+                                           {'format': 'json'})
+                self.assertTrue(response.streaming)
+                self.assertEqual(logs.records, [])
+                content = json.loads(
+                        b''.join(response.streaming_content).decode())
+        self.assertEqual(len(content['results']), 1)
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertEqual(len(logs.records), 1)
+        report = json.loads(logs.records[0].getMessage())
+        # Queries made as the videos are streamed are counted
+        self.assertEqual(report['queries'], 2)
+
+    def test_slow_requests_logged(self):
+        with self.settings(REQUEST_INSTRUMENTATION={'SAMPLE_RATE': 0,
+                                                    'MAX_QUERIES': 0}):
+            with self.assertLogs('videos.instrumentation') as logs:
+                self.client.get(self.url)
+        report = json.loads(logs.records[0].getMessage())
+        self.assertEqual(logs.records[0].levelname, 'WARNING')
+        self.assertEqual(report['slow'], ['queries'])
+
+    def test_disabled(self):
+        with self.settings(REQUEST_INSTRUMENTATION={'ENABLED': False,
+                                                    'SERVER_TIMING': True}):
+            response = self.client.get(self.url)
+        self.assertFalse(response.has_header('Server-Timing'))
@@ -0,0 +1,86 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from videos.leaderboard import get_changed_windows
+from videos.models import Video, VideoVote
+from videos.testing import create_users, create_videos
+
+LIKED_URL = '/api/v1/videos/videos/liked/'
+
+
+class LeaderboardTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = create_users(4)
+        self.videos = create_videos(4, self.users[0])
+        for index, video in enumerate(self.videos):
+            VideoVote.objects.bulk_create([VideoVote(value=1,
+                                                     video=video,
+                                                     voter=user)
+                                           for user
+                                           in self.users[:index]])
+        # The most liked video was submitted over a week ago
+        Video.objects.filter(id=self.videos[-1].id).update(
+                created=timezone.now() - timedelta(days=8))
+
+    def get_video_ids(self, response):
+        return [video['video_id'] for video in response.json()]
+
+    def test_most_liked_videos(self):
+        response = self.client.get(LIKED_URL)
+        self.assertEqual(self.get_video_ids(response),
+                         [video.video_id for video in self.videos[::-1]])
+        response = self.client.get(LIKED_URL, {'count': 2})
+        self.assertEqual(self.get_video_ids(response),
+                         ['video3', 'video2'])
+        response = self.client.get(LIKED_URL, {'window': 'week'})
+        self.assertEqual(self.get_video_ids(response),
+                         ['video2', 'video1', 'video0'])
+        for parameters in ({'window': 'month'}, {'count': 0},
+                           {'count': 'all'}):
+            response = self.client.get(LIKED_URL, parameters)
+            self.assertEqual(response.status_code, 400)
+
+    def test_served_from_cache(self):
+        response = self.client.get(LIKED_URL)
+        with self.assertNumQueries(0):
+            cached_response = self.client.get(LIKED_URL)
+        self.assertEqual(cached_response.content, response.content)
+
+    def test_conditional_requests(self):
+        response = self.client.get(LIKED_URL)
+        for headers in ({'HTTP_IF_NONE_MATCH': response['ETag']},
+                        {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']}):
+            self.assertEqual(self.client.get(LIKED_URL, **headers).status_code,
+                             304)
+
+    def test_votes_invalidate(self):
+        etag = self.client.get(LIKED_URL)['ETag']
+        VideoVote.objects.create_votes(self.users[2].id, self.videos[0].id)
+        VideoVote.objects.create_votes(self.users[3].id, self.videos[0].id)
+        VideoVote.objects.filter(video=self.videos[3]).delete()
+        response = self.client.get(LIKED_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        # Tied videos are listed newest first
+        self.assertEqual(self.get_video_ids(response),
+                         ['video2', 'video0', 'video1', 'video3'])
+
+    def test_votes_invalidate_windows_of_video(self):
+        etags = {window: self.client.get(LIKED_URL, {'window': window})['ETag']
+                 for window
+                 in ('day', 'week', 'all')}
+        # Only the all time leaderboard lists the video submitted over a
+        # week ago
+        VideoVote.objects.filter(video=self.videos[3]).delete()
+        for window, status_code in (('day', 304), ('week', 304),
+                                    ('all', 200)):
+            response = self.client.get(LIKED_URL, {'window': window},
+                                       HTTP_IF_NONE_MATCH=etags[window])
+            self.assertEqual(response.status_code, status_code, window)
+        self.assertEqual(get_changed_windows([]), [])
+        self.assertEqual(get_changed_windows([self.videos[0].id]),
+                         ['day', 'week', 'all'])
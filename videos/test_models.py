@@ -1,14 +1,32 @@
-from django.db import transaction
+import random
+from datetime import timedelta
+from io import StringIO
+
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.db.models import Count
 from django.db.utils import IntegrityError
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
 from profiles.models import User
-from videos.models import Category, Comment, CommentVote, Tag, Video, VideoVote
-from videos.mixins import VideoAPIMixin
+from videos.models import (Category, Comment, CommentVote, Tag, Video,
+                           VideoVote, ViewCount)
+from videos.mixins import VideoAPIClient, VideoAPIMixin
+from videos.testing import create_users, create_videos
+from videos.transports import SyntheticTransport
 
 
 class VideosTestCase(TestCase, VideoAPIMixin):
     def setUp(self):
+        # Made up responses keep the tests off the network
+        VideoAPIMixin._api_client = VideoAPIClient(
+                self.API_URL, '', transport=SyntheticTransport())
+        Category.objects.create(pk=1, title='Music')
         parameters = dict(part='id',
                           fields='items/id/videoId',
                           maxResults=10,
@@ -39,6 +57,9 @@ class VideosTestCase(TestCase, VideoAPIMixin):
                     in Comment.objects.all()]
         Comment.objects.bulk_create(children)
 
+    def tearDown(self):
+        VideoAPIMixin._api_client = None
+
     def test_video_objects_created(self):
         # Make sure video objects are created
         self.assertTrue(Video.objects.all().count() > 0)
@@ -87,15 +108,14 @@ class VideosTestCase(TestCase, VideoAPIMixin):
         vote = CommentVote.objects.create(value=1, comment=comment, voter=user)
         self.assertEqual(CommentVote.objects.count(), 1)
         # Test that points are calculated properly
+        comment.refresh_from_db()
         self.assertEqual(comment.score, 1)
         # Test that negative votes create negative scores
         vote.value = -1
         vote.save()
-        # Test that the score attribute is cached
-        self.assertEqual(comment.score, 1)
-        # Test that cache invalidation works correctly
-        del comment.score
+        comment.refresh_from_db()
         self.assertEqual(comment.score, -1)
+        self.assertEqual((comment.upvotes, comment.downvotes), (0, 1))
         # Test that a user can only vote for a comment once
         try:
             # Should fail
@@ -139,3 +159,366 @@ class VideosTestCase(TestCase, VideoAPIMixin):
         if not_voted_on:
             VideoVote.objects.create_votes(user.id, *not_voted_on)
         self.assertEqual(user.videovote_set.count(), len(video_ids))
+
+
+def populate_comment_thread(video_id, user_ids, generations, seed=0):
+    """
+    Helper function to recreate the shape of the comment data generated by
+    scripts/populate_table_data.py for a single video. Every user comments on
+    the video and then replies are made to randomly chosen comments
+    """
+    rng = random.Random(seed)
+    Comment.objects.bulk_create([Comment(text='Parent text',
+                                         commenter_id=user_id,
+                                         video_id=video_id)
+                                 for user_id
+                                 in user_ids])
+    for generation in range(generations):
+        comment_ids = list(Comment.objects.filter(
+                video_id=video_id).values_list('id', flat=True))
+        replies = [Comment(text='Child text',
+                           commenter_id=rng.choice(user_ids),
+                           parent_id=rng.choice(comment_ids),
+                           video_id=video_id)
+                   for index
+                   in range(len(user_ids))]
+        Comment.objects.bulk_create(replies)
+    comment_ids = Comment.objects.filter(
+            video_id=video_id, commentvote=None).values_list('id', flat=True)
+    votes = [CommentVote(value=rng.choice((1, -1)),
+                         comment_id=comment_id,
+                         voter_id=user_id)
+             for comment_id in comment_ids
+             for user_id in rng.sample(user_ids, rng.randint(0, 3))]
+    CommentVote.objects.bulk_create(votes)
+
+
+def flatten_comment_tree(tree):
+    """
+    Helper function to walk a nested comment tree returning (comment, level)
+    pairs and asserting each level is ordered by vote score
+    """
+    pairs = []
+    stack = [(tree, 0)]
+    while stack:
+        level, depth = stack.pop()
+        scores = []
+        for node in level:
+            if isinstance(node, list):
+                comment, children = node
+                stack.append((children, depth + 1))
+            else:
+                comment = node
+            pairs.append((comment, depth))
+            scores.append(comment.score)
+        assert scores == sorted(scores, reverse=True), scores
+    return pairs
+
+
+class CommentTreeTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('test_user',
+                                             'test@tastemakers.com',
+                                             'test_password')
+        create_users(19)
+        self.user_ids = list(User.objects.values_list('id', flat=True))
+        self.video = create_videos(1, self.user)[0]
+        populate_comment_thread(self.video.id, self.user_ids, generations=25)
+
+    def test_thread_contains_every_comment_once(self):
+        pairs = flatten_comment_tree(
+                Comment.objects.get_thread(self.video.id))
+        comment_ids = [comment.id for comment, depth in pairs]
+        self.assertEqual(len(comment_ids), len(set(comment_ids)))
+        self.assertEqual(set(comment_ids),
+                         set(Comment.objects.filter(
+                             video=self.video).values_list('id', flat=True)))
+
+    def test_thread_nests_replies_beneath_parents(self):
+        stack = [(None, Comment.objects.get_thread(self.video.id))]
+        while stack:
+            parent, level = stack.pop()
+            for node in level:
+                comment = node[0] if isinstance(node, list) else node
+                self.assertEqual(comment.parent_id, parent)
+                if isinstance(node, list):
+                    stack.append((comment.id, node[1]))
+                else:
+                    self.assertFalse(comment.children.exists())
+
+    def test_thread_depth_cut_off(self):
+        pairs = flatten_comment_tree(
+                Comment.objects.get_thread(self.video.id, depth=1))
+        self.assertEqual(max(depth for comment, depth in pairs), 1)
+        self.assertEqual(Comment.objects.get_thread(self.video.id, depth=0),
+                         list(Comment.objects.order_by_votes().filter(
+                             video=self.video, parent=None)))
+
+    def test_get_children_matches_thread(self):
+        parent = Comment.objects.annotate(
+                reply_count=Count('children')).order_by('-reply_count')[0]
+        thread = flatten_comment_tree(
+                Comment.objects.get_thread(self.video.id))
+        depths = dict((comment.id, depth) for comment, depth in thread)
+        children = flatten_comment_tree(parent.children.get_children())
+        self.assertTrue(children)
+        for comment, depth in children:
+            self.assertEqual(depths[comment.id], depth + depths[parent.id] + 1)
+
+    def test_only_subtree_loaded(self):
+        parent = Comment.objects.annotate(
+                reply_count=Count('children')).order_by('-reply_count')[0]
+        # Walk the replies a level at a time to compare against, the
+        # descendants of the children of the parent start at the third level
+        levels = [[parent.id]]
+        while levels[-1]:
+            levels.append(list(Comment.objects.filter(
+                    parent_id__in=levels[-1]).values_list('id', flat=True)))
+        descendants = parent.children.get_descendants()
+        self.assertEqual(sorted(comment.id for comment in descendants),
+                         sorted(sum(levels[2:], [])))
+        self.assertEqual(
+                sorted(comment.id
+                       for comment
+                       in parent.children.get_descendants(depth=2)),
+                sorted(levels[2] + levels[3]))
+        self.assertLess(len(descendants),
+                        Comment.objects.filter(video=self.video).count())
+
+    def test_query_count_independent_of_thread_size(self):
+        with self.assertNumQueries(1):
+            Comment.objects.get_thread(self.video.id)
+        parent = Comment.objects.filter(video=self.video, parent=None)[0]
+        with self.assertNumQueries(2):
+            parent.children.get_children()
+        populate_comment_thread(self.video.id, self.user_ids,
+                                generations=25, seed=1)
+        with self.assertNumQueries(1):
+            Comment.objects.get_thread(self.video.id)
+        with self.assertNumQueries(2):
+            parent.children.get_children()
+
+    def test_replies_bounded_by_depth_and_breadth(self):
+        parents = list(Comment.objects.order_by_votes().filter(
+                video=self.video, parent=None)[:5])
+        with self.assertNumQueries(3):
+            tree = Comment.objects.get_replies(parents, depth=2, breadth=2)
+        pairs = flatten_comment_tree(tree)
+        self.assertEqual([comment for comment, depth in pairs
+                          if depth == 0], parents)
+        self.assertLessEqual(max(depth for comment, depth in pairs), 2)
+        for node in tree:
+            if isinstance(node, list):
+                self.assertLessEqual(len(node[1]), 2)
+        for comment, depth in pairs:
+            reply_count = comment.children.count()
+            loaded = [reply for reply, reply_depth in pairs
+                      if reply.parent_id == comment.id]
+            self.assertLessEqual(len(loaded), 2)
+            self.assertEqual(comment.more_replies, reply_count > len(loaded))
+
+    def test_replies_limited_in_database(self):
+        parents = list(Comment.objects.order_by_votes().filter(
+                video=self.video, parent=None))
+        with CaptureQueriesContext(connection) as queries:
+            tree = Comment.objects.get_replies(parents, depth=2, breadth=1)
+        self.assertIn('ROW_NUMBER()', queries[0]['sql'])
+        # The same replies as loading every reply and dropping the rest
+        with mock.patch('videos.models.supports_window_functions',
+                        return_value=False):
+            fallback = Comment.objects.get_replies(parents, depth=2,
+                                                   breadth=1)
+        self.assertEqual(flatten_comment_tree(tree),
+                         flatten_comment_tree(fallback))
+        self.assertEqual([comment.more_replies
+                          for comment, depth
+                          in flatten_comment_tree(tree)],
+                         [comment.more_replies
+                          for comment, depth
+                          in flatten_comment_tree(fallback)])
+
+
+class VoteCountersTestCase(TestCase):
+    def setUp(self):
+        self.users = create_users(5)
+        self.videos = create_videos(3, self.users[0])
+        self.comment = Comment.objects.create(text='Parent text',
+                                              commenter=self.users[0],
+                                              video=self.videos[0])
+
+    def assertCounters(self, obj, score, upvotes, downvotes):
+        obj.refresh_from_db()
+        self.assertEqual((obj.score, obj.upvotes, obj.downvotes),
+                         (score, upvotes, downvotes))
+
+    def test_commenter_vote_counted(self):
+        self.assertCounters(self.comment, 1, 1, 0)
+
+    def test_bulk_created_votes_counted(self):
+        video_ids = [video.id for video in self.videos]
+        for user in self.users:
+            VideoVote.objects.create_votes(user.id, *video_ids[:2])
+        self.assertCounters(self.videos[0], 5, 5, 0)
+        self.assertCounters(self.videos[1], 5, 5, 0)
+        self.assertCounters(self.videos[2], 0, 0, 0)
+
+    def test_changed_votes_counted(self):
+        vote = VideoVote.objects.create(value=1,
+                                        video=self.videos[0],
+                                        voter=self.users[1])
+        self.assertCounters(self.videos[0], 1, 1, 0)
+        vote.value = -1
+        vote.save()
+        self.assertCounters(self.videos[0], -1, 0, 1)
+        # Moving a vote to another video moves its counters with it
+        vote.video = self.videos[1]
+        vote.save()
+        self.assertCounters(self.videos[0], 0, 0, 0)
+        self.assertCounters(self.videos[1], -1, 0, 1)
+
+    def test_deleted_votes_uncounted(self):
+        for user in self.users[1:]:
+            CommentVote.objects.create(value=-1,
+                                       comment=self.comment,
+                                       voter=user)
+        self.assertCounters(self.comment, -3, 1, 4)
+        CommentVote.objects.filter(voter=self.users[1]).get().delete()
+        self.assertCounters(self.comment, -2, 1, 3)
+        CommentVote.objects.filter(voter=self.users[2]).delete()
+        self.assertCounters(self.comment, -1, 1, 2)
+        # Votes removed along with their voter are uncounted too
+        self.users[3].delete()
+        self.assertCounters(self.comment, 0, 1, 1)
+
+    def test_set_votes(self):
+        video_ids = [video.id for video in self.videos]
+        # Reading the existing votes, the upsert and the counter update along
+        # with the savepoint around them, then reading when the videos were
+        # submitted to invalidate the leaderboards listing them
+        with self.assertNumQueries(6):
+            VideoVote.objects.set_votes(self.users[1].id,
+                                        dict.fromkeys(video_ids, 1))
+        VideoVote.objects.set_votes(self.users[2].id,
+                                    dict.fromkeys(video_ids, -1))
+        VideoVote.objects.set_votes(self.users[1].id,
+                                    {video_ids[0]: -1,
+                                     video_ids[1]: None,
+                                     video_ids[2]: 1})
+        self.assertCounters(self.videos[0], -2, 0, 2)
+        self.assertCounters(self.videos[1], -1, 0, 1)
+        self.assertCounters(self.videos[2], 0, 1, 1)
+        self.assertEqual(VideoVote.objects.filter(voter=self.users[1])
+                                          .count(), 2)
+        CommentVote.objects.set_votes(self.users[0].id,
+                                      {self.comment.id: None})
+        self.assertCounters(self.comment, 0, 0, 0)
+        call_command('rebuild_vote_counters', check=True, stdout=StringIO())
+
+    def test_set_favorites(self):
+        user = self.users[1]
+        Video.objects.set_favorites(user.id, {self.videos[0].id: True,
+                                              self.videos[1].id: True})
+        Video.objects.set_favorites(user.id, {self.videos[0].id: True,
+                                              self.videos[1].id: False,
+                                              self.videos[2].id: True})
+        self.assertEqual(set(user.favorite_videos.all()),
+                         {self.videos[0], self.videos[2]})
+
+    def test_order_by_votes_uses_counters(self):
+        for index, video in enumerate(self.videos):
+            VideoVote.objects.bulk_create([VideoVote(value=1,
+                                                     video=video,
+                                                     voter=user)
+                                           for user
+                                           in self.users[:index + 1]])
+        self.assertEqual(list(Video.objects.order_by_votes()),
+                         self.videos[::-1])
+        self.assertEqual(list(Video.objects.order_by_votes(False)),
+                         self.videos)
+
+    def test_rebuild_vote_counters(self):
+        VideoVote.objects.create_votes(self.users[1].id, self.videos[0].id)
+        Video.objects.filter(pk=self.videos[0].pk).update(score=10)
+        Comment.objects.update(upvotes=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_vote_counters',
+                         check=True,
+                         stdout=StringIO())
+        call_command('rebuild_vote_counters', stdout=StringIO())
+        self.assertCounters(self.videos[0], 1, 1, 0)
+        self.assertCounters(self.comment, 1, 1, 0)
+        call_command('rebuild_vote_counters', check=True, stdout=StringIO())
+
+
+class TagTestCase(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('test_user',
+                                        'test@tastemakers.com',
+                                        'test_password')
+        self.video_ids = [video.id
+                          for video
+                          in create_videos(20, user, bulk=True)]
+        Tag.objects.create(title='existing')
+
+    def test_get_tag_ids_creates_missing_tags(self):
+        tag_ids = Tag.objects.get_tag_ids(['existing', 'new', 'new'])
+        self.assertEqual(Tag.objects.count(), 2)
+        self.assertEqual(tag_ids,
+                         dict(Tag.objects.values_list('title', 'id')))
+        self.assertEqual(Tag.objects.get_tag_ids([]), {})
+
+    def test_tag_videos(self):
+        video_tags = {video_id: ['existing', 'tag{}'.format(index % 3)]
+                      for index, video_id
+                      in enumerate(self.video_ids)}
+        Tag.objects.tag_videos(video_tags)
+        for video in Video.objects.prefetch_related('tags'):
+            self.assertEqual(sorted(tag.title for tag in video.tags.all()),
+                             sorted(video_tags[video.id]))
+        self.assertEqual(Tag.objects.count(), 4)
+
+    def test_tag_videos_query_count_independent_of_batch_size(self):
+        with self.assertNumQueries(3):
+            Tag.objects.tag_videos({video_id: ['existing', 'first']
+                                    for video_id
+                                    in self.video_ids[:2]})
+        with self.assertNumQueries(3):
+            Tag.objects.tag_videos({video_id: ['existing', 'second', 'third']
+                                    for video_id
+                                    in self.video_ids[2:]})
+
+
+class LatestViewsTestCase(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('test_user',
+                                        'test@tastemakers.com',
+                                        'test_password')
+        self.videos = create_videos(3, user)
+        self.now = timezone.now()
+
+    def test_newest_viewcount_stored_on_video(self):
+        video = self.videos[0]
+        ViewCount.objects.bulk_create([
+            ViewCount(video=video,
+                      views=views,
+                      count_datetime=self.now - timedelta(days=days))
+            for days, views
+            in ((2, 10), (0, 30), (1, 20))])
+        video.refresh_from_db()
+        self.assertEqual((video.views, video.views_counted), (30, self.now))
+        # Older view counts recorded later do not replace the newest one
+        ViewCount.objects.create(video=video,
+                                 views=5,
+                                 count_datetime=self.now - timedelta(days=5))
+        video.refresh_from_db()
+        self.assertEqual(video.views, 30)
+        ViewCount.objects.create(video=video, views=40)
+        video.refresh_from_db()
+        self.assertEqual(video.views, 40)
+
+    def test_order_by_views(self):
+        ViewCount.objects.bulk_create([ViewCount(video=video, views=views)
+                                       for video, views
+                                       in zip(self.videos, (20, 30, 10))])
+        self.assertEqual(list(Video.objects.order_by_views()),
+                         [self.videos[1], self.videos[0], self.videos[2]])
@@ -0,0 +1,174 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+
+from profiles.models import User
+from videos.models import VideoVote, ViewCount
+from videos.page_cache import (LocalCache, TieredCache, check_shared_cache,
+                               video_list_cache)
+from videos.testing import create_videos
+
+
+class LocalCacheTestCase(TestCase):
+    def test_least_recently_used_evicted(self):
+        local = LocalCache(2)
+        local.set('a', 1, 60)
+        local.set('b', 2, 60)
+        local.get('a')
+        local.set('c', 3, 60)
+        self.assertEqual(local.get('a'), 1)
+        self.assertIsNone(local.get('b'))
+        self.assertEqual(local.get('c'), 3)
+
+    def test_expiry(self):
+        local = LocalCache(2)
+        local.set('a', 1, -1)
+        self.assertIsNone(local.get('a'))
+
+
+class SharedCacheCheckTestCase(TestCase):
+    def test_process_local_backend_warned_about(self):
+        backend = 'django.core.cache.backends.memcached.MemcachedCache'
+        with override_settings(CACHES={'default': {'BACKEND': backend}}):
+            self.assertEqual(check_shared_cache(None), [])
+        backend = 'django.core.cache.backends.locmem.LocMemCache'
+        with override_settings(CACHES={'default': {'BACKEND': backend}}):
+            self.assertEqual([warning.id
+                              for warning
+                              in check_shared_cache(None)],
+                             ['videos.W001'])
+
+
+class TieredCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cache = TieredCache('test', ('first', 'second'),
+                                 LOCK_TIMEOUT=0.2,
+                                 POLL_INTERVAL=0.01)
+        self.renders = 0
+
+    def render(self):
+        self.renders += 1
+        return 'value {}'.format(self.renders)
+
+    def get(self, namespace='first'):
+        return self.cache.get(namespace, ('page',), self.render)
+
+    def expire(self, namespace='first'):
+        key = self.cache.get_key(namespace, 'page')
+        entry = cache.get(key)
+        entry['expires'] = time.time() - 1
+        cache.set(key, entry)
+        self.cache.local.clear()
+        return key
+
+    def test_tiers(self):
+        self.assertEqual(self.get(), ('value 1', 'miss'))
+        self.assertEqual(self.get(), ('value 1', 'local'))
+        self.cache.local.clear()
+        self.assertEqual(self.get(), ('value 1', 'shared'))
+        self.assertEqual(self.get('second'), ('value 2', 'miss'))
+        self.assertEqual(self.cache.get_stats(), {'miss': 2,
+                                                  'local': 1,
+                                                  'shared': 1,
+                                                  'requests': 4,
+                                                  'hit_ratio': 0.5})
+
+    def test_invalidate(self):
+        self.get()
+        self.get('second')
+        self.cache.invalidate('first')
+        self.assertEqual(self.get(), ('value 3', 'miss'))
+        self.assertEqual(self.get('second'), ('value 2', 'local'))
+        self.cache.invalidate()
+        self.assertEqual(self.get('second'), ('value 4', 'miss'))
+
+    def test_expired_entry_rendered_once(self):
+        self.get()
+        key = self.expire()
+        # Another request is already rendering the page
+        cache.add(key + ':lock', 1)
+        self.assertEqual(self.get(), ('value 1', 'stale'))
+        cache.delete(key + ':lock')
+        self.assertEqual(self.get(), ('value 2', 'miss'))
+
+    def test_missing_entry_waited_for(self):
+        key = self.cache.get_key('first', 'page')
+        cache.add(key + ':lock', 1)
+
+        def render_elsewhere():
+            time.sleep(0.05)
+            cache.set(key, {'value': 'elsewhere',
+                            'expires': time.time() + 60})
+        thread = threading.Thread(target=render_elsewhere)
+        thread.start()
+        self.assertEqual(self.get(), ('elsewhere', 'wait'))
+        thread.join()
+        self.assertEqual(self.renders, 0)
+
+    def test_abandoned_lock_times_out(self):
+        key = self.cache.get_key('first', 'page')
+        cache.add(key + ':lock', 1)
+        self.assertEqual(self.get(), ('value 1', 'miss'))
+
+
+class VideoListCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        video_list_cache.clear_local()
+        self.user = User.objects.create(username='uploader')
+        self.video = self.create_video(0)
+
+    def create_video(self, index):
+        return create_videos(1, self.user, start=index)[0]
+
+    def get(self, list_by='likes'):
+        return self.client.get(reverse('videos_video_list', args=[list_by]))
+
+    def test_pages_cached(self):
+        self.assertEqual(self.get()['X-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            response = self.get()
+        self.assertEqual(response['X-Cache'], 'local')
+        self.assertContains(response, 'Video 0')
+        self.assertContains(response, 'Most Liked Videos')
+        # Unknown orderings share the page of the most liked videos
+        self.assertEqual(self.get('unknown')['X-Cache'], 'local')
+
+    def test_invalidated_by_events(self):
+        self.get('likes')
+        self.get('views')
+        VideoVote.objects.create(video=self.video, voter=self.user, value=1)
+        self.assertEqual(self.get('likes')['X-Cache'], 'miss')
+        self.assertEqual(self.get('views')['X-Cache'], 'local')
+        ViewCount.objects.bulk_create([ViewCount(video=self.video,
+                                                 views=10)])
+        self.assertEqual(self.get('likes')['X-Cache'], 'local')
+        self.assertEqual(self.get('views')['X-Cache'], 'miss')
+        self.create_video(1)
+        response = self.get('submission')
+        self.assertEqual(response['X-Cache'], 'miss')
+        self.assertContains(response, 'Video 1')
+        self.assertEqual(self.get('likes')['X-Cache'], 'miss')
+
+    def test_user_not_cached(self):
+        self.get()
+        self.client.force_login(self.user)
+        response = self.get()
+        self.assertEqual(response['X-Cache'], 'local')
+        self.assertContains(response, 'My Feed')
+
+    def test_stats(self):
+        url = reverse('videos_cache_stats')
+        self.get()
+        self.get()
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+        stats = self.client.get(url, {'format': 'json'}).data
+        self.assertGreaterEqual(stats['local'], 1)
+        self.assertGreaterEqual(stats['requests'], 2)
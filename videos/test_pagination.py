@@ -0,0 +1,104 @@
+import json
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from profiles.models import User
+from videos.models import Video
+from videos.page_cache import video_list_cache
+from videos.pagination import InvalidCursor, KeysetPaginator
+from videos.testing import create_videos
+
+
+class KeysetPaginatorTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        video_list_cache.clear_local()
+        user = User.objects.create(username='user')
+        published = timezone.now()
+        # Scores repeat so pages have to be split between tied videos
+        create_videos(25, user,
+                      bulk=True,
+                      published=lambda index: (published -
+                                               timedelta(days=index % 4)),
+                      score=lambda index: index % 3)
+
+    def walk(self, queryset, per_page=4):
+        paginator = KeysetPaginator(queryset, per_page)
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        return paginator, pages
+
+    def test_pages_cover_every_video_once(self):
+        for queryset in (Video.objects.order_by_votes(),
+                         Video.objects.order_by_votes(descending=False),
+                         Video.objects.order_by('-published', '-id')):
+            paginator, pages = self.walk(queryset)
+            self.assertEqual([video.id
+                              for page in pages
+                              for video in page],
+                             [video.id for video in queryset])
+            self.assertEqual([page.start_index() for page in pages],
+                             list(range(1, 26, 4)))
+            self.assertFalse(pages[0].has_previous())
+            self.assertFalse(pages[-1].has_next())
+
+    def test_previous_pages(self):
+        paginator, pages = self.walk(Video.objects.order_by_votes())
+        for page, previous_page in zip(pages[1:], pages):
+            page_before = paginator.page(page.previous_cursor)
+            self.assertEqual(page_before.object_list,
+                             previous_page.object_list)
+            self.assertEqual(page_before.start_index(),
+                             previous_page.start_index())
+            self.assertTrue(page_before.has_next())
+        self.assertFalse(paginator.page(pages[1].previous_cursor)
+                         .has_previous())
+
+    def test_deep_pages_cost_the_same(self):
+        paginator, pages = self.walk(Video.objects.order_by_views())
+        for page in pages[:-1]:
+            with CaptureQueriesContext(connection) as queries:
+                paginator.page(page.next_cursor)
+            self.assertEqual(len(queries), 1)
+            self.assertNotIn('OFFSET', queries[0]['sql'])
+
+    def test_invalid_cursors(self):
+        paginator = KeysetPaginator(Video.objects.order_by_votes(), 4)
+        for cursor in ('not a cursor', 'e30=', 'W10='):
+            with self.assertRaises(InvalidCursor):
+                paginator.page(cursor)
+        with self.assertRaises(ValueError):
+            KeysetPaginator(Video.objects.all(), 4)
+
+    def test_video_list_pages(self):
+        response = self.client.get('/videos/videos/likes/')
+        self.assertEqual(len(response.context['object_list']), 10)
+        page = response.context['page_obj']
+        response = self.client.get('/videos/videos/likes/',
+                                   {'cursor': page.next_cursor})
+        self.assertEqual(response.context['object_list'][0][0], 11)
+        response = self.client.get('/videos/videos/likes/',
+                                   {'cursor': 'not a cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_api_pages(self):
+        seen = []
+        url = '/api/v1/videos/videos/?ordering=submission'
+        while url:
+            response = self.client.get(url)
+            data = json.loads(b''.join(response.streaming_content).decode())
+            seen.extend(video['video_id'] for video in data['results'])
+            url = data['next']
+        self.assertEqual(seen,
+                         [video.video_id
+                          for video
+                          in Video.objects.order_by('-created', '-id')])
+        response = self.client.get('/api/v1/videos/videos/',
+                                   {'cursor': 'not a cursor'})
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,119 @@
+import json
+import os
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from profiles.models import User
+from videos.client import APIReturnedError, VideoAPIClient
+from videos.mixins import VideoAPIMixin
+from videos.models import Category, Video
+from videos.profiling import Histogram, metrics
+from videos.testing import FakeAPIServer
+from videos.transports import SyntheticTransport
+
+
+class HistogramTestCase(SimpleTestCase):
+    def test_percentiles(self):
+        histogram = Histogram()
+        for value in [1.5] * 90 + [40] * 9 + [30000000]:
+            histogram.observe(value)
+        summary = histogram.to_dict()
+        self.assertEqual((summary['count'], summary['min'], summary['max']),
+                         (100, 1.5, 30000000))
+        self.assertEqual((summary['p50'], summary['p90'], summary['p99']),
+                         (2, 2, 50))
+        self.assertEqual(summary['buckets'],
+                         {'<=2': 90, '<=50': 9, '>5000000': 1})
+        self.assertIsNone(Histogram().to_dict()['p50'])
+
+
+class APIMetricsTestCase(SimpleTestCase):
+    def setUp(self):
+        metrics.reset()
+        self.server = FakeAPIServer().__enter__()
+        self.client = VideoAPIClient(self.server.url, 'key', backoff=0)
+
+    def tearDown(self):
+        self.server.__exit__()
+        metrics.reset()
+
+    def test_calls_recorded(self):
+        self.server.missing.add('b')
+        self.server.fail(503)
+        self.client.get('videos', dict(id='a,b,c'))
+        self.client.get('search', dict(maxResults=5))
+        self.server.fail(400)
+        with self.assertRaises(APIReturnedError):
+            self.client.get('videos', dict(id='a'))
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['counters'], {
+            'api.quota_units': 1 + 1 + 100 + 1,
+            'api.search.calls': 1,
+            'api.search.items_requested': 5,
+            'api.search.items_returned': 5,
+            'api.videos.calls': 2,
+            'api.videos.errors': 1,
+            'api.videos.items_requested': 3,
+            'api.videos.items_returned': 2,
+            'api.videos.retries': 1,
+        })
+        self.assertEqual(snapshot['histograms']['api.videos.ms']['count'], 2)
+        self.assertEqual(snapshot['histograms']['api.videos.bytes']['count'],
+                         3)
+
+
+class IngestionMetricsTestCase(TestCase):
+    def setUp(self):
+        metrics.reset()
+        VideoAPIMixin._api_client = VideoAPIClient(
+                VideoAPIMixin.API_URL, '', transport=SyntheticTransport())
+        Category.objects.create(pk=1, title='Music')
+        self.user = User.objects.create_user('uploader')
+
+    def tearDown(self):
+        VideoAPIMixin._api_client = None
+        metrics.reset()
+
+    def test_stages_recorded(self):
+        metrics.profile_next(1)
+        Video.objects.create_videos(self.user.id, 'a', 'b')
+        Video.objects.create_videos(self.user.id, 'b', 'c')
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['counters']['ingest.videos_requested'], 4)
+        self.assertEqual(snapshot['counters']['ingest.videos_created'], 3)
+        for stage in ('fetch', 'insert_videos', 'votes', 'viewcounts',
+                      'tags', 'feeds', 'search_index'):
+            self.assertEqual(snapshot['counters'][
+                                 'stage.{}.calls'.format(stage)], 2)
+            self.assertIn('stage.{}.ms'.format(stage),
+                          snapshot['histograms'])
+        # Only the armed batch is profiled
+        self.assertEqual(len(snapshot['profiles']), 1)
+        self.assertIn('_create_videos', snapshot['profiles'][0]['report'])
+
+    def test_worker_threads_profiled(self):
+        metrics.profile_next(1)
+        # More videos than fit in one request, so they are requested by
+        # worker threads
+        Video.objects.create_videos(self.user.id,
+                                    *['video{}'.format(index)
+                                      for index
+                                      in range(60)])
+        name, report, stats = metrics.profiles[0]
+        self.assertIn(('request', 'client.py'),
+                      set((function, os.path.basename(filename))
+                          for filename, line, function
+                          in stats.stats))
+        self.assertIsNone(metrics.worker_profiles)
+
+    def test_command(self):
+        stdout = StringIO()
+        call_command('profile_ingestion', '--synthetic', '--videos', '30',
+                     '--batch-size', '20', '--profile', '1', stdout=stdout)
+        results = json.loads(stdout.getvalue())
+        self.assertEqual(results['counters']['ingest.batches'], 2)
+        self.assertEqual(results['counters']['api.videos.items_returned'], 30)
+        self.assertEqual(len(results['profiles']), 1)
+        self.assertFalse(Video.objects.exists())
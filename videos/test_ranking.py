@@ -0,0 +1,108 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from videos.models import Comment, Video, VideoVote, ViewCount
+from videos.page_cache import video_list_cache
+from videos.ranking import (COMMENT_WINDOW, SAFETY_MARGIN, VIEW_WINDOW,
+                            hot_score, rank_videos)
+from videos.testing import create_users, create_videos
+
+
+class HotScoreTestCase(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+
+    def test_activity_raises_score(self):
+        baseline = hot_score(10, 0, 0, self.now, self.now)
+        self.assertGreater(hot_score(100, 0, 0, self.now, self.now), baseline)
+        self.assertGreater(hot_score(10, 1000, 0, self.now, self.now),
+                           baseline)
+        self.assertGreater(hot_score(10, 0, 10, self.now, self.now), baseline)
+        self.assertLess(hot_score(-10, 0, 0, self.now, self.now), baseline)
+
+    def test_newer_submissions_rank_higher(self):
+        yesterday = self.now - timedelta(days=1)
+        self.assertGreater(hot_score(10, 0, 0, self.now, self.now),
+                           hot_score(10, 0, 0, yesterday, yesterday))
+        # Enough extra activity makes up for being older
+        self.assertGreater(hot_score(10000, 0, 0, yesterday, yesterday),
+                           hot_score(10, 0, 0, self.now, self.now))
+
+    def test_old_publications_rank_lower(self):
+        self.assertLess(hot_score(10, 0, 0, self.now,
+                                  self.now - timedelta(days=365)),
+                        hot_score(10, 0, 0, self.now, self.now))
+
+
+class RankVideosTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        video_list_cache.clear_local()
+        self.users = create_users(5)
+        self.videos = create_videos(3, self.users[0])
+
+    def at(self, now):
+        return mock.patch('django.utils.timezone.now', return_value=now)
+
+    def test_only_changed_videos_reranked(self):
+        now = timezone.now()
+        self.assertEqual(rank_videos(), 3)
+        # Changes within the safety margin before the last run are ranked
+        # again in case they committed after it
+        later = now + SAFETY_MARGIN + timedelta(minutes=1)
+        with self.at(later):
+            self.assertEqual(rank_videos(), 3)
+            self.assertEqual(rank_videos(), 0)
+            VideoVote.objects.create_votes(self.users[1].id,
+                                           self.videos[0].id)
+            Comment.objects.create(text='Parent text',
+                                   commenter=self.users[1],
+                                   video=self.videos[1])
+            self.assertEqual(rank_videos(), 2)
+        with self.at(later + SAFETY_MARGIN + timedelta(minutes=1)):
+            ViewCount.objects.create(video=self.videos[2], views=10)
+            self.assertEqual(rank_videos(), 3)
+            self.assertEqual(rank_videos(), 1)
+        self.assertEqual(rank_videos(full=True), 3)
+
+    def test_lapsed_activity_reranked(self):
+        now = timezone.now()
+        Comment.objects.create(text='Parent text',
+                               commenter=self.users[1],
+                               video=self.videos[1])
+        ViewCount.objects.create(video=self.videos[2], views=10)
+        self.assertEqual(rank_videos(), 3)
+        with self.at(now + SAFETY_MARGIN + timedelta(minutes=1)):
+            self.assertEqual(rank_videos(), 3)
+            self.assertEqual(rank_videos(), 0)
+        with self.at(now + COMMENT_WINDOW + SAFETY_MARGIN +
+                     timedelta(minutes=2)):
+            self.assertEqual(rank_videos(), 1)
+            self.assertEqual(rank_videos(), 0)
+        with self.at(now + VIEW_WINDOW + SAFETY_MARGIN +
+                     timedelta(minutes=2)):
+            self.assertEqual(rank_videos(), 1)
+
+    def test_trending_ordering(self):
+        for index, video in enumerate(self.videos):
+            VideoVote.objects.bulk_create([VideoVote(value=1,
+                                                     video=video,
+                                                     voter=user)
+                                           for user
+                                           in self.users[:index * 2 + 1]])
+        self.assertEqual(list(Video.objects.order_by_trending()), [])
+        rank_videos()
+        self.assertEqual(list(Video.objects.order_by_trending()),
+                         self.videos[::-1])
+        response = self.client.get('/videos/videos/trending/')
+        self.assertEqual([video.id
+                          for index, video
+                          in response.context['object_list']],
+                         [video.id for video in self.videos[::-1]])
+        response = self.client.get('/api/v1/videos/videos/trending/')
+        self.assertEqual([video['video_id'] for video in response.data],
+                         [video.video_id for video in self.videos[::-1]])
@@ -0,0 +1,123 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.utils import timezone
+
+from videos.models import Recommendation, SimilarVideo, VideoVote
+from videos.recommendations import (build_neighbours, build_recommendations,
+                                    compute_recommendations,
+                                    get_changed_user_ids,
+                                    refresh_recommendations)
+from videos.testing import create_users, create_videos
+
+
+class RecommendationTestCase(TestCase):
+    def setUp(self):
+        self.users = create_users(5)
+        self.videos = create_videos(5, self.users[0], bulk=True)
+        for user, videos in ((0, (0, 1)),
+                             (1, (0, 1, 2)),
+                             (2, (2, 3)),
+                             (3, (0,))):
+            VideoVote.objects.bulk_create([VideoVote(
+                                               value=1,
+                                               video=self.videos[video],
+                                               voter=self.users[user])
+                                           for video
+                                           in videos])
+        # Dislikes are not interest in a video
+        VideoVote.objects.create(value=-1,
+                                 video=self.videos[4],
+                                 voter=self.users[3])
+        self.users[2].favorite_videos.add(self.videos[3])
+
+    def get_recommended(self, user):
+        return [recommendation.video
+                for recommendation
+                in Recommendation.objects.filter(user=user).order_by(
+                    '-score', '-id')]
+
+    def test_build_neighbours(self):
+        interactions = {1: {10: 1.0, 11: 1.0},
+                        2: {10: 1.0, 11: 1.0, 12: 1.0},
+                        3: {12: 1.0, 13: 2.0}}
+        neighbours = build_neighbours(interactions, processes=1)
+        self.assertEqual([video_id for score, video_id in neighbours[10]],
+                         [11, 12])
+        self.assertAlmostEqual(neighbours[10][0][0], 1.0)
+        self.assertEqual([video_id for score, video_id in neighbours[13]],
+                         [12])
+        recommendations = dict(build_recommendations(interactions,
+                                                     neighbours,
+                                                     processes=1))
+        # Only videos similar to ones the user interacted with are
+        # recommended, not videos similar to those in turn
+        self.assertEqual([video_id for score, video_id in recommendations[1]],
+                         [12])
+        self.assertEqual([video_id for score, video_id in recommendations[3]],
+                         [11, 10])
+        self.assertAlmostEqual(recommendations[3][0][0], 0.5)
+
+    def test_worker_processes_agree(self):
+        interactions = {user_id: {video_id: 1.0
+                                  for video_id
+                                  in range(user_id % 7, 40, user_id % 5 + 1)}
+                        for user_id
+                        in range(600)}
+        self.assertEqual(build_neighbours(interactions, processes=2),
+                         build_neighbours(interactions, processes=1))
+
+    def test_compute_recommendations(self):
+        self.assertEqual(compute_recommendations(), 4)
+        self.assertEqual(self.get_recommended(self.users[3]),
+                         [self.videos[1], self.videos[2]])
+        self.assertEqual(self.get_recommended(self.users[0]),
+                         [self.videos[2]])
+        self.assertEqual(self.get_recommended(self.users[4]), [])
+        self.assertFalse(SimilarVideo.objects.filter(
+                similar=self.videos[4]).exists())
+        # Users who no longer interact with anything lose their
+        # recommendations
+        VideoVote.objects.filter(voter=self.users[3], value=1).delete()
+        compute_recommendations()
+        self.assertEqual(self.get_recommended(self.users[3]), [])
+
+    def test_refresh(self):
+        compute_recommendations()
+        before = set(Recommendation.objects.exclude(
+                user=self.users[3]).values_list('id', flat=True))
+        now = timezone.now()
+        VideoVote.objects.update(updated=now - timedelta(hours=2))
+        Recommendation.objects.update(created=now - timedelta(hours=1))
+        VideoVote.objects.create(value=1,
+                                 video=self.videos[2],
+                                 voter=self.users[3])
+        self.assertEqual(get_changed_user_ids(), [self.users[3].id])
+        self.assertEqual(refresh_recommendations([self.users[3].id]), 1)
+        self.assertEqual(self.get_recommended(self.users[3]),
+                         [self.videos[1], self.videos[3]])
+        self.assertEqual(set(Recommendation.objects.exclude(
+                user=self.users[3]).values_list('id', flat=True)), before)
+
+    def test_command(self):
+        call_command('compute_recommendations', stdout=StringIO())
+        Recommendation.objects.filter(user=self.users[3]).delete()
+        call_command('compute_recommendations',
+                     str(self.users[3].id),
+                     refresh=True,
+                     stdout=StringIO())
+        self.assertEqual(len(self.get_recommended(self.users[3])), 2)
+
+    def test_api(self):
+        compute_recommendations()
+        url = reverse('video-recommended')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.users[3])
+        response = self.client.get(url, {'format': 'json'})
+        self.assertEqual([video['video_id']
+                          for video
+                          in response.data['results']],
+                         ['video1', 'video2'])
@@ -0,0 +1,81 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from profiles.models import User
+from videos.models import Category, RelatedVideo, Tag
+from videos.related import compute_related_videos, get_related_videos
+from videos.testing import create_videos
+
+
+class RelatedVideoTestCase(TestCase):
+    def setUp(self):
+        self.categories = [Category.objects.create(title='Music'),
+                           Category.objects.create(title='Comedy')]
+        uploader = User.objects.create(username='uploader')
+        self.videos = create_videos(
+                30, uploader,
+                lambda index: self.categories[0 if index in (0, 3) else 1],
+                bulk=True)
+        tags = {video.id: []
+                for video
+                in self.videos[:10]}
+        for index, titles in ((0, ['cats', 'pets']),
+                              (1, ['cats']),
+                              (2, ['pets']),
+                              (3, ['pets'])):
+            tags[self.videos[index].id].extend(titles)
+        for video in self.videos[:10]:
+            # On a third of the videos, too common to relate them
+            tags[video.id].append('funny')
+        Tag.objects.tag_videos(tags)
+
+    def get_related(self, index):
+        return [related.related
+                for related
+                in get_related_videos(self.videos[index].id)]
+
+    def test_compute_related_videos(self):
+        self.assertEqual(compute_related_videos(), 4)
+        # Sharing a category outweighs sharing a rarer tag, which counts for
+        # more than sharing a common one
+        self.assertEqual(self.get_related(0), [self.videos[3],
+                                               self.videos[1],
+                                               self.videos[2]])
+        self.assertEqual(self.get_related(1), [self.videos[0]])
+        self.assertEqual(self.get_related(4), [])
+        scores = list(RelatedVideo.objects.filter(
+                video=self.videos[0]).order_by('-score').values_list(
+                    'score', flat=True))
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_recompute_replaces_related_videos(self):
+        compute_related_videos()
+        self.videos[1].tags.clear()
+        compute_related_videos(top_k=1)
+        self.assertEqual(self.get_related(0), [self.videos[3]])
+        self.assertEqual(self.get_related(1), [])
+        self.assertEqual(RelatedVideo.objects.count(), 3)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('compute_related_videos', stdout=out)
+        self.assertIn('4 videos', out.getvalue())
+
+    def test_lookups(self):
+        compute_related_videos()
+        with self.assertNumQueries(1):
+            self.get_related(0)
+        response = self.client.get(reverse('video-related',
+                                           args=[self.videos[0].id]),
+                                   {'format': 'json'})
+        self.assertEqual([video['video_id'] for video in response.data],
+                         ['video{}'.format(index) for index in (3, 1, 2)])
+        self.assertEqual(sorted(response.data[0]['tags']), ['funny', 'pets'])
+        response = self.client.get(reverse('videos_video_comments',
+                                           args=[self.videos[0].id]))
+        self.assertEqual(list(response.context['related_videos']),
+                         list(get_related_videos(self.videos[0].id)))
+        self.assertContains(response, 'Video 1')
@@ -0,0 +1,103 @@
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.utils import timezone
+
+from profiles.models import User
+from videos.models import Category, SearchTerm, Tag, Video, get_search_terms
+
+
+class SearchTestCase(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(title='Music')
+        self.uploader = User.objects.create(username='uploader')
+        self.url = reverse('video-search')
+
+    def create_video(self, title, description='', tags=()):
+        video = Video.objects.create(category=self.category,
+                                     description=description,
+                                     published=timezone.now(),
+                                     title=title,
+                                     uploader=self.uploader,
+                                     video_id=title)
+        if tags:
+            video.tags.add(*Tag.objects.create_tags(*tags))
+        return video
+
+    def search(self, query):
+        return [row['video_id']
+                for row
+                in SearchTerm.objects.search(query)]
+
+    def test_get_search_terms(self):
+        self.assertEqual(get_search_terms('The cat, the CATS & a dog!'),
+                         ['the', 'cat', 'cats', 'dog'])
+        self.assertEqual(get_search_terms('x' * 50), ['x' * 40])
+
+    def test_ranked_by_field(self):
+        description = self.create_video('Birds', 'Also has cats')
+        tagged = self.create_video('Dogs', tags=['cats'])
+        title = self.create_video('Cats')
+        repeated = self.create_video('Fish', 'cats cats cats')
+        self.create_video('Horses', 'Nothing to see')
+        self.assertEqual(self.search('cats'), [title.id,
+                                               tagged.id,
+                                               repeated.id,
+                                               description.id])
+
+    def test_all_words_match_and_last_is_prefix(self):
+        both = self.create_video('Funny cats', 'Kittens playing')
+        self.create_video('Funny dogs', 'Puppies playing')
+        self.create_video('Cats', 'Sleeping')
+        self.assertEqual(self.search('funny cat'), [both.id])
+        self.assertEqual(self.search('kitt'), [both.id])
+        # Only the last word is a prefix, and only once it is long enough
+        self.assertEqual(self.search('kitt funny'), [])
+        self.assertEqual(self.search('ki'), [])
+        self.assertEqual(self.search('!!'), [])
+
+    def test_index_follows_edits(self):
+        video = self.create_video('Cats')
+        video.title = 'Dogs'
+        video.save()
+        self.assertEqual(self.search('cats'), [])
+        self.assertEqual(self.search('dogs'), [video.id])
+        # Saves of fields that are not searched leave the index alone
+        SearchTerm.objects.all().delete()
+        video.save(update_fields=['views'])
+        self.assertEqual(self.search('dogs'), [])
+        video.save(update_fields=['title'])
+        self.assertEqual(self.search('dogs'), [video.id])
+
+    def test_index_follows_tags(self):
+        video = self.create_video('Untitled', tags=['cats'])
+        self.assertEqual(self.search('cats'), [video.id])
+        video.tags.clear()
+        self.assertEqual(self.search('cats'), [])
+        tag = Tag.objects.get(title='cats')
+        tag.video_set.add(video)
+        self.assertEqual(self.search('cats'), [video.id])
+        tag.video_set.clear()
+        self.assertEqual(self.search('cats'), [])
+
+    def test_api(self):
+        videos = [self.create_video('Cats {}'.format(index))
+                  for index
+                  in range(5)]
+        self.create_video('Dogs')
+        found = []
+        response = self.client.get(self.url, {'q': 'cat',
+                                              'page_size': 2,
+                                              'format': 'json'})
+        while True:
+            found.extend(video['video_id']
+                         for video
+                         in response.data['results'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        # Equally ranked videos are listed newest first
+        self.assertEqual(found, [video.video_id
+                                 for video
+                                 in reversed(videos)])
+        response = self.client.get(self.url, {'q': '', 'format': 'json'})
+        self.assertEqual(response.status_code, 400)
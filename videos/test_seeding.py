@@ -0,0 +1,125 @@
+from io import StringIO
+from unittest import mock, skipIf
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase
+
+from profiles.models import Profile, User
+from scripts import populate_table_data
+from scripts.populate_table_data import (CATEGORY_TITLES, VIEWCOUNT_DAYS,
+                                         copy_value, generate_rows,
+                                         load_rows, seed_tables, tag_rows)
+from videos.models import (Category, Comment, CommentVote, FeedItem,
+                           Tag, Video, VideoRank, VideoVote, ViewCount)
+
+
+class GenerateRowsTestCase(SimpleTestCase):
+    @mock.patch.object(populate_table_data, 'GENERATE_BATCH_SIZE', 3)
+    def test_rows_independent_of_processes(self):
+        shared = dict(offset=0)
+        rows = list(generate_rows(tag_rows, 10, shared, seed=1))
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(list(generate_rows(tag_rows, 10, shared,
+                                            processes=2, seed=1)),
+                         rows)
+        self.assertNotEqual(list(generate_rows(tag_rows, 10, shared,
+                                               seed=2)),
+                            rows)
+
+    def test_copy_value(self):
+        self.assertEqual(copy_value(None), '\\N')
+        self.assertEqual(copy_value('a\tb\nc\\d'), 'a\\tb\\nc\\\\d')
+        self.assertEqual(copy_value(3), '3')
+
+
+class LoadRowsTestCase(TestCase):
+    @skipIf(connection.vendor == 'postgresql',
+            'Rows are loaded through COPY on postgres')
+    def test_rows_inserted_in_batches(self):
+        titles = ['Tag {}'.format(index) for index in range(7)]
+        titles[3] = "It's a \"tag\""
+        # Fewer rows than are loaded fit in a single multi-row insert
+        with mock.patch.object(connection.ops, 'bulk_batch_size',
+                               return_value=3):
+            with self.assertNumQueries(3):
+                load_rows(Tag, ['title'], ((title,) for title in titles))
+        self.assertEqual(list(Tag.objects.order_by('id').values_list(
+                             'title', flat=True)),
+                         titles)
+        with self.assertNumQueries(0):
+            load_rows(Tag, ['title'], iter([]))
+
+
+class SeedTablesTestCase(TestCase):
+    def seed(self):
+        stdout = StringIO()
+        seed_tables(users=4, videos=6, comments=2, votes=3, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_row_counts(self):
+        output = self.seed()
+        self.assertEqual(Category.objects.count(), len(CATEGORY_TITLES))
+        self.assertEqual(User.objects.count(), 4)
+        self.assertEqual(Profile.objects.count(), 4)
+        self.assertEqual(Tag.objects.count(), 3)
+        self.assertEqual(Video.objects.count(), 6)
+        self.assertEqual(ViewCount.objects.count(), 6 * VIEWCOUNT_DAYS)
+        self.assertEqual(Video.tags.through.objects.count(), 6 * 3)
+        # Half the comments are on videos and the rest replies
+        self.assertEqual(Comment.objects.count(), 12)
+        self.assertEqual(Comment.objects.filter(parent=None).count(), 6)
+        self.assertEqual(VideoVote.objects.count(), 4 * 3)
+        self.assertEqual(CommentVote.objects.count(), 4 * 3)
+        # Every user favorites every video and follows every other user but
+        # never themselves
+        self.assertEqual(Video.favorited_by.through.objects.count(), 4 * 6)
+        self.assertEqual(User.following.through.objects.count(), 4 * 3)
+        # The tables computed from the rest are filled in. Too few videos
+        # are seeded for any to be related by their tags or left to be
+        # recommended to users who favorited them all
+        self.assertEqual(VideoRank.objects.count(), 6)
+        self.assertIn('Related videos computed for 0 videos', output)
+        self.assertIn('Recommendations computed for 4 users', output)
+        self.assertTrue(FeedItem.objects.exists())
+
+    def test_command(self):
+        stdout = StringIO()
+        call_command('seed_tables', users=3, videos=4, comments=2, votes=2,
+                     processes=1, stdout=stdout)
+        self.assertEqual(User.objects.count(), 3)
+        self.assertEqual(Video.objects.count(), 4)
+        self.assertEqual(VideoRank.objects.count(), 4)
+        self.assertIn('Seeded 3 users and 4 videos', stdout.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('seed_tables', users=-1, stdout=StringIO())
+
+    def test_relations_consistent(self):
+        self.seed()
+        # Seeding again adds to what is there rather than clashing with it
+        self.seed()
+        self.assertEqual(Video.objects.count(), 12)
+        for model in (User, Profile, Video, ViewCount, Comment, VideoVote,
+                      CommentVote, Video.tags.through,
+                      Video.favorited_by.through,
+                      Category.followed_by.through, Tag.followed_by.through,
+                      User.following.through):
+            for field in model._meta.concrete_fields:
+                if not field.is_relation:
+                    continue
+                # Every row refers to rows that exist
+                self.assertFalse(model.objects.filter(
+                        **{field.attname + '__isnull': False}
+                        ).exclude(
+                        **{field.attname + '__in':
+                           field.related_model.objects.values('pk')}
+                        ).exists(),
+                        '{}.{}'.format(model.__name__, field.name))
+        # Replies are on the videos of their parents and nobody follows
+        # themselves
+        self.assertFalse(Comment.objects.exclude(parent=None).exclude(
+                parent__video_id=F('video_id')).exists())
+        self.assertFalse(User.following.through.objects.filter(
+                from_user_id=F('to_user_id')).exists())
+        call_command('rebuild_vote_counters', check=True, stdout=StringIO())
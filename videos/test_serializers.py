@@ -0,0 +1,60 @@
+import json
+from collections import OrderedDict
+
+from django.test import TestCase
+
+from rest_framework.renderers import JSONRenderer
+
+from api.v1.videos.serializers import (VIDEO_COLUMNS, VideoSerializer,
+                                       prefetch_tags, serialize_videos)
+from profiles.models import User
+from videos.models import Tag, Video
+from videos.testing import create_videos
+
+
+class SerializeVideosTestCase(TestCase):
+    def setUp(self):
+        user = User.objects.create(username='user')
+        self.videos = create_videos(5, user,
+                                    title='Vid\xe9o {}'.format,
+                                    description='Line separated "quoted"')
+        Tag.objects.tag_videos({video.id: ['tag{}'.format(tag)
+                                           for tag
+                                           in range(index, -1, -1)]
+                                for index, video
+                                in enumerate(self.videos)})
+
+    def render_serializer(self, videos):
+        return JSONRenderer().render(VideoSerializer(prefetch_tags(videos),
+                                                     many=True).data)
+
+    def test_identical_to_serializer(self):
+        videos = Video.objects.order_by('id')
+        fast = JSONRenderer().render(list(serialize_videos(
+                videos.values(*VIDEO_COLUMNS))))
+        self.assertEqual(fast, self.render_serializer(videos))
+
+    def test_one_tag_query_per_chunk(self):
+        rows = list(Video.objects.order_by('id').values(*VIDEO_COLUMNS))
+        with self.assertNumQueries(3):
+            data = list(serialize_videos(rows, chunk_size=2))
+        self.assertEqual([sorted(video['tags']) for video in data],
+                         [['tag{}'.format(tag) for tag in range(index + 1)]
+                          for index
+                          in range(5)])
+
+    def test_streamed_list(self):
+        response = self.client.get('/api/v1/videos/videos/',
+                                   {'ordering': 'submission', 'page_size': 3})
+        content = b''.join(response.streaming_content)
+        page = Video.objects.order_by('-created', '-id')[:3]
+        expected = JSONRenderer().render(OrderedDict([
+            ('next', json.loads(content.decode())['next']),
+            ('previous', None),
+            ('results', VideoSerializer(prefetch_tags(page),
+                                        many=True).data)]))
+        self.assertEqual(content, expected)
+        response = self.client.get('/api/v1/videos/videos/',
+                                   {'ordering': 'submission',
+                                    'format': 'api'})
+        self.assertEqual(response.status_code, 200)
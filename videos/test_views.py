@@ -0,0 +1,204 @@
+import json
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from profiles.models import User
+from videos.models import Comment, Video
+from videos.testing import QueryBudgetMixin, create_videos
+
+
+class CommentListViewTestCase(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        self.video = create_videos(1, self.user)[0]
+        self.url = '/videos/videos/{}/comments'.format(self.video.id)
+
+    def add_comments(self, count):
+        users = [User.objects.create(username='commenter{}'.format(
+                     User.objects.count()))
+                 for index
+                 in range(count)]
+        for user in users:
+            parent = Comment.objects.create(text='Parent text',
+                                            commenter=user,
+                                            video=self.video)
+            Comment.objects.create(text='Child text',
+                                   commenter=self.user,
+                                   parent=parent,
+                                   video=self.video)
+
+    def test_queries_do_not_grow_with_comments(self):
+        self.assertQueryBudget(lambda: self.client.get(self.url),
+                               self.add_comments,
+                               sizes=(1, 5, 20),
+                               budget=5)
+
+    def test_replies_follow_parents(self):
+        self.add_comments(3)
+        response = self.client.get(self.url)
+        pairs = response.context['object_list']
+        self.assertEqual(len(pairs), 6)
+        for (parent, parent_depth), (reply, depth) in zip(pairs[::2],
+                                                          pairs[1::2]):
+            self.assertEqual((parent_depth, depth), (0, 1))
+            self.assertEqual(reply.parent_id, parent.id)
+        self.assertContains(response, str(pairs[0][0].commenter))
+        self.assertEqual(response.context['video'], self.video)
+
+    def test_top_level_comments_paginated(self):
+        self.add_comments(25)
+        response = self.client.get(self.url)
+        top_level = [comment for comment, depth in
+                     response.context['object_list'] if depth == 0]
+        self.assertEqual(len(top_level), 20)
+        response = self.client.get(
+                self.url, {'cursor': response.context['page_obj'].next_cursor})
+        top_level += [comment for comment, depth in
+                      response.context['object_list'] if depth == 0]
+        self.assertEqual(len(set(top_level)), 25)
+
+    def test_more_replies_linked(self):
+        parent = Comment.objects.create(text='Parent text',
+                                        commenter=self.user,
+                                        video=self.video)
+        Comment.objects.bulk_create([Comment(text='Reply {}'.format(index),
+                                             commenter=self.user,
+                                             parent=parent,
+                                             video=self.video)
+                                     for index
+                                     in range(5)])
+        replies_url = '/videos/comments/{}/replies'.format(parent.id)
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.context['object_list']), 4)
+        self.assertContains(response, replies_url)
+        response = self.client.get(replies_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['parent'], parent)
+        self.assertEqual(response.context['video'], self.video)
+        self.assertEqual(len(response.context['object_list']), 5)
+        self.assertNotContains(response, replies_url)
+
+    def test_missing_video(self):
+        response = self.client.get('/videos/videos/0/comments')
+        self.assertEqual(response.status_code, 404)
+
+
+class CommentAPITestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        self.video = create_videos(1, self.user)[0]
+        self.parent = Comment.objects.create(text='Parent text',
+                                             commenter=self.user,
+                                             video=self.video)
+        # A set of replies wider and a reply chain deeper than loaded at once,
+        # the newest reply starting the chain is listed first
+        for index in range(15):
+            Comment.objects.create(text='Sibling text',
+                                   commenter=self.user,
+                                   parent=self.parent,
+                                   video=self.video)
+        comment = self.parent
+        for index in range(5):
+            comment = Comment.objects.create(text='Child text',
+                                             commenter=self.user,
+                                             parent=comment,
+                                             video=self.video)
+
+    def test_video_comments(self):
+        response = self.client.get('/api/v1/videos/comments/',
+                                   {'video': self.video.id})
+        [parent] = response.data['results']
+        self.assertEqual(parent['id'], self.parent.id)
+        self.assertEqual(parent['commenter'], 'user')
+        self.assertTrue(parent['more_replies'])
+        self.assertEqual(len(parent['replies']), 3)
+        self.assertIsNone(response.data['next'])
+        response = self.client.get('/api/v1/videos/comments/')
+        self.assertEqual(response.status_code, 400)
+
+    def test_replies_loaded_on_demand(self):
+        url = '/api/v1/videos/comments/{}/replies/'.format(self.parent.id)
+        seen = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            # The comment, the page, two levels of replies and a check for more
+            self.assertLessEqual(len(queries), 5)
+            seen.extend(reply['id'] for reply in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(sorted(seen),
+                         sorted(self.parent.children.values_list('id',
+                                                                 flat=True)))
+
+    def test_subtree(self):
+        response = self.client.get(
+                '/api/v1/videos/comments/{}/'.format(self.parent.id))
+        self.assertEqual(response.data['id'], self.parent.id)
+        depth, level = 0, [response.data]
+        while level:
+            depth += 1
+            level = [reply
+                     for comment in level
+                     for reply in comment['replies']]
+        self.assertEqual(depth, 3)
+
+
+class BulkActionViewTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('user', password='password')
+        self.videos = create_videos(3, self.user)
+        self.comment = Comment.objects.create(text='Parent text',
+                                              commenter=self.user,
+                                              video=self.videos[0])
+        self.client.force_login(self.user)
+
+    def post(self, actions):
+        return self.client.post('/api/v1/videos/actions/',
+                                json.dumps(actions),
+                                content_type='application/json')
+
+    def test_actions_applied(self):
+        response = self.post(
+                [{'action': 'vote', 'video': self.videos[0].id, 'value': 1},
+                 {'action': 'vote', 'video': self.videos[1].id, 'value': 1},
+                 {'action': 'vote', 'video': self.videos[1].id, 'value': -1},
+                 {'action': 'vote', 'comment': self.comment.id, 'value': 0},
+                 {'action': 'favorite', 'video': self.videos[2].id,
+                  'favorite': True},
+                 {'action': 'vote', 'video': 0, 'value': 1},
+                 {'action': 'favorite', 'comment': self.comment.id,
+                  'favorite': True},
+                 {'action': 'vote', 'video': self.videos[2].id, 'value': 2}])
+        self.assertEqual([result['status']
+                          for result
+                          in response.data['results']],
+                         ['ok'] * 5 + ['error'] * 3)
+        scores = dict(Video.objects.values_list('id', 'score'))
+        self.assertEqual([scores[video.id] for video in self.videos],
+                         [1, -1, 0])
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.score, 0)
+        self.assertEqual(list(self.user.favorite_videos.all()),
+                         [self.videos[2]])
+
+    def test_query_count_independent_of_batch_size(self):
+        def vote_on_everything(value):
+            self.post([{'action': 'vote', 'video': video.id, 'value': value}
+                       for video
+                       in self.videos] +
+                      [{'action': 'favorite', 'video': video.id,
+                        'favorite': value > 0}
+                       for video
+                       in self.videos])
+        for value in (1, -1):
+            with CaptureQueriesContext(connection) as queries:
+                vote_on_everything(value)
+            self.assertLessEqual(len(queries), 20)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.post({'action': 'vote'}).status_code, 400)
+        self.assertEqual(self.post([{}] * 501).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.post([]).status_code, 403)
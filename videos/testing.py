@@ -0,0 +1,165 @@
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qsl, urlparse
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from profiles.models import User
+from videos.models import Category, Video
+from videos.transports import SyntheticTransport, fake_video_info  # noqa
+
+
+class FakeAPIServer(ThreadingMixIn, HTTPServer):
+    """
+    Local stand in for the youtube data api so the api client can be tested
+    without network access. Failing responses can be queued up ahead of the
+    normal ones, ids can be hidden as if the videos were deleted or private
+    and every request made is recorded
+    """
+    daemon_threads = True
+
+    def __init__(self, delay=0):
+        super(FakeAPIServer, self).__init__(('127.0.0.1', 0), FakeAPIHandler)
+        self.delay = delay
+        self.failures = deque()
+        self.synthetic = SyntheticTransport()
+        self.missing = self.synthetic.missing
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/'.format(self.server_port)
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+    def fail(self, status, reason=None, times=1):
+        """
+        Queue up failing responses to be returned before any others
+        """
+        error = {'code': status,
+                 'errors': [{'reason': reason}] if reason else []}
+        self.failures.extend([(status, {'error': error})] * times)
+
+    def respond(self, uri, params):
+        """
+        Build the response to a request, returning its status and body
+        """
+        with self.lock:
+            self.requests.append((uri, params))
+            if self.failures:
+                return self.failures.popleft()
+        return self.synthetic.respond(uri, params)
+
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight,
+                                       server.in_flight)
+        try:
+            time.sleep(server.delay)
+            url = urlparse(self.path)
+            status, body = server.respond(url.path.strip('/'),
+                                          dict(parse_qsl(url.query)))
+            content = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, format, *args):
+        # Keep test output clean
+        pass
+
+
+class QueryBudgetMixin(object):
+    """
+    TestCase mixin for checking the number of queries a page makes does not
+    grow with the amount of data it shows
+    """
+    def assertQueryBudget(self, function, populate, sizes=(1, 10),
+                          budget=None):
+        """
+        Calls populate with each size in turn, adding data for function to
+        load, and fails if function makes a different number of queries
+        afterwards or more than budget queries
+        """
+        counts = []
+        for size in sizes:
+            populate(size)
+            with CaptureQueriesContext(connection) as queries:
+                function()
+            counts.append(len(queries))
+        self.assertEqual(len(set(counts)), 1,
+                         'Queries grew with size, {} queries for sizes '
+                         '{}'.format(counts, list(sizes)))
+        if budget is not None:
+            self.assertLessEqual(counts[0], budget,
+                                 '{} queries made, budget is {}'.format(
+                                     counts[0], budget))
+
+
+def create_users(count, prefix='user'):
+    """
+    Helper function creating count users named user0, user1 and so on, or
+    after another prefix, returned in that order
+    """
+    usernames = ['{}{}'.format(prefix, index) for index in range(count)]
+    User.objects.bulk_create([User(username=username)
+                              for username
+                              in usernames])
+    return list(User.objects.filter(username__in=usernames).order_by('id'))
+
+
+def create_videos(count, uploader, category=None, start=0, bulk=False,
+                  **fields):
+    """
+    Helper function creating count videos by uploader titled Video 0, Video
+    1 and so on with the youtube ids video0, video1, in the Music category
+    unless another is given. Any field, including the uploader and
+    category, can be set to a function of the index of each video instead
+    of a value. Videos are saved one at a time, sending their signals,
+    unless bulk is True. Returns the videos in order
+    """
+    if category is None:
+        category, created = Category.objects.get_or_create(title='Music')
+    fields = dict(dict(category=category,
+                       published=timezone.now(),
+                       title='Video {}'.format,
+                       uploader=uploader,
+                       video_id='video{}'.format),
+                  **fields)
+    videos = [Video(**{name: value(index) if callable(value) else value
+                       for name, value
+                       in fields.items()})
+              for index
+              in range(start, start + count)]
+    if not bulk:
+        for video in videos:
+            video.save(force_insert=True)
+        return videos
+    Video.objects.bulk_create(videos)
+    return list(Video.objects.filter(video_id__in=[video.video_id
+                                                   for video
+                                                   in videos]).order_by('id'))
@@ -0,0 +1,236 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from urllib.parse import urlparse
+
+import requests
+from django.conf import settings
+
+# Options of the transport the youtube api client makes requests through,
+# any of which can be overridden by a VIDEO_API dictionary in the settings
+DEFAULTS = {
+    # How requests are made: http to the api, record to the api saving each
+    # response as a cassette, replay from saved cassettes only or synthetic
+    # responses made up locally. The VIDEO_API_TRANSPORT environment variable
+    # sets it without editing the settings, such as in CI
+    'TRANSPORT': os.environ.get('VIDEO_API_TRANSPORT', 'http'),
+    # Directory cassettes are recorded to and replayed from
+    'CASSETTE_DIR': os.path.join(os.path.dirname(__file__), 'cassettes'),
+    # Synthetic responses differ between seeds but are the same every time
+    # for the same seed, and can be delayed to stand in for the network
+    'SEED': 0,
+    'DELAY': 0,
+}
+
+
+def get_options():
+    options = dict(DEFAULTS)
+    options.update(getattr(settings, 'VIDEO_API', {}))
+    return options
+
+
+class MissingCassetteError(Exception):
+    """
+    A request was replayed that was never recorded
+    """
+
+
+class Response(object):
+    """
+    Response made without the network, with the parts of a requests response
+    the api client uses
+    """
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def content(self):
+        if self.body is None:
+            return b''
+        return json.dumps(self.body).encode()
+
+    def json(self):
+        if self.body is None:
+            raise ValueError('Response has no JSON body')
+        return self.body
+
+
+class HTTPTransport(object):
+    """
+    Makes requests to the api over the network
+    """
+    requires_key = True
+
+    def __init__(self):
+        # Sessions are not safe to share between threads so each thread
+        # making requests gets its own
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def get(self, url, params, timeout):
+        return self.session.get(url, params=params, timeout=timeout)
+
+
+def get_cassette_path(directory, url, params):
+    """
+    Helper function naming the cassette of a request after its uri and a
+    digest of its parameters. The api key is left out so cassettes recorded
+    with one key replay with any other
+    """
+    uri = urlparse(url).path.strip('/').split('/')[-1]
+    params = {name: str(value)
+              for name, value
+              in params.items()
+              if name != 'key'}
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode())
+    return os.path.join(directory, uri, digest.hexdigest() + '.json')
+
+
+class RecordTransport(object):
+    """
+    Makes requests through another transport, over the network by default,
+    saving each response as a cassette to be replayed later
+    """
+    requires_key = True
+
+    def __init__(self, directory, transport=None):
+        self.directory = directory
+        self.transport = transport or HTTPTransport()
+
+    def get(self, url, params, timeout):
+        response = self.transport.get(url, params, timeout)
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        path = get_cassette_path(self.directory, url, params)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'params': {name: value
+                                  for name, value
+                                  in params.items()
+                                  if name != 'key'},
+                       'status': response.status_code,
+                       'body': body},
+                      f,
+                      indent=2,
+                      sort_keys=True)
+        return response
+
+
+class ReplayTransport(object):
+    """
+    Answers requests with the responses recorded in cassettes, failing
+    requests that were never recorded rather than reaching the network
+    """
+    requires_key = False
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def get(self, url, params, timeout):
+        path = get_cassette_path(self.directory, url, params)
+        try:
+            with open(path) as f:
+                cassette = json.load(f)
+        except FileNotFoundError:
+            raise MissingCassetteError(
+                    'No cassette recorded for {} with {}'.format(url, params))
+        return Response(cassette['status'], cassette['body'])
+
+
+def fake_video_info(video_id, seed=0):
+    """
+    Deterministic snippet and statistics for a video id, shaped like the
+    items of a youtube api videos response
+    """
+    number = zlib.crc32(video_id.encode(), seed)
+    return {'id': video_id,
+            'snippet': {'publishedAt': '2016-0{}-1{}T12:00:00.000Z'.format(
+                            number % 9 + 1, number % 10),
+                        'categoryId': '1',
+                        'title': 'Video {}'.format(video_id),
+                        'description': 'Description of {}'.format(video_id),
+                        'tags': ['tag{}'.format((number >> shift) % 20)
+                                 for shift
+                                 in range(number % 4)]},
+            'statistics': {'viewCount': str(number % 1000000)}}
+
+
+class SyntheticTransport(object):
+    """
+    Makes up responses for the parts of the api the site uses without the
+    network, the same every time for the same seed. Searches page through
+    made up video ids without end and every video id requested exists unless
+    it is in missing, so any number of videos can be ingested
+    """
+    requires_key = False
+
+    def __init__(self, seed=0, delay=0):
+        self.seed = seed
+        self.delay = delay
+        self.missing = set()
+
+    def respond(self, uri, params):
+        """
+        Build the response to a request, returning its status and body
+        """
+        if uri == 'videos':
+            return 200, {'items': [fake_video_info(video_id, self.seed)
+                                   for video_id
+                                   in params['id'].split(',')
+                                   if video_id and
+                                   video_id not in self.missing]}
+        if uri == 'search':
+            prefix = params.get('videoCategoryId', 'search')
+            size = int(params.get('maxResults', 5))
+            page = int(params.get('pageToken') or 0)
+            return 200, {'items': [{'id': {'videoId': '{}-{}'.format(
+                                       prefix, index)}}
+                                   for index
+                                   in range(page * size, (page + 1) * size)],
+                         'nextPageToken': str(page + 1)}
+        if uri == 'videoCategories':
+            return 200, {'items': [{'id': str(index),
+                                    'snippet': {'title': 'Category {}'.format(
+                                        index)}}
+                                   for index
+                                   in range(1, 11)]}
+        return 404, {'error': {'code': 404, 'errors': []}}
+
+    def get(self, url, params, timeout):
+        if self.delay:
+            time.sleep(self.delay)
+        uri = urlparse(url).path.strip('/').split('/')[-1]
+        return Response(*self.respond(uri, params))
+
+
+def get_transport(options=None):
+    """
+    Helper function building the transport named by the options, those of
+    the settings by default
+    """
+    options = options or get_options()
+    name = options['TRANSPORT']
+    if name == 'http':
+        return HTTPTransport()
+    if name == 'record':
+        return RecordTransport(options['CASSETTE_DIR'])
+    if name == 'replay':
+        return ReplayTransport(options['CASSETTE_DIR'])
+    if name == 'synthetic':
+        return SyntheticTransport(options['SEED'], options['DELAY'])
+    raise ValueError('Unknown video api transport {!r}'.format(name))
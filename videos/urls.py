@@ -3,10 +3,16 @@ from django.conf.urls import url
 from videos import views
 
 urlpatterns = [
+        url(r'^feed/$',
+            views.FeedView.as_view(),
+            name='videos_feed'),
         url(r'^videos/(?P<list_by>[-\w]+)/$',
             views.VideoListView.as_view(),
             name='videos_video_list'),
         url(r'^videos/(?P<video_id>\d+)/comments$',
             views.CommentListView.as_view(),
-            name='videos_video_comments')
+            name='videos_video_comments'),
+        url(r'^comments/(?P<comment_id>\d+)/replies$',
+            views.CommentRepliesView.as_view(),
+            name='videos_comment_replies')
         ]
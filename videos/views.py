@@ -1,34 +1,96 @@
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.template.loader import render_to_string
+from django.template.response import TemplateResponse
+from django.utils.translation import ugettext_lazy as _
 from django.views.generic import ListView
 
-from .models import Comment, Video
+from .models import (Comment, FeedItem, Video, unique_ordering,
+                     walk_comment_tree)
+from .page_cache import video_list_cache
+from .pagination import InvalidCursor, KeysetPaginator
+from .related import get_related_videos
 
 
-class VideoListView(ListView):
+class KeysetPaginationMixin:
+    """
+    Pages a ListView by the cursor parameter rather than a page number, so
+    a page is found by seeking past the rows before it instead of counting
+    and offsetting through them
+    """
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size)
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404(_('Invalid cursor'))
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+
+class VideoListView(KeysetPaginationMixin, ListView):
     model = Video
     paginate_by = 10
     template_name = 'videos/video-list.html'
 
     QUERY_DICT = dict(likes=Video.objects.order_by_votes,
                       views=Video.objects.order_by_views,
+                      trending=Video.objects.order_by_trending,
                       submission='created',
                       publication='published')
 
     TITLE_DICT = dict(likes='Most Liked Videos',
                       views='Most Viewed Vidoes',
+                      trending='Trending Videos',
                       submission='Most Recent User Submissions',
                       publication='Most Recently Published Videos')
 
-    def get_queryset(self):
+    @classmethod
+    def get_ordered_queryset(cls, list_by):
         """
-        Override queryset to allow querying and filtering by custom manager
-        methods and queries
+        Videos in the order given by list_by, falling back to the most liked.
+        Every ordering ends with the primary key so it can be paginated by
+        cursor
         """
-        query = self.QUERY_DICT.get(self.kwargs['list_by'],
-                                    self.QUERY_DICT['likes'])
+        query = cls.QUERY_DICT.get(list_by, cls.QUERY_DICT['likes'])
         if callable(query):
             return query()
         else:
-            return Video.objects.order_by(query)
+            return Video.objects.order_by(*unique_ordering(query))
+
+    def get(self, request, *args, **kwargs):
+        """
+        Override get to serve the videos and pager of the page from the video
+        list cache, only querying and rendering them when it has no fresh
+        copy. The rest of the page is rendered for each request as it
+        depends on the user
+        """
+        list_by = self.kwargs['list_by']
+        if list_by not in self.QUERY_DICT:
+            list_by = 'likes'
+        cursor = request.GET.get('cursor', '')
+        page_html, outcome = video_list_cache.get(list_by,
+                                                  (cursor,),
+                                                  self.render_page)
+        response = TemplateResponse(request,
+                                    self.template_name,
+                                    {'page_html': page_html,
+                                     'title': self.TITLE_DICT[list_by]})
+        response['X-Cache'] = outcome
+        return response
+
+    def render_page(self):
+        self.object_list = self.get_queryset()
+        # Rendered without the request so nothing of the user is cached
+        return render_to_string('videos/video-list-page.html',
+                                self.get_context_data())
+
+    def get_queryset(self):
+        """
+        Override queryset to allow querying and filtering by custom manager
+        methods and queries
+        """
+        return self.get_ordered_queryset(self.kwargs['list_by'])
 
     def get_context_data(self, **kwargs):
         context = super(VideoListView, self).get_context_data(**kwargs)
@@ -43,21 +105,73 @@ class VideoListView(ListView):
         return context
 
 
-class CommentListView(ListView):
+class FeedView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
+    paginate_by = 10
+    template_name = 'videos/video-list.html'
+
+    def get_queryset(self):
+        return FeedItem.objects.get_feed(self.request.user.id)
+
+    def get_context_data(self, **kwargs):
+        context = super(FeedView, self).get_context_data(**kwargs)
+        first_video_index = context['page_obj'].start_index()
+        context['object_list'] = [(first_video_index + index, item.video)
+                                  for index, item
+                                  in enumerate(context['object_list'])]
+        context['title'] = 'My Feed'
+        return context
+
+
+class CommentListView(KeysetPaginationMixin, ListView):
     model = Video
+    paginate_by = 20
     template_name = 'videos/video-comments.html'
 
+    # Levels of replies shown beneath each top level comment and replies
+    # shown to each comment, the rest are paged through on the replies page
+    REPLY_DEPTH = 2
+    REPLY_BREADTH = 3
+
     def get_queryset(self):
         """
         Override base queryset method to allow for querying by the video id
-        the comments are related to and structuring the data to allow for
-        child parent representation
+        the comments are related to. Only top level comments are paginated,
+        their replies are loaded for the page in get_context_data
         """
-        parents = Comment.objects.order_by_votes().filter(
-                video_id=self.kwargs['video_id'], parent_id=None)
-        return parents
+        self.video = get_object_or_404(Video, id=self.kwargs['video_id'])
+        return Comment.objects.order_by_votes().filter(
+                video_id=self.video.id,
+                parent_id=None).select_related('commenter')
 
     def get_context_data(self, **kwargs):
+        """
+        Structure the page to allow for child parent representation, listing
+        (comment, depth) pairs with replies following their parents
+        """
         context = super(CommentListView, self).get_context_data(**kwargs)
-        context['video'] = Video.objects.get(id=self.kwargs['video_id'])
+        thread = Comment.objects.get_replies(context['object_list'],
+                                             self.REPLY_DEPTH,
+                                             self.REPLY_BREADTH)
+        context['object_list'] = list(walk_comment_tree(thread))
+        context['video'] = self.video
+        context['related_videos'] = get_related_videos(self.video.id)
+        return context
+
+
+class CommentRepliesView(CommentListView):
+    """
+    Pages through the replies to a comment the same way as the top level
+    comments of a video, for the replies left out of the comments page
+    """
+    def get_queryset(self):
+        self.parent = get_object_or_404(Comment.objects.select_related(
+                                            'commenter', 'video'),
+                                        id=self.kwargs['comment_id'])
+        self.video = self.parent.video
+        return Comment.objects.order_by_votes().filter(
+                parent_id=self.parent.id).select_related('commenter')
+
+    def get_context_data(self, **kwargs):
+        context = super(CommentRepliesView, self).get_context_data(**kwargs)
+        context['parent'] = self.parent
         return context